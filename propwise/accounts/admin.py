@@ -14,10 +14,10 @@ class CustomUserAdmin(UserAdmin):
     
     # Add our custom fields to the "Edit User" page
     fieldsets = UserAdmin.fieldsets + (
-        ('PropWise Profile', {'fields': ('is_agent', 'is_buyer', 'phone_number', 'profile_picture')}),
+        ('PropWise Profile', {'fields': ('is_agent', 'is_buyer', 'phone_number', 'profile_picture', 'alert_frequency')}),
     )
     add_fieldsets = UserAdmin.add_fieldsets + (
-        ('PropWise Profile', {'fields': ('is_agent', 'is_buyer', 'phone_number', 'profile_picture')}),
+        ('PropWise Profile', {'fields': ('is_agent', 'is_buyer', 'phone_number', 'profile_picture', 'alert_frequency')}),
     )
 
 # 2. Register Saved Search
@@ -0,0 +1,241 @@
+# accounts/alerts.py
+
+"""
+Matching new listings against saved searches (for the email alerts).
+
+The old send_search_alerts ran one query per SavedSearch. Now we:
+  1. load every listing created since the OLDEST 'last_checked' once,
+  2. index them by city, property type and purpose (and sort them by price),
+  3. answer each saved search from that index, in memory.
+
+Only searches with a keyword still touch the database: their few
+candidate listings are checked against the full-text index (so the
+keyword behaves exactly like the search page, and the best matches
+come first).
+"""
+
+import bisect
+import datetime
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+
+from properties.models import Property
+from properties.search import keyword_search
+
+from .models import AlertFrequency, SavedSearchMatch
+
+# The few columns a saved search looks at
+AlertListing = namedtuple(
+    'AlertListing', 'id created_at city_id property_type purpose price bedrooms'
+)
+
+
+def load_new_listings(since):
+    """
+    Every listing created after 'since', with only the columns we need.
+    """
+    rows = Property.objects.filter(created_at__gt=since).values_list(
+        'id', 'created_at', 'area__city_id', 'property_type', 'purpose', 'price', 'bedrooms'
+    ).order_by('id')
+    return [AlertListing(*row) for row in rows]
+
+
+def listing_matches(search, listing):
+    """
+    True if the listing fits every criterion of the search except the
+    keyword (a criterion the user left empty matches everything).
+    """
+    if search.city_id and listing.city_id != search.city_id:
+        return False
+    if search.property_type and listing.property_type != search.property_type:
+        return False
+    if search.purpose and listing.purpose != search.purpose:
+        return False
+    if search.min_price and listing.price < search.min_price:
+        return False
+    if search.max_price and listing.price > search.max_price:
+        return False
+    if search.min_bedrooms and (listing.bedrooms is None or listing.bedrooms < search.min_bedrooms):
+        return False
+    return True
+
+
+class ListingIndex:
+    """
+    An in-memory "inverted index" over a batch of new listings:
+    for each city / type / purpose, the set of listing ids that have it.
+    """
+
+    def __init__(self, listings):
+        self.listings = {listing.id: listing for listing in listings}
+
+        self.by_city = defaultdict(set)
+        self.by_type = defaultdict(set)
+        self.by_purpose = defaultdict(set)
+        for listing in listings:
+            self.by_city[listing.city_id].add(listing.id)
+            self.by_type[listing.property_type].add(listing.id)
+            self.by_purpose[listing.purpose].add(listing.id)
+
+        # (price, id) pairs sorted by price, for price ranges
+        self.by_price = sorted((listing.price, listing.id) for listing in listings)
+        self.prices = [price for price, _ in self.by_price]
+
+    def _price_range(self, min_price, max_price):
+        low = bisect.bisect_left(self.prices, min_price) if min_price else 0
+        high = bisect.bisect_right(self.prices, max_price) if max_price else len(self.prices)
+        return {listing_id for _, listing_id in self.by_price[low:high]}
+
+    def candidates(self, search):
+        """
+        The ids of the listings that match every criterion of 'search'
+        except the keyword (same rules as the search page: a criterion
+        the user left empty matches everything).
+        """
+        postings = []
+        if search.city_id:
+            postings.append(self.by_city.get(search.city_id, set()))
+        if search.property_type:
+            postings.append(self.by_type.get(search.property_type, set()))
+        if search.purpose:
+            postings.append(self.by_purpose.get(search.purpose, set()))
+
+        if postings:
+            # Start from the smallest set, so the intersection is cheap
+            postings.sort(key=len)
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                ids &= posting
+        elif search.min_price or search.max_price:
+            ids = self._price_range(search.min_price, search.max_price)
+        else:
+            ids = set(self.listings)
+
+        matches = []
+        for listing_id in ids:
+            listing = self.listings[listing_id]
+            if listing.created_at > search.last_checked and listing_matches(search, listing):
+                matches.append(listing_id)
+        return sorted(matches)
+
+
+def build_index(searches):
+    """
+    One ListingIndex with every listing that any of 'searches' could
+    still be waiting for (created after the oldest 'last_checked').
+    """
+    since = min(search.last_checked for search in searches)
+    return ListingIndex(load_new_listings(since))
+
+
+def match_search(index, search):
+    """
+    The ids of the new listings for one saved search.
+    Keyword matches are ordered best match first, the rest by id.
+    """
+    ids = index.candidates(search)
+    if ids and search.keyword:
+        # Only these few candidates are checked against the full-text index
+        ids = list(
+            keyword_search(Property.objects.filter(pk__in=ids), search.keyword)
+            .order_by('relevance', 'id')
+            .values_list('id', flat=True)
+        )
+    return ids
+
+
+# --- THE ALERT EMAIL ---
+
+# For testing on your computer, use this.
+# When you deploy to a real website, change this to e.g. 'www.propwise.com'
+ALERT_DOMAIN = '127.0.0.1:8000'
+
+# How long a digest user waits between two emails
+DIGEST_PERIODS = {
+    AlertFrequency.DAILY: datetime.timedelta(days=1),
+    AlertFrequency.WEEKLY: datetime.timedelta(days=7),
+}
+
+
+def digest_is_due(user, now):
+    """
+    True if the user may get an alert email now
+    (always for 'immediate', once a day / week for the digests).
+    """
+    period = DIGEST_PERIODS.get(user.alert_frequency)
+    if period is None or user.last_alert_email_at is None:
+        return True
+    # An hour of slack, so a daily job that runs a little early still sends
+    return now - user.last_alert_email_at >= period - datetime.timedelta(hours=1)
+
+
+def build_alert_email(user, entries):
+    """
+    The alert email for one user (HTML + plain text), not sent yet.
+    'entries' are (property, [names of the searches it matched]) pairs,
+    one per property, so a listing that matches several searches is
+    only shown once. The properties need area__city loaded.
+    """
+    count = len(entries)
+    search_names = []
+    for _, names in entries:
+        search_names.extend(name for name in names if name not in search_names)
+
+    context = {
+        'user': user,
+        'search_names': search_names,
+        'entries': entries,
+        'new_properties_count': count,
+        'domain': ALERT_DOMAIN,
+    }
+    html_message = render_to_string('accounts/email/saved_search_alert.html', context)
+
+    # Also a simple text-only version (good practice)
+    plain_message = f"Hi {user.username},\n\n"
+    plain_message += f"We found {count} new properties matching your saved searches: "
+    plain_message += ", ".join(f"'{name}'" for name in search_names) + ".\n"
+    plain_message += f"Log in to http://{ALERT_DOMAIN} to see them!\n\n- The PropWise Team"
+
+    if user.alert_frequency in DIGEST_PERIODS:
+        subject = f"Your {user.get_alert_frequency_display().lower()}: {count} New Properties on PropWise"
+    else:
+        subject = f"PropWise Alert: {count} New Properties Match Your Search!"
+
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+    email.attach_alternative(html_message, 'text/html')
+    return email
+
+
+def record_matches(pairs, emailed_at=None):
+    """
+    Remembers which (search_id, property_id) pairs matched, so a
+    listing is never sent twice for the same search. Pairs without
+    'emailed_at' wait for the next send_search_alerts run.
+    """
+    SavedSearchMatch.objects.bulk_create(
+        [
+            SavedSearchMatch(search_id=search_id, property_id=property_id, emailed_at=emailed_at)
+            for search_id, property_id in pairs
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def already_alerted(search_ids, property_ids):
+    """
+    The (search_id, property_id) pairs among these that were already found.
+    """
+    if not search_ids or not property_ids:
+        return set()
+    return set(
+        SavedSearchMatch.objects.filter(search_id__in=search_ids, property_id__in=property_ids)
+        .values_list('search_id', 'property_id')
+    )
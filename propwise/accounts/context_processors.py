@@ -1,6 +1,18 @@
 # accounts/context_processors.py
 
-from .models import Notification
+from .notifications import get_notification_summary
+
+
+def is_partial_request(request):
+    """
+    AJAX calls and "?ajax=true" partials (like core/property_grid.html)
+    render a piece of a page without the navbar, so they never show the bell.
+    """
+    return (
+        request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        or request.GET.get('ajax') == 'true'
+    )
+
 
 def notifications(request):
     """
@@ -8,16 +20,14 @@ def notifications(request):
     It makes the 'notification_count' and 'notification_list'
     available to base.html automatically.
     """
-    if request.user.is_authenticated:
-        # Get all unread notifications for this user
-        unread_notifs = Notification.objects.filter(
-            recipient=request.user, 
-            is_read=False
-        )
+    if request.user.is_authenticated and not is_partial_request(request):
+        # A short-lived cached summary (see accounts/notifications.py),
+        # so normal page loads do not hit the database for the bell at all.
+        summary = get_notification_summary(request.user)
         return {
-            'notification_count': unread_notifs.count(),
-            'notification_list': unread_notifs[:5] # Only show the top 5 in the dropdown
+            'notification_count': summary['count'],
+            'notification_list': summary['items'] # Only the top 5 for the dropdown
         }
     
-    # If user is not logged in, return nothing
-    return {}
\ No newline at end of file
+    # If user is not logged in (or this is a partial), return nothing
+    return {}
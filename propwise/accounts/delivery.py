@@ -0,0 +1,172 @@
+# accounts/delivery.py
+
+"""
+Sending a whole run of alert emails quickly (used by send_search_alerts).
+
+  1. RENDER: the emails are rendered in a pool of worker processes
+     (the template rendering is the slow, CPU-bound part).
+  2. SEND: the messages go out over a few persistent connections
+     (one get_connection() each), 'batch_size' messages per
+     send_messages() call, instead of one new SMTP login per email.
+  3. RETRY: a batch that fails is retried on a fresh connection,
+     waiting backoff_seconds, then 2x, 4x, ... longer.
+
+DeliveryStats counts everything, so the command can print the
+throughput of each run.
+"""
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.core.mail import get_connection
+
+from .alerts import build_alert_email
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryStats:
+    """
+    The numbers of one delivery run.
+    """
+
+    def __init__(self):
+        self.rendered = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.render_seconds = 0.0
+        self.send_seconds = 0.0
+
+    def per_second(self, count, seconds):
+        return count / seconds if seconds else 0.0
+
+    def summary(self):
+        return (
+            f"Rendered {self.rendered} emails in {self.render_seconds:.2f}s "
+            f"({self.per_second(self.rendered, self.render_seconds):.1f}/s). "
+            f"Sent {self.sent} in {self.batches} batches in {self.send_seconds:.2f}s "
+            f"({self.per_second(self.sent, self.send_seconds):.1f}/s). "
+            f"Retries: {self.retries}. Failed: {self.failed}."
+        )
+
+
+def _init_render_worker():
+    # Needed when the worker processes are spawned instead of forked
+    django.setup()
+
+
+def _render(job):
+    key, user, entries = job
+    return key, build_alert_email(user, entries)
+
+
+class AlertDelivery:
+    """
+    Renders and sends a list of alert jobs: (key, user, entries),
+    see build_alert_email() for 'entries'.
+    deliver() returns the keys of the jobs whose email was sent.
+    """
+
+    def __init__(self, render_workers=1, connections=4, batch_size=50,
+                 max_retries=3, backoff_seconds=1.0, backend=None, **backend_options):
+        self.render_workers = max(1, render_workers)
+        self.connections = max(1, connections)
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.backend = backend  # None = settings.EMAIL_BACKEND
+        self.backend_options = backend_options
+        self.stats = DeliveryStats()
+
+    def deliver(self, jobs):
+        messages = self.render(jobs)
+        return self.send(messages)
+
+    # --- 1. RENDERING ---
+
+    def render(self, jobs):
+        """
+        Returns [(key, message)], in the same order as the jobs.
+        """
+        started = time.monotonic()
+        if self.render_workers == 1 or len(jobs) < 2:
+            messages = [_render(job) for job in jobs]
+        else:
+            chunksize = max(1, len(jobs) // (self.render_workers * 4))
+            with ProcessPoolExecutor(self.render_workers, initializer=_init_render_worker) as pool:
+                messages = list(pool.map(_render, jobs, chunksize=chunksize))
+        self.stats.rendered += len(messages)
+        self.stats.render_seconds += time.monotonic() - started
+        return messages
+
+    # --- 2. SENDING ---
+
+    def send(self, messages):
+        started = time.monotonic()
+        batches = [
+            messages[start:start + self.batch_size]
+            for start in range(0, len(messages), self.batch_size)
+        ]
+        # Every connection (thread) takes every n-th batch
+        lanes = [batches[lane::self.connections] for lane in range(self.connections)]
+        lanes = [lane for lane in lanes if lane]
+
+        delivered = set()
+        if lanes:
+            with ThreadPoolExecutor(len(lanes)) as pool:
+                # (The stats are added up here, not inside the threads)
+                for lane in pool.map(self._send_lane, lanes):
+                    delivered.update(lane['delivered'])
+                    self.stats.batches += lane['batches']
+                    self.stats.sent += lane['sent']
+                    self.stats.retries += lane['retries']
+                    self.stats.failed += lane['failed']
+        self.stats.send_seconds += time.monotonic() - started
+        return delivered
+
+    def _open_connection(self):
+        connection = get_connection(self.backend, fail_silently=False, **self.backend_options)
+        connection.open()
+        return connection
+
+    def _send_lane(self, batches):
+        """
+        Sends some batches over one persistent connection.
+        """
+        lane = {'delivered': [], 'batches': 0, 'sent': 0, 'retries': 0, 'failed': 0}
+        connection = None
+        try:
+            for batch in batches:
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        if connection is None:
+                            connection = self._open_connection()
+                        connection.send_messages([message for _, message in batch])
+                    except Exception as error:
+                        # Start over on a fresh connection (the old one may be broken).
+                        # The whole batch is sent again, so keep batches small.
+                        if connection is not None:
+                            try:
+                                connection.close()
+                            except Exception:
+                                pass
+                            connection = None
+                        if attempt == self.max_retries:
+                            logger.error("Giving up on a batch of %s alert emails: %s", len(batch), error)
+                            lane['failed'] += len(batch)
+                            break
+                        lane['retries'] += 1
+                        time.sleep(self.backoff_seconds * 2 ** attempt)
+                    else:
+                        lane['batches'] += 1
+                        lane['sent'] += len(batch)
+                        lane['delivered'].extend(key for key, _ in batch)
+                        break
+        finally:
+            if connection is not None:
+                connection.close()
+        return lane
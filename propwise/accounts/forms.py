@@ -38,7 +38,7 @@ class CustomUserChangeForm(forms.ModelForm): # <-- 1. Inherit from ModelForm
     class Meta:
         model = User
         # 2. Update the fields list
-        fields = ['first_name', 'last_name', 'email', 'phone_number', 'profile_picture']
+        fields = ['first_name', 'last_name', 'email', 'phone_number', 'profile_picture', 'alert_frequency']
         
         # 3. Add widgets to make it look good
      
@@ -47,6 +47,7 @@ class CustomUserChangeForm(forms.ModelForm): # <-- 1. Inherit from ModelForm
             'last_name': forms.TextInput(attrs={'class': 'form-control'}),
             'email': forms.EmailInput(attrs={'class': 'form-control'}),
             'phone_number': forms.TextInput(attrs={'class': 'form-control'}),
+            'alert_frequency': forms.Select(attrs={'class': 'form-control'}),
         }
 
     # accounts/forms.py for notificanton o fsaved
@@ -0,0 +1,16 @@
+# accounts/management/commands/reconcile_notification_counts.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.notifications import reconcile_unread_counts
+
+
+class Command(BaseCommand):
+    help = "Recounts the unread notifications (the bell) of users whose stored counter is wrong."
+
+    def handle(self, *args, **options):
+        fixed = reconcile_unread_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Fixed the unread notification counter of {len(fixed)} users."
+        ))
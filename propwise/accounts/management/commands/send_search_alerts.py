@@ -2,15 +2,12 @@
 
 import logging
 from django.core.management.base import BaseCommand
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.utils import timezone
-from django.db.models import Q
-from decimal import Decimal
 
-from accounts.models import SavedSearch, User
+from accounts.alerts import already_alerted, build_index, digest_is_due, match_search, record_matches
+from accounts.delivery import AlertDelivery
+from accounts.models import SavedSearch, SavedSearchMatch, User
 from properties.models import Property
-from django.conf import settings
 
 # Set up logging to see output in your console
 logger = logging.getLogger(__name__)
@@ -18,120 +15,153 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Finds new properties matching saved searches and sends email alerts.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Processes that render the emails (default: 1).')
+        parser.add_argument('--connections', type=int, default=4, help='Mail server connections used at once (default: 4).')
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails sent per send_messages() call (default: 50).')
+        parser.add_argument('--max-retries', type=int, default=3, help='How often a failed batch is retried (default: 3).')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Render and 'send' everything to the locmem backend (or to --email-dir) "
+                 "without emailing anyone or marking the searches as checked.",
+        )
+        parser.add_argument('--email-dir', help='With --dry-run: write the emails as files into this folder.')
+
     def handle(self, *args, **options):
-        
-        # --- IMPORTANT: SET YOUR DOMAIN ---
-        # For testing on your computer, use this:
-        DOMAIN = '127.0.0.1:8000'
-        # When you deploy to a real website, change this to:
-        # DOMAIN = 'www.propwise.com'
-        # ---
+
+        # (The domain used in the email links is ALERT_DOMAIN in accounts/alerts.py)
 
         self.stdout.write(f"[{timezone.now()}] Starting send_search_alerts...")
+        dry_run = options['dry_run']
+
+        # Everything created after this moment is left for the next run
+        run_started = timezone.now()
+
+        # 1. Get all active saved searches (and their users, in the same query)
+        active_searches = list(SavedSearch.objects.filter(is_active=True).select_related('user'))
 
-        # 1. Get all active saved searches
-        active_searches = SavedSearch.objects.filter(is_active=True)
-        
-        if not active_searches.exists():
+        if not active_searches:
             self.stdout.write("No active saved searches found.")
             return
 
-        total_emails_sent = 0
+        # 2. Load the new listings ONCE and index them (see accounts/alerts.py)
+        index = build_index(active_searches)
 
-        # 2. Loop through each saved search
+        # 3. Match every search in memory
+        matches = {}
         for search in active_searches:
-            user = search.user
-            
-            # --- 3. Build a dynamic filter based on the saved search criteria ---
-            # This is the "brain" of the operation.
-            
-            # Start with a base filter:
-            # Only find properties that are *newer* than the last time we checked.
-            filters = Q(created_at__gt=search.last_checked)
-
-            # Add more filters only if the user saved them
-            if search.city:
-                # We use 'area__city' just like in your PropertyFilter
-                filters &= Q(area__city=search.city)
-            
-            if search.keyword:
-                filters &= Q(title__icontains=search.keyword)
-                
-            if search.property_type:
-                filters &= Q(property_type=search.property_type)
-                
-            if search.purpose:
-                filters &= Q(purpose=search.purpose)
-
-            # --- Price and Bedroom Filters ---
-            if search.min_price:
-                # 'gte' means "Greater Than or Equal to"
-                filters &= Q(price__gte=search.min_price)
-                
-            if search.max_price:
-                # 'lte' means "Less Than or Equal to"
-                filters &= Q(price__lte=search.max_price)
-
-            if search.min_bedrooms:
-                filters &= Q(bedrooms__gte=search.min_bedrooms)
-            
-            # --- 4. Run the query to find matching new properties ---
             try:
-                new_properties = Property.objects.filter(filters).distinct()
-
-                if new_properties.exists():
-                    # --- 5. We found matches! Send the email. ---
-                    self.stdout.write(self.style.SUCCESS(
-                        f"Found {new_properties.count()} new properties for '{search.name}' (User: {user.username})"
-                    ))
-
-                    # 6. Prepare the email content
-                    context = {
-                        'user': user,
-                        'search': search,
-                        'new_properties': new_properties,
-                        'new_properties_count': new_properties.count(),
-                        'domain': DOMAIN, # Pass the domain to the template
-                    }
-
-                    # Render the HTML template we made in Step 4.2
-                    html_message = render_to_string('accounts/email/saved_search_alert.html', context)
-                    
-                    # Also create a simple text-only version (good practice)
-                    plain_message = f"Hi {user.username},\n\n"
-                    plain_message += f"We found {new_properties.count()} new properties matching your saved search '{search.name}'.\n"
-                    plain_message += f"Log in to http://{DOMAIN} to see them!\n\n- The PropWise Team"
-
-                    # 7. Send the actual email
-                    send_mail(
-                        subject=f"PropWise Alert: {new_properties.count()} New Properties Match Your Search!",
-                        message=plain_message,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[user.email],
-                        html_message=html_message,
-                        fail_silently=False,
-                    )
-                    
-                    total_emails_sent += 1
-                
-                else:
-                    # No new properties found for this search
-                    self.stdout.write(
-                        f"No new properties found for '{search.name}' (User: {user.username})."
-                    )
-
-                # --- 8. VERY IMPORTANT: Update the 'last_checked' time ---
-                # This ensures we don't send the same alert twice.
-                # We do this even if no properties were found.
-                search.last_checked = timezone.now()
-                search.save()
-
+                matches[search.id] = match_search(index, search)
             except Exception as e:
-                # Log any errors
+                # Log any errors (this search is retried on the next run)
                 self.stderr.write(self.style.ERROR(
-                    f"Error processing search {search.id} for user {user.username}: {e}"
+                    f"Error processing search {search.id} for user {search.user.username}: {e}"
+                ))
+
+        # 4. Leave out the listings that were already found
+        #    (e.g. by the instant alerts, see accounts/percolator.py)
+        matched_ids = {pk for ids in matches.values() for pk in ids}
+        done = already_alerted(list(matches), matched_ids)
+        new_pairs = []
+        searches_by_id = {search.id: search for search in active_searches}
+        for search_id, ids in matches.items():
+            search = searches_by_id[search_id]
+            ids = [pk for pk in ids if (search_id, pk) not in done]
+            if ids:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Found {len(ids)} new properties for '{search.name}' (User: {search.user.username})"
                 ))
+            else:
+                # No new properties found for this search
+                self.stdout.write(
+                    f"No new properties found for '{search.name}' (User: {search.user.username})."
+                )
+            new_pairs.extend((search_id, pk) for pk in ids)
+
+        # 5. Save them as "waiting to be emailed". Together with the ones
+        #    that were already waiting (digests, failed sends) they make up
+        #    this run's emails.
+        if not dry_run:
+            record_matches(new_pairs)
+        pending_loaded_at = timezone.now()
+        pending = list(
+            SavedSearchMatch.objects.filter(emailed_at__isnull=True, search__is_active=True)
+            .order_by('id').values_list('search_id', 'property_id')
+        )
+        already_pending = set(pending)
+        pending += [pair for pair in new_pairs if pair not in already_pending]
+
+        # Load the matching properties for the emails, all in one query
+        properties = Property.objects.select_related('area__city').in_bulk({pk for _, pk in pending})
+
+        # 6. One email per user: all their searches together, every property once.
+        #    Daily / weekly users only get one when their digest is due.
+        per_user = {}
+        for search_id, property_id in pending:
+            search = searches_by_id.get(search_id)
+            if search is None or property_id not in properties:
+                continue
+            user = search.user
+            if not user.email or not digest_is_due(user, run_started):
+                continue
+            entries = per_user.setdefault(user.id, (user, {}))[1]
+            entries.setdefault(property_id, []).append(search.name)
+
+        jobs = [
+            (user_id, user, [(properties[pk], names) for pk, names in entries.items()])
+            for user_id, (user, entries) in per_user.items()
+        ]
+
+        # 7. Render and send them all (see accounts/delivery.py)
+        backend = None
+        backend_options = {}
+        if dry_run:
+            if options['email_dir']:
+                backend = 'django.core.mail.backends.filebased.EmailBackend'
+                backend_options = {'file_path': options['email_dir']}
+            else:
+                backend = 'django.core.mail.backends.locmem.EmailBackend'
+
+        delivery = AlertDelivery(
+            render_workers=options['workers'],
+            connections=options['connections'],
+            batch_size=options['batch_size'],
+            max_retries=options['max_retries'],
+            backend=backend,
+            **backend_options,
+        )
+        delivered = delivery.deliver(jobs)
+
+        for user_id, user, entries in jobs:
+            if user_id not in delivered:
+                # Not sent: the matches stay waiting for the next run
+                self.stderr.write(self.style.ERROR(
+                    f"Could not send the alert email to user {user.username}."
+                ))
+
+        self.stdout.write(delivery.stats.summary())
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Dry run: no searches were marked as checked."))
+            return
+
+        # --- 8. VERY IMPORTANT: Remember what was sent ---
+        # This ensures we don't send the same alert twice.
+        SavedSearchMatch.objects.filter(
+            search__user_id__in=delivered,
+            emailed_at__isnull=True,
+            created_at__lte=pending_loaded_at,
+        ).update(emailed_at=timezone.now())
+        User.objects.filter(pk__in=delivered).update(last_alert_email_at=run_started)
+
+        # 'last_checked' moves on for every search that was matched,
+        # even if no properties were found (the matches are saved above).
+        checked_searches = [searches_by_id[search_id] for search_id in matches]
+        for search in checked_searches:
+            search.last_checked = run_started
+        SavedSearch.objects.bulk_update(checked_searches, ['last_checked'])
 
         self.stdout.write(self.style.SUCCESS(
-            f"[{timezone.now()}] Search alert process finished. Total emails sent: {total_emails_sent}"
-        ))
\ No newline at end of file
+            f"[{timezone.now()}] Search alert process finished. Total emails sent: {len(delivered)}"
+        ))
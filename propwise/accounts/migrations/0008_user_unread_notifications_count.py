@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread_notifications(apps, schema_editor):
+    # Start the new counter from the notifications that are already there
+    User = apps.get_model('accounts', 'User')
+    Notification = apps.get_model('accounts', 'Notification')
+    unread = (
+        Notification.objects.filter(recipient=OuterRef('pk'), is_read=False)
+        .order_by().values('recipient').annotate(total=Count('id')).values('total')
+    )
+    User.objects.update(unread_notifications_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_visitrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notifications_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_unread_notifications, migrations.RunPython.noop),
+    ]
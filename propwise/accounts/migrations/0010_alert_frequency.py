@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:09
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_matches_emailed(apps, schema_editor):
+    # Until now a match was only saved once its email had been sent
+    SavedSearchMatch = apps.get_model('accounts', 'SavedSearchMatch')
+    SavedSearchMatch.objects.update(emailed_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_savedsearchmatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedsearchmatch',
+            name='emailed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='alert_frequency',
+            field=models.CharField(choices=[('immediate', 'As soon as possible'), ('daily', 'Daily digest'), ('weekly', 'Weekly digest')], default='immediate', help_text='Get every new match right away, or one summary email a day or a week.', max_length=10, verbose_name='Saved search emails'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_alert_email_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(mark_existing_matches_emailed, migrations.RunPython.noop),
+    ]
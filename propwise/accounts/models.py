@@ -12,6 +12,12 @@ from properties.models import PropertyType, PropertyPurpose
 
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+class AlertFrequency(models.TextChoices):
+    IMMEDIATE = 'immediate', 'As soon as possible'
+    DAILY = 'daily', 'Daily digest'
+    WEEKLY = 'weekly', 'Weekly digest'
+
+
 class User(AbstractUser):
    
     
@@ -25,6 +31,8 @@ class User(AbstractUser):
     # Other profile fields
     phone_number = models.CharField(max_length=20, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Smaller copies of the picture, made by core/images.py
+    profile_picture_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     # --- ADD THIS NEW FIELD  for as add to fovorites---
     favorites = models.ManyToManyField(
         Property, 
@@ -32,9 +40,36 @@ class User(AbstractUser):
         blank=True
     )
 
+    # --- Unread notifications (the bell icon) ---
+    # Kept up to date by accounts/signals.py, so the bell never has to count.
+    unread_notifications_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # --- Saved search alert emails ---
+    alert_frequency = models.CharField(
+        'Saved search emails',
+        max_length=10,
+        choices=AlertFrequency.choices,
+        default=AlertFrequency.IMMEDIATE,
+        help_text="Get every new match right away, or one summary email a day or a week.",
+    )
+    last_alert_email_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Only ever changed with UPDATE ... F() (see accounts/notifications.py)
+    COUNTER_FIELDS = {'unread_notifications_count'}
+
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        # Saving a user that was loaded earlier (the profile form, the admin...)
+        # must not write back the counter as it was at that time.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     # accounts/models.py for notification 
 
 class SavedSearch(models.Model):
@@ -68,6 +103,24 @@ class SavedSearch(models.Model):
         unique_together = ('user', 'name')
 
 
+class SavedSearchMatch(models.Model):
+    """
+    One listing that matched one saved search (found by the instant
+    alerts or by send_search_alerts), so it is never sent twice.
+    """
+    search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name="matches")
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Empty while it waits for the user's daily / weekly digest
+    emailed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('search', 'property')
+
+    def __str__(self):
+        return f"{self.search} - {self.property_id}"
+
+
 
 
 # accounts/models.py  for rating system
@@ -0,0 +1,106 @@
+# accounts/notifications.py
+
+"""
+A small cached "summary" of a user's unread notifications
+(the number on the bell and the newest 5 for the dropdown).
+
+Every page render needs it, so it is kept in the Django cache for
+NOTIFICATION_CACHE_SECONDS and thrown away (see accounts/signals.py)
+as soon as one of the user's notifications is created, changed or
+deleted.
+
+The number itself is User.unread_notifications_count. It is only
+changed with single UPDATE ... F() statements (never read, changed and
+saved back), and 'manage.py reconcile_notification_counts' recounts it
+if it ever drifts.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Notification, User
+
+NOTIFICATION_CACHE_SECONDS = getattr(settings, 'NOTIFICATION_CACHE_SECONDS', 60)
+
+# How many notifications the bell dropdown shows
+NOTIFICATION_DROPDOWN_SIZE = 5
+
+
+def summary_cache_key(user_id):
+    return f"notification-summary:{user_id}"
+
+
+def get_notification_summary(user):
+    """
+    Returns {'count': ..., 'items': [...]} for the bell, from the cache
+    if possible. 'items' are Notification objects (newest first).
+    """
+    key = summary_cache_key(user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        # The count is a stored counter on the user (no COUNT query)
+        count = user.unread_notifications_count
+        items = []
+        if count:
+            items = list(
+                Notification.objects.filter(recipient=user, is_read=False)[:NOTIFICATION_DROPDOWN_SIZE]
+            )
+        summary = {'count': count, 'items': items}
+        cache.set(key, summary, NOTIFICATION_CACHE_SECONDS)
+    return summary
+
+
+def forget_notification_summary(user_id):
+    """
+    Called whenever one of the user's notifications changes.
+    """
+    cache.delete(summary_cache_key(user_id))
+
+
+# --- THE UNREAD COUNTER ---
+
+def change_unread_count(user_id, change):
+    """
+    One atomic "count = count + change" in the database, never below zero.
+    """
+    if change:
+        User.objects.filter(pk=user_id).update(
+            unread_notifications_count=Greatest(F('unread_notifications_count') + change, Value(0))
+        )
+
+
+def mark_notification_read(notification):
+    """
+    Marks one notification as read. Only the request whose UPDATE really
+    flipped it takes it off the counter, so two clicks at once count once.
+    Returns True if it was unread.
+    """
+    flipped = Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True)
+    notification.is_read = True
+    if flipped:
+        change_unread_count(notification.recipient_id, -1)
+        forget_notification_summary(notification.recipient_id)
+    return bool(flipped)
+
+
+def reconcile_unread_counts():
+    """
+    Recounts the counter of every user whose stored number is not the
+    real number of unread notifications. Returns those users' ids.
+    """
+    unread = Subquery(
+        Notification.objects.filter(recipient=OuterRef('pk'), is_read=False)
+        .order_by().values('recipient').annotate(total=Count('id')).values('total')
+    )
+    drifted = list(
+        User.objects.annotate(actual=Coalesce(unread, 0))
+        .exclude(unread_notifications_count=F('actual'))
+        .values_list('pk', flat=True)
+    )
+    if drifted:
+        User.objects.filter(pk__in=drifted).update(unread_notifications_count=Coalesce(unread, 0))
+        for user_id in drifted:
+            forget_notification_summary(user_id)
+    return drifted
@@ -0,0 +1,293 @@
+# accounts/percolator.py
+
+"""
+Instant saved-search alerts (a "percolator").
+
+send_search_alerts looks for new listings per search. This works the
+other way round: when a listing is published (created as Active, or
+set back to Active), we look up which saved searches it matches and
+alert those users right away.
+
+To do that without scanning every SavedSearch, we keep a reverse index
+of the active searches in memory:
+    city / property type / purpose -> the searches that ask for it
+    (plus the searches that left that criterion empty)
+    keyword word -> the searches whose keyword contains that word
+so a new listing only has to look at a handful of searches.
+
+The index is kept up to date by accounts/signals.py and rebuilt every
+MAX_AGE_SECONDS (searches saved in another process are picked up then,
+and send_search_alerts still catches anything missed in between).
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import close_old_connections
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from properties.models import Property, PropertyStatus
+from properties.search import search_tokens
+
+from .alerts import AlertListing, already_alerted, build_alert_email, listing_matches, record_matches
+from .models import AlertFrequency, Notification, SavedSearch, SavedSearchMatch, User
+from .notifications import forget_notification_summary
+
+logger = logging.getLogger(__name__)
+
+
+class SearchPercolator:
+    """
+    A reverse index over the criteria of all active saved searches.
+    """
+
+    MAX_AGE_SECONDS = 300
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._searches = {}
+
+    # --- 1. BUILDING THE INDEX ---
+
+    def build(self):
+        searches = SavedSearch.objects.filter(is_active=True).only(
+            'id', 'keyword', 'city_id', 'property_type', 'purpose',
+            'min_price', 'max_price', 'min_bedrooms',
+        )
+        with self._lock:
+            self._searches = {}
+            self._by_city = defaultdict(set)
+            self._by_type = defaultdict(set)
+            self._by_purpose = defaultdict(set)
+            self._by_word = defaultdict(set)
+            self._keywords = {}
+            for search in searches:
+                self._add(search)
+            self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > self.MAX_AGE_SECONDS:
+                self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _add(self, search):
+        # 'None' collects the searches that left the criterion empty
+        self._searches[search.id] = search
+        self._by_city[search.city_id or None].add(search.id)
+        self._by_type[search.property_type or None].add(search.id)
+        self._by_purpose[search.purpose or None].add(search.id)
+
+        words = search_tokens(search.keyword)
+        self._keywords[search.id] = words
+        if words:
+            # Every word must match, so indexing the longest (the rarest) is enough
+            self._by_word[max(words, key=len)].add(search.id)
+        else:
+            self._by_word[None].add(search.id)
+
+    def _remove(self, search_id):
+        search = self._searches.pop(search_id, None)
+        if search is None:
+            return
+        self._by_city[search.city_id or None].discard(search_id)
+        self._by_type[search.property_type or None].discard(search_id)
+        self._by_purpose[search.purpose or None].discard(search_id)
+        words = self._keywords.pop(search_id)
+        self._by_word[max(words, key=len) if words else None].discard(search_id)
+
+    # --- 2. INCREMENTAL UPDATES (from accounts/signals.py) ---
+
+    def update_search(self, search):
+        with self._lock:
+            if self._built_at is None:
+                return  # Not built yet: the next build reads it anyway
+            self._remove(search.id)
+            if search.is_active:
+                self._add(search)
+
+    def remove_search(self, search_id):
+        with self._lock:
+            if self._built_at is not None:
+                self._remove(search_id)
+
+    # --- 3. MATCHING ONE LISTING ---
+
+    def match(self, listing, words):
+        """
+        The ids of the searches that 'listing' (an AlertListing) matches.
+        'words' are the words of the listing's title, description, area
+        and city, like the full-text index sees them.
+        """
+        self.ensure_built()
+
+        # Every word of the listing also matches as a prefix ('dha lah'),
+        # just like the search page
+        prefixes = {word[:end] for word in words for end in range(1, len(word) + 1)}
+
+        with self._lock:
+            postings = [
+                self._by_city[None] | self._by_city.get(listing.city_id, set()),
+                self._by_type[None] | self._by_type.get(listing.property_type, set()),
+                self._by_purpose[None] | self._by_purpose.get(listing.purpose, set()),
+                self._by_word[None].union(*(self._by_word.get(prefix, ()) for prefix in prefixes)),
+            ]
+            # Start from the smallest set, so the intersection is cheap
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+
+            return sorted(
+                search_id for search_id in candidates
+                if listing_matches(self._searches[search_id], listing)
+                and set(self._keywords[search_id]) <= prefixes
+            )
+
+
+# One shared index per process
+percolator = SearchPercolator()
+
+
+# --- 4. SENDING THE ALERTS ---
+
+def listing_for_alerts(property_id):
+    """
+    (AlertListing, words) for an Active listing, or None.
+    """
+    row = (
+        Property.objects.filter(pk=property_id, status=PropertyStatus.ACTIVE)
+        .values_list(
+            'id', 'created_at', 'area__city_id', 'property_type', 'purpose', 'price', 'bedrooms',
+            'title', 'description', 'area__name', 'area__city__name',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    words = set()
+    for text in row[7:]:
+        words.update(search_tokens(text))
+    return AlertListing(*row[:7]), words
+
+
+def send_instant_alerts(property_id):
+    """
+    Finds the saved searches a freshly published listing matches and
+    sends each of them a notification (the bell) and, unless the user
+    prefers a digest, an email.
+    Returns the number of searches alerted.
+    """
+    found = listing_for_alerts(property_id)
+    if found is None:
+        return 0
+    search_ids = percolator.match(*found)
+    if not search_ids:
+        return 0
+
+    # The index may be a little old: re-read the searches themselves
+    searches = [
+        search for search in SavedSearch.objects.filter(pk__in=search_ids, is_active=True).select_related('user')
+        if listing_matches(search, found[0])
+    ]
+    done = already_alerted([search.id for search in searches], [property_id])
+    searches = [search for search in searches if (search.id, property_id) not in done]
+    if not searches:
+        return 0
+    record_matches([(search.id, property_id) for search in searches])
+
+    property = Property.objects.select_related('area__city').get(pk=property_id)
+
+    # 1. The bell: one row per search, then the counters and cached summaries
+    link_url = reverse('property_detail', kwargs={'pk': property_id})
+    Notification.objects.bulk_create([
+        Notification(
+            recipient=search.user,
+            message=f"New listing for your saved search '{search.name}': {property.title}"[:255],
+            link_url=link_url,
+        )
+        for search in searches
+    ])
+    # (bulk_create skips the signals, so we do their job here)
+    per_user = defaultdict(int)
+    for search in searches:
+        per_user[search.user_id] += 1
+    for user_id, count in per_user.items():
+        User.objects.filter(pk=user_id).update(
+            unread_notifications_count=F('unread_notifications_count') + count
+        )
+        forget_notification_summary(user_id)
+
+    # 2. One email per user (even if several of their searches matched).
+    #    Digest users get theirs from send_search_alerts later on.
+    per_user_searches = defaultdict(list)
+    for search in searches:
+        if search.user.alert_frequency == AlertFrequency.IMMEDIATE and search.user.email:
+            per_user_searches[search.user_id].append(search)
+    emails = [
+        build_alert_email(user_searches[0].user, [(property, [search.name for search in user_searches])])
+        for user_searches in per_user_searches.values()
+    ]
+    if emails:
+        try:
+            get_connection().send_messages(emails)
+        except Exception:
+            # The matches stay waiting, so send_search_alerts sends them
+            logger.exception("Could not send the instant alerts for property %s", property_id)
+        else:
+            SavedSearchMatch.objects.filter(
+                search_id__in=[search.id for user_searches in per_user_searches.values() for search in user_searches],
+                property_id=property_id,
+            ).update(emailed_at=timezone.now())
+
+    return len(searches)
+
+
+class InstantAlertQueue:
+    """
+    Runs send_instant_alerts in a background thread, so publishing a
+    listing doesn't wait for the emails.
+    (With SEARCH_ALERTS_IN_BACKGROUND = False they run right away.)
+    """
+
+    def __init__(self, in_background=True):
+        self.in_background = in_background
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def put(self, property_id):
+        if not self.in_background:
+            send_instant_alerts(property_id)
+            return
+        self._queue.put(property_id)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            property_id = self._queue.get()
+            try:
+                send_instant_alerts(property_id)
+            except Exception:
+                # The listing is still picked up by send_search_alerts
+                logger.exception("Instant search alerts failed for property %s", property_id)
+            finally:
+                close_old_connections()
+                self._queue.task_done()
+
+
+alert_queue = InstantAlertQueue(
+    in_background=getattr(settings, 'SEARCH_ALERTS_IN_BACKGROUND', True),
+)
@@ -0,0 +1,106 @@
+# accounts/signals.py
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from properties.models import Property, PropertyStatus
+from .models import User, Notification, SavedSearch
+from .favorites import forget_favorites
+from .notifications import change_unread_count, forget_notification_summary
+from .percolator import percolator, alert_queue
+
+
+# --- KEEP THE "UNREAD NOTIFICATIONS" COUNTER (the bell) UP TO DATE ---
+# (The bell's own "mark as read" doesn't save(): see
+#  notifications.mark_notification_read)
+
+@receiver(pre_save, sender=Notification)
+def remember_notification_state(sender, instance, **kwargs):
+    """
+    Remembers whether the notification was unread before this save
+    (e.g. mark_notification_read flips it to read).
+    """
+    instance._was_unread = False
+    if instance.pk:
+        instance._was_unread = Notification.objects.filter(pk=instance.pk, is_read=False).exists()
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_notifications_on_save(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    is_unread = not instance.is_read
+    change_unread_count(instance.recipient_id, int(is_unread) - int(instance._was_unread))
+    # The cached bell summary is out of date now
+    forget_notification_summary(instance.recipient_id)
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_notifications_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        change_unread_count(instance.recipient_id, -1)
+    forget_notification_summary(instance.recipient_id)
+
+
+# --- INSTANT SAVED-SEARCH ALERTS (see percolator.py) ---
+
+@receiver(pre_save, sender=Property)
+def remember_property_was_active(sender, instance, **kwargs):
+    """
+    Remembers whether the listing was already Active before this save,
+    so only a *newly* published listing sends alerts.
+    """
+    instance._was_active = False
+    if instance.pk:
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' not in update_fields:
+            instance._was_active = True  # The status doesn't change
+            return
+        instance._was_active = Property.objects.filter(pk=instance.pk, status=PropertyStatus.ACTIVE).exists()
+
+
+@receiver(post_save, sender=Property)
+def alert_saved_searches(sender, instance, created, **kwargs):
+    if kwargs.get('raw') or instance.status != PropertyStatus.ACTIVE:
+        return
+    if created or not getattr(instance, '_was_active', True):
+        # Only once the listing is really saved
+        property_id = instance.pk
+        transaction.on_commit(lambda: alert_queue.put(property_id))
+
+
+@receiver(post_save, sender=SavedSearch)
+def update_percolator_search(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        percolator.update_search(instance)
+
+
+@receiver(post_delete, sender=SavedSearch)
+def remove_percolator_search(sender, instance, **kwargs):
+    percolator.remove_search(instance.pk)
+
+
+# --- FORGET THE CACHED FAVORITES WHEN THEY CHANGE (see favorites.py) ---
+
+@receiver(m2m_changed, sender=User.favorites.through)
+def favorites_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        # user.favorites.add(...) / remove(...) / clear()
+        forget_favorites(instance.pk)
+    elif pk_set is not None:
+        # property.favorited_by.add(users...)
+        for user_id in pk_set:
+            forget_favorites(user_id)
+    else:
+        # property.favorited_by.clear(): we don't know who it was
+        for user_id in getattr(instance, '_favorited_by_before', ()):
+            forget_favorites(user_id)
+
+
+@receiver(m2m_changed, sender=User.favorites.through)
+def remember_favorited_by(sender, instance, action, reverse, **kwargs):
+    if reverse and action == 'pre_clear':
+        instance._favorited_by_before = list(instance.favorited_by.values_list('pk', flat=True))
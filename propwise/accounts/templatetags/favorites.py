@@ -0,0 +1,23 @@
+# accounts/templatetags/favorites.py
+
+"""
+{% load favorites %}
+
+{% if prop|is_favorite:request %}
+    True if the logged-in user saved this listing. The saved ids are
+    loaded once per page (see accounts/favorites.py), so every card is
+    a set lookup instead of a query.
+"""
+
+from django import template
+
+from accounts.favorites import favorite_ids
+
+register = template.Library()
+
+
+@register.filter
+def is_favorite(prop, request):
+    if prop is None or not hasattr(request, 'user'):
+        return False
+    return prop.pk in favorite_ids(request)
@@ -1,3 +1,57 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from .models import Notification, User
+from .notifications import mark_notification_read
+
+
+class UnreadNotificationCountTests(TestCase):
+    """
+    The bell's stored counter (User.unread_notifications_count) follows
+    the notifications, and nothing writes back an old value.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='secret')
+        self.notification = Notification.objects.create(recipient=self.user, message='Hi', link_url='/')
+
+    def count(self):
+        return User.objects.get(pk=self.user.pk).unread_notifications_count
+
+    def test_marking_read_twice_counts_once(self):
+        self.assertEqual(self.count(), 1)
+        # Two requests that both loaded the notification while it was unread
+        first = Notification.objects.get(pk=self.notification.pk)
+        second = Notification.objects.get(pk=self.notification.pk)
+        self.assertTrue(mark_notification_read(first))
+        self.assertFalse(mark_notification_read(second))
+        self.assertEqual(self.count(), 0)
+
+        self.client.force_login(self.user)
+        self.client.get(reverse('mark_notification_read', args=[self.notification.pk]))
+        self.assertEqual(self.count(), 0)
+
+    def test_profile_form_keeps_the_counter(self):
+        self.client.force_login(self.user)
+        # Loaded with the request; a notification arrives before the save
+        loaded = User.objects.get(pk=self.user.pk)
+        Notification.objects.create(recipient=self.user, message='Another', link_url='/')
+        loaded.first_name = 'Ali'
+        loaded.save()
+        self.assertEqual(self.count(), 2)
+
+        response = self.client.post(reverse('profile'), {
+            'first_name': 'Ali', 'last_name': 'Khan', 'email': 'ali@example.com',
+            'phone_number': '', 'alert_frequency': 'immediate',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(User.objects.get(pk=self.user.pk).last_name, 'Khan')
 
-# Create your tests here.
+    def test_reconcile_command(self):
+        User.objects.filter(pk=self.user.pk).update(unread_notifications_count=7)
+        call_command('reconcile_notification_counts', stdout=StringIO())
+        self.assertEqual(self.count(), 1)
@@ -20,6 +20,7 @@ from .models import AgentRating, Lead, Notification, VisitRequest, LeadStatus #
 from .forms import AgentRatingForm, LeadForm, VisitRequestForm # <-- ADD VisitRequestForm
 from django.urls import reverse
 from django.views.decorators.http import require_POST
+from . import notifications
 
 
 
@@ -315,8 +316,7 @@ def mark_notification_read(request, pk):
 
     # Security: Only the recipient can mark it as read
     if request.user == notification.recipient:
-        notification.is_read = True
-        notification.save()
+        notifications.mark_notification_read(notification)
         return redirect(notification.link_url)
     
     # If security fails, just go home
@@ -0,0 +1,73 @@
+# chat/consumers.py
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+
+from .forms import ChatMessageForm
+from .models import ChatThread
+from .realtime import thread_group, post_message, mark_thread_read
+
+
+class ChatConsumer(JsonWebsocketConsumer):
+    """
+    One open chat window (ws/chat/<thread_id>/).
+
+    The browser sends:
+        {"type": "message", "body": "..."}   -> save and push to both sides
+        {"type": "read"}                      -> mark the thread as read
+    and receives:
+        {"type": "message", "message": {...}}
+        {"type": "read", "reader_id": ..., "up_to_id": ...}
+    """
+
+    def connect(self):
+        self.group_name = None
+        user = self.scope.get('user')
+        thread_id = self.scope['url_route']['kwargs']['thread_id']
+        thread = ChatThread.objects.filter(id=thread_id).first()
+
+        # Security check: only the buyer and the agent may listen
+        if (
+            thread is None
+            or user is None
+            or not user.is_authenticated
+            or user.id not in (thread.buyer_id, thread.agent_id)
+        ):
+            self.close()
+            return
+
+        self.thread = thread
+        self.user = user
+        self.group_name = thread_group(thread.id)
+        async_to_sync(self.channel_layer.group_add)(self.group_name, self.channel_name)
+        self.accept()
+
+        # Opening the chat counts as reading it
+        mark_thread_read(self.thread, self.user)
+
+    def disconnect(self, code):
+        if self.group_name:
+            async_to_sync(self.channel_layer.group_discard)(self.group_name, self.channel_name)
+
+    def receive_json(self, content, **kwargs):
+        if content.get('type') == 'message':
+            form = ChatMessageForm({'body': content.get('body', '')})
+            if form.is_valid():
+                post_message(self.thread, self.user, form.cleaned_data['body'])
+            else:
+                self.send_json({'type': 'error', 'errors': form.errors})
+
+        elif content.get('type') == 'read':
+            mark_thread_read(self.thread, self.user)
+
+    # --- Events from the channel layer (see realtime.py) ---
+
+    def chat_message(self, event):
+        self.send_json({'type': 'message', 'message': event['message']})
+
+    def chat_read(self, event):
+        self.send_json({
+            'type': 'read',
+            'reader_id': event['reader_id'],
+            'up_to_id': event['up_to_id'],
+        })
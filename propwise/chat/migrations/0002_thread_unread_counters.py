@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_thread_counters(apps, schema_editor):
+    # Start the new counters from the messages that are already there
+    ChatThread = apps.get_model('chat', 'ChatThread')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+
+    def unread_from(sender):
+        return Subquery(
+            ChatMessage.objects.filter(thread=OuterRef('pk'), sender=OuterRef(sender), is_read=False)
+            .order_by().values('thread').annotate(total=Count('id')).values('total')
+        )
+
+    last_message = (
+        ChatMessage.objects.filter(thread=OuterRef('pk'))
+        .order_by().values('thread').annotate(last=Max('id')).values('last')
+    )
+    ChatThread.objects.update(
+        buyer_unread_count=Coalesce(unread_from('agent'), 0),
+        agent_unread_count=Coalesce(unread_from('buyer'), 0),
+        last_message=Subquery(last_message),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatthread',
+            name='agent_unread_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chatthread',
+            name='buyer_unread_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chatthread',
+            name='last_message',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.chatmessage'),
+        ),
+        migrations.RunPython(fill_thread_counters, migrations.RunPython.noop),
+    ]
@@ -37,6 +37,25 @@ class ChatThread(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # --- Inbox counters (kept up to date by chat/signals.py and realtime.py) ---
+    # So the inbox can show "3 unread" and a preview without counting messages.
+    last_message = models.ForeignKey(
+        'ChatMessage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        editable=False
+    )
+    buyer_unread_count = models.PositiveIntegerField(default=0, editable=False)
+    agent_unread_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def unread_field_for(self, user):
+        """
+        The name of the counter that holds 'user's unread messages.
+        """
+        return 'buyer_unread_count' if user.id == self.buyer_id else 'agent_unread_count'
+
     def __str__(self):
         prop_title = self.property.title if self.property else "Deleted Property"
         return f"Chat about '{prop_title}' between {self.buyer.username} and {self.agent.username}"
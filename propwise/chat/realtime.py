@@ -0,0 +1,91 @@
+# chat/realtime.py
+
+"""
+Pushes chat events (new messages, read receipts) to the open chat
+windows of both participants through the Channels "channel layer".
+
+Both the WebSocket consumer (consumers.py) and the normal HTTP views
+use these helpers, so a message sent either way shows up live.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Greatest
+
+from .models import ChatThread
+
+
+def thread_group(thread_id):
+    """
+    The channel-layer group that every open window of a thread joins.
+    """
+    return f"chat_thread_{thread_id}"
+
+
+def message_payload(message):
+    """
+    The JSON form of one message (the same for the API and the WebSocket).
+    """
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'sender_username': message.sender.username if message.sender else "Deleted User",
+        'body': message.body,
+        'timestamp': message.timestamp.strftime("%b %d, %Y, %I:%M %p"),
+        'is_read': message.is_read,
+    }
+
+
+def _broadcast(thread_id, event):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return  # No CHANNEL_LAYERS configured: the page falls back to polling
+
+    # Only push once the change is really saved
+    transaction.on_commit(
+        lambda: async_to_sync(channel_layer.group_send)(thread_group(thread_id), event)
+    )
+
+
+def post_message(thread, sender, body):
+    """
+    Saves a new message, moves the thread to the top of the inbox
+    and pushes the message to both participants.
+    """
+    message = thread.messages.create(sender=sender, body=body)
+
+    # Update the thread's timestamp so it moves to the top of the inbox.
+    # (Only that field: the unread counters were just changed by signals.py)
+    thread.save(update_fields=['updated_at'])
+
+    _broadcast(thread.id, {'type': 'chat.message', 'message': message_payload(message)})
+    return message
+
+
+def mark_thread_read(thread, reader):
+    """
+    Marks the other participant's messages as read and, if anything
+    changed, tells both windows ("Seen").
+    """
+    unread = thread.messages.filter(is_read=False).exclude(sender=reader)
+    last_unread_id = unread.aggregate(last=Max('id'))['last']
+    if last_unread_id is None:
+        return 0
+
+    updated = unread.filter(id__lte=last_unread_id).update(is_read=True)
+
+    # Take exactly those messages off the reader's inbox counter
+    # (never below zero, e.g. for messages of a deleted user)
+    counter = thread.unread_field_for(reader)
+    ChatThread.objects.filter(pk=thread.pk).update(
+        **{counter: Greatest(F(counter) - updated, Value(0))}
+    )
+
+    _broadcast(thread.id, {
+        'type': 'chat.read',
+        'reader_id': reader.id,
+        'up_to_id': last_unread_id,
+    })
+    return updated
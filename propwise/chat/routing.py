@@ -0,0 +1,9 @@
+# chat/routing.py
+
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    # ws://<host>/ws/chat/<thread_id>/
+    path('ws/chat/<int:thread_id>/', consumers.ChatConsumer.as_asgi()),
+]
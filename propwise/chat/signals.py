@@ -0,0 +1,30 @@
+# chat/signals.py
+
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import ChatThread, ChatMessage
+
+
+# --- KEEP THE INBOX COUNTERS UP TO DATE ---
+
+@receiver(post_save, sender=ChatMessage)
+def count_new_message(sender, instance, created, **kwargs):
+    """
+    A new message is "unread" for the other participant,
+    and becomes the thread's last message (the inbox preview).
+    """
+    if not created or kwargs.get('raw'):
+        return
+
+    thread = instance.thread
+    changes = {'last_message': instance}
+    if instance.sender_id is not None and not instance.is_read:
+        if instance.sender_id == thread.buyer_id:
+            changes['agent_unread_count'] = F('agent_unread_count') + 1
+        else:
+            changes['buyer_unread_count'] = F('buyer_unread_count') + 1
+
+    # One atomic UPDATE (no read-modify-write, safe with two people typing)
+    ChatThread.objects.filter(pk=thread.pk).update(**changes)
@@ -1,13 +1,16 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db.models import Q, Max, F, Case, When
 from django.http import HttpResponseForbidden, JsonResponse
 from django.contrib.auth import get_user_model
 from django.urls import reverse # Needed for notification links
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
 # --- Local Imports ---
 from .models import ChatThread, ChatMessage
 from .forms import ChatMessageForm
+from .realtime import post_message, mark_thread_read, message_payload
 from properties.models import Property
 
 # --- Imports for our "Magic" Integrations ---
@@ -21,8 +24,17 @@ def chat_inbox_view(request):
     Display all active chat threads for the current user.
     """
     # We find all threads where the user is EITHER the buyer OR the agent.
+    # The unread count and the preview come from the stored counters
+    # (see chat/signals.py), and everything is loaded in ONE query.
     threads = ChatThread.objects.filter(
         Q(buyer=request.user) | Q(agent=request.user)
+    ).select_related(
+        'property', 'buyer', 'agent', 'last_message'
+    ).annotate(
+        my_unread_count=Case(
+            When(buyer=request.user, then=F('buyer_unread_count')),
+            default=F('agent_unread_count')
+        )
     ).order_by('-updated_at')
 
     context = {
@@ -106,19 +118,15 @@ def chat_detail_view(request, thread_id):
 
     # Mark messages as read when loading the page (GET request)
     if request.method == 'GET':
-        thread.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
+        mark_thread_read(thread, request.user)
 
     # Handle Sending Messages (POST request)
+    # (the page normally sends over the WebSocket; this is the fallback)
     if request.method == 'POST':
         form = ChatMessageForm(request.POST)
         if form.is_valid():
-            message = form.save(commit=False)
-            message.thread = thread
-            message.sender = request.user
-            message.save()
-            
-            # Update the thread's timestamp so it moves to the top of the inbox
-            thread.save() 
+            # Saves the message, bumps the thread and pushes it to both windows
+            post_message(thread, request.user, form.cleaned_data['body'])
             
             # Return JSON for JavaScript to handle
             return JsonResponse({"status": "success", "message": "Message sent!"})
@@ -137,27 +145,58 @@ def chat_detail_view(request, thread_id):
 @login_required(login_url='login')
 def get_messages_api(request, thread_id):
     """
-    An API view that returns all messages for a thread in JSON format.
-    Used by JavaScript to refresh the chat without reloading the page.
+    An API view that returns the messages of a thread in JSON format.
+    Used by JavaScript to refresh the chat without reloading the page
+    (only when the live WebSocket connection is not available).
+
+    ?after_id=<id> returns only the messages newer than that one.
+    The response has an ETag, so an idle poll gets "304 Not Modified"
+    (one small query, no body).
     """
-    thread = get_object_or_404(ChatThread, id=thread_id)
+    # One query: the thread (which stores its last message id, see
+    # chat/signals.py) and the last of MY messages the other person
+    # has read ("Seen").
+    thread = get_object_or_404(
+        ChatThread.objects.annotate(
+            last_seen_id=Max(
+                'messages__id',
+                filter=Q(messages__sender=request.user, messages__is_read=True)
+            ),
+        ),
+        id=thread_id
+    )
     
-    # Security check
-    if request.user != thread.buyer and request.user != thread.agent:
+    # Security check (comparing ids, so no extra query for the users)
+    if request.user.id not in (thread.buyer_id, thread.agent_id):
         return JsonResponse({"error": "Not authorized"}, status=403)
+
+    try:
+        after_id = int(request.GET.get('after_id', 0))
+    except ValueError:
+        after_id = 0
+
+    # Nothing new since the last poll? Then we are done.
+    etag = quote_etag(f"{thread.id}-{request.user.id}-{after_id}-{thread.last_message_id}-{thread.last_seen_id}")
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
         
     # Mark messages as read
-    thread.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
+    mark_thread_read(thread, request.user)
 
-    # Build the list of messages
+    # Build the list of (new) messages, with the senders in the same query
     message_list = []
-    for message in thread.messages.all():
+    for message in thread.messages.filter(id__gt=after_id).select_related('sender'):
         message_list.append({
-            'id': message.id,
-            'sender_username': message.sender.username if message.sender else "Deleted User",
-            'body': message.body,
-            'timestamp': message.timestamp.strftime("%b %d, %Y, %I:%M %p"),
-            'is_sender': message.sender == request.user
+            **message_payload(message),
+            'is_sender': message.sender_id == request.user.id
         })
     
-    return JsonResponse({'messages': message_list})
\ No newline at end of file
+    response = JsonResponse({
+        'messages': message_list,
+        'last_seen_id': thread.last_seen_id,
+    })
+    response['ETag'] = etag
+    # The browser must check back every time (with If-None-Match)
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,248 @@
+# core/images.py
+
+"""
+Smaller copies ("derivatives") of the uploaded photos.
+
+Listing photos and profile pictures are uploaded straight from phones
+and cameras (often several MB each). For every uploaded image we make:
+
+    thumbnail  320 px wide   (gallery thumbs, avatars, map popups)
+    card       640 px wide   (search / homepage cards)
+    full      1600 px wide   (the big photo on the listing page)
+
+each as WebP and as JPEG (for the browsers and email clients without
+WebP). The copies are turned the right way up and saved WITHOUT the
+EXIF data, so the camera's GPS position and serial number are not
+published with them.
+
+The paths are stored next to the image field, in a JSON field named
+'<field>_derivatives' (e.g. Property.main_image_derivatives):
+
+    {'source': 'properties/main_images/house.jpg',
+     'sizes': {'card': {'width': 640, 'height': 427,
+                        'webp': '.../house-card.webp', 'jpeg': '.../house-card.jpg'}, ...}}
+
+The work is done by a background thread after the upload is saved
+(see core/signals.py), and the templates pick the right file with
+{% responsive_image %} (see core/templatetags/images.py).
+"""
+
+import io
+import logging
+import os
+import queue
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.db.models import Q
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# name -> maximum width in pixels (smallest first)
+DERIVATIVE_SIZES = {
+    'thumbnail': 320,
+    'card': 640,
+    'full': 1600,
+}
+
+# format -> (Pillow format, file extension, save options)
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# The image fields that get derivatives: (app_label.Model, field name)
+IMAGE_FIELDS = [
+    ('properties.Property', 'main_image'),
+    ('properties.PropertyImage', 'image'),
+    ('accounts.User', 'profile_picture'),
+]
+
+# Sent (with the model as sender) when an instance got its new derivatives
+derivatives_ready = Signal()
+
+
+def derivatives_field(field_name):
+    return f'{field_name}_derivatives'
+
+
+def derivative_path(name, derivatives, size, image_format='jpeg'):
+    """
+    The stored path of one derivative of the image file 'name', or
+    'name' itself if it has none (yet).
+    """
+    derivatives = derivatives or {}
+    entry = derivatives.get('sizes', {}).get(size)
+    if not name or derivatives.get('source') != name or entry is None:
+        return name
+    return entry[image_format]
+
+
+def derivative_url(field_file, size, image_format='jpeg'):
+    """
+    The URL of one derivative of an image field, or of the original
+    if it has none (yet). None if there is no image at all.
+    """
+    if not field_file:
+        return None
+    derivatives = getattr(field_file.instance, derivatives_field(field_file.field.name), None)
+    return field_file.storage.url(derivative_path(field_file.name, derivatives, size, image_format))
+
+
+# --- 1. MAKING THE COPIES ---
+
+def _open_upright(field_file):
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image.load()
+    finally:
+        field_file.close()
+    # Phones store "rotate me" in the EXIF data, which we are about to drop
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+
+def _encode(image, image_format):
+    pillow_format, _, options = DERIVATIVE_FORMATS[image_format]
+    if pillow_format == 'JPEG' and image.mode == 'RGBA':
+        # JPEG has no transparency: put the image on a white background
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    output = io.BytesIO()
+    # No exif=... here, so none of the original metadata is written
+    image.save(output, pillow_format, **options)
+    return output.getvalue()
+
+
+def make_derivatives(field_file):
+    """
+    Writes the derivatives of one image to its storage and returns the
+    '<field>_derivatives' value for it.
+    """
+    original = _open_upright(field_file)
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+
+    sizes = {}
+    previous = None
+    for size, max_width in DERIVATIVE_SIZES.items():
+        width = min(original.width, max_width)
+        if previous is not None and previous['width'] == width:
+            # A small photo: the bigger sizes are the same file
+            sizes[size] = previous
+            continue
+
+        height = max(1, round(original.height * width / original.width))
+        resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+        entry = {'width': width, 'height': height}
+        for image_format, (_, extension, _) in DERIVATIVE_FORMATS.items():
+            name = f"{directory}/derivatives/{stem}-{size}.{extension}"
+            entry[image_format] = field_file.storage.save(name, ContentFile(_encode(resized, image_format)))
+        sizes[size] = previous = entry
+
+    return {'source': field_file.name, 'sizes': sizes}
+
+
+def delete_derivatives(storage, derivatives):
+    paths = set()
+    for entry in (derivatives or {}).get('sizes', {}).values():
+        paths.update(entry[image_format] for image_format in DERIVATIVE_FORMATS)
+    for path in paths:
+        storage.delete(path)
+
+
+def generate_derivatives(model_label, pk, field_name):
+    """
+    Brings the derivatives of one image field up to date (makes them
+    for a new image, deletes them when the image was removed).
+    Returns True if anything changed.
+    """
+    model = apps.get_model(model_label)
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return False
+    field_file = getattr(instance, field_name)
+    target = derivatives_field(field_name)
+    old = getattr(instance, target) or {}
+
+    if not field_file:
+        if not old:
+            return False
+        new = {}
+    elif old.get('source') == field_file.name:
+        return False  # Already done
+    else:
+        new = make_derivatives(field_file)
+
+    # Only saved if the image wasn't replaced again in the meantime.
+    # (update() instead of save(): no signals, so no new job for this)
+    if field_file:
+        unchanged = Q(**{field_name: field_file.name})
+    else:
+        unchanged = Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True})
+    updated = model._default_manager.filter(unchanged, pk=pk).update(**{target: new})
+    storage = instance._meta.get_field(field_name).storage
+    if not updated:
+        delete_derivatives(storage, new)
+        return False
+    delete_derivatives(storage, old)
+    setattr(instance, target, new)
+    derivatives_ready.send(sender=model, instance=instance, field_name=field_name)
+    return True
+
+
+# --- 2. THE BACKGROUND WORKER ---
+
+class DerivativeQueue:
+    """
+    Runs generate_derivatives in a background thread, so an upload
+    doesn't wait for the resizing.
+    (With IMAGE_DERIVATIVES_IN_BACKGROUND = False it runs right away.)
+    """
+
+    def __init__(self, in_background=True):
+        self.in_background = in_background
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def put(self, model_label, pk, field_name):
+        job = (model_label, pk, field_name)
+        if not self.in_background:
+            self._run(job)
+            return
+        self._queue.put(job)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                close_old_connections()
+                self._queue.task_done()
+
+    def _run(self, job):
+        try:
+            generate_derivatives(*job)
+        except Exception:
+            # The original is still shown; generate_image_derivatives retries it
+            logger.exception("Could not make the image derivatives for %s %s.%s", *job)
+
+
+derivative_queue = DerivativeQueue(
+    in_background=getattr(settings, 'IMAGE_DERIVATIVES_IN_BACKGROUND', True),
+)
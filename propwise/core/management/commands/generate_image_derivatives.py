@@ -0,0 +1,40 @@
+# core/management/commands/generate_image_derivatives.py
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.images import IMAGE_FIELDS, generate_derivatives
+
+
+class Command(BaseCommand):
+    help = (
+        "Makes the thumbnail / card / full copies of every uploaded image that "
+        "doesn't have them yet (e.g. photos uploaded before core/images.py existed)."
+    )
+
+    def handle(self, *args, **options):
+        total = 0
+        failed = 0
+        for model_label, field_name in IMAGE_FIELDS:
+            model = apps.get_model(model_label)
+            pks = (
+                model._default_manager.exclude(Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True}))
+                .order_by('pk').values_list('pk', flat=True)
+            )
+            made = 0
+            for pk in pks.iterator():
+                try:
+                    # (Images that are already done are skipped inside)
+                    if generate_derivatives(model_label, pk, field_name):
+                        made += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(self.style.ERROR(f"{model_label} {pk}: {e}"))
+            self.stdout.write(f"{model_label}.{field_name}: {made} images done.")
+            total += made
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Made the derivatives of {total} images ({failed} failed)."
+        ))
@@ -0,0 +1,19 @@
+# core/migrations/0001_cache_table.py
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # The table of the DatabaseCache in settings.CACHES
+    # (does nothing for other cache backends, or if it exists already)
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = []
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
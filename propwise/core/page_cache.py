@@ -0,0 +1,150 @@
+# core/page_cache.py
+
+"""
+Whole-page caching for anonymous visitors.
+
+The homepage, the search page and the city / area pages look the same
+for every visitor who is not logged in, and only change when listings,
+areas, cities or amenities change. So for those visitors we keep the
+finished page in the cache.
+
+Instead of deleting cached pages when something changes, every page
+key includes a few "generation" numbers, e.g.
+
+    'listings'   - any listing changed (homepage, search)
+    'cities'     - a city was added, renamed or removed
+    'city:3'     - city 3 or one of its areas changed
+    'area:12'    - area 12, its listings, amenities or Q&A changed
+
+core/signals.py bumps the right numbers when a model is saved, and
+the old pages simply stop being used (and expire after
+PAGE_CACHE_SECONDS). A listing saved in Lahore only bumps 'listings'
+and its own area, so the other area pages stay cached.
+
+This needs a cache that all server processes share (see CACHES in
+settings.py): with a per-process cache, a save in one process would
+not make the pages of the other processes old.
+
+Logged-in users always get a freshly rendered page, with their own
+favorites, notifications and forms. So do visitors who have a session
+(e.g. a compare list, see add_to_compare_view): the cached pages are
+the ones rendered for a visitor WITHOUT any session data, which all
+look the same.
+"""
+
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+
+PAGE_CACHE_SECONDS = getattr(settings, 'PAGE_CACHE_SECONDS', 300)
+
+
+# --- 1. GENERATIONS ---
+
+def _generation_key(name):
+    return f"page-generation:{name}"
+
+
+def get_generations(names):
+    """
+    The current number of each generation, as a list in the same order.
+    """
+    keys = [_generation_key(name) for name in names]
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        # A new (or evicted) generation starts at "now", so it can
+        # never reuse the number of an older cached page
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump_generation(*names):
+    """
+    Marks every cached page that depends on these generations as old.
+    """
+    # A brand-new number (the time) instead of incr(): one plain write,
+    # which no other process can lose, whatever the cache backend
+    cache.set_many({_generation_key(name): time.time_ns() for name in set(names)}, None)
+
+
+# --- 2. THE PAGE KEY ---
+
+def normalized_query(query):
+    """
+    The GET parameters in a fixed order, without the empty ones, so
+    '?city=1&purpose=' and '?purpose=&city=1' are the same page.
+    """
+    return '&'.join(
+        f"{name}={value}"
+        for name in sorted(query)
+        for value in sorted(query.getlist(name))
+        if value != ''
+    )
+
+
+def page_cache_key(request, view_name, generations):
+    text = '|'.join([request.path, normalized_query(request.GET)] + [str(number) for number in generations])
+    digest = hashlib.md5(text.encode('utf-8')).hexdigest()
+    return f"page:{view_name}:{digest}"
+
+
+# --- 3. THE DECORATOR ---
+
+def _can_use_cache(request):
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    # The page may show what is in the visitor's session (the compare
+    # bar and checkboxes of the search page)
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    # A waiting "success" message must be shown to this visitor only
+    return not len(get_messages(request))
+
+
+def _can_store(request, response):
+    # (SessionMiddleware adds its cookie and 'Vary: Cookie' only after
+    # this decorator, so a session started by the view is checked here)
+    session = getattr(request, 'session', None)
+    return (
+        not (session is not None and session.modified)
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and 'cookie' not in response.get('Vary', '').lower()
+    )
+
+
+def cache_page_for_visitors(*generations):
+    """
+    Caches a function view for anonymous visitors. 'generations' are
+    the generation names the page depends on; they may use the URL
+    arguments of the view, e.g. 'area:{area_pk}'.
+
+        @cache_page_for_visitors('area:{area_pk}')
+        def area_detail_view(request, area_pk): ...
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _can_use_cache(request):
+                return view(request, *args, **kwargs)
+
+            names = [name.format(**kwargs) for name in generations]
+            key = page_cache_key(request, view.__name__, get_generations(names))
+            response = cache.get(key)
+            if response is not None:
+                return response
+
+            response = view(request, *args, **kwargs)
+            if _can_store(request, response):
+                cache.set(key, response, PAGE_CACHE_SECONDS)
+            return response
+        return wrapper
+    return decorator
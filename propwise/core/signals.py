@@ -0,0 +1,150 @@
+# core/signals.py
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from locations.models import Amenity, Answer, Area, City, Question
+from properties.models import Property, PropertyImage, ListingReport
+from .images import IMAGE_FIELDS, delete_derivatives, derivative_queue, derivatives_field, derivatives_ready
+from .page_cache import bump_generation
+
+
+def _value_in_database(instance, field_name):
+    if instance.pk is None:
+        return None
+    return (
+        type(instance)._default_manager.filter(pk=instance.pk)
+        .values_list(field_name, flat=True).first()
+    )
+
+
+# --- 1. MARK THE CACHED PAGES OF WHAT CHANGED AS OLD (see page_cache.py) ---
+
+@receiver(pre_save, sender=Property)
+@receiver(pre_save, sender=Amenity)
+def remember_area(sender, instance, **kwargs):
+    # A listing / amenity that moves changes the page of its OLD area too
+    instance._area_before = _value_in_database(instance, 'area_id')
+
+
+@receiver(pre_save, sender=Area)
+def remember_city(sender, instance, **kwargs):
+    instance._city_before = _value_in_database(instance, 'city_id')
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def listing_changed(sender, instance, **kwargs):
+    bump_generation(
+        'listings',
+        f'area:{instance.area_id}',
+        f'area:{getattr(instance, "_area_before", instance.area_id)}',
+    )
+
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+@receiver(post_save, sender=ListingReport)
+@receiver(post_delete, sender=ListingReport)
+def listing_rank_changed(sender, instance, **kwargs):
+    # Photos and reports change the order of the search results
+    bump_generation('listings')
+
+
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+def area_changed(sender, instance, **kwargs):
+    bump_generation(
+        'listings',
+        f'area:{instance.pk}',
+        f'city:{instance.city_id}',
+        f'city:{getattr(instance, "_city_before", instance.city_id)}',
+    )
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def city_changed(sender, instance, **kwargs):
+    # (The search cards and filters show the city names too)
+    bump_generation('cities', 'listings', f'city:{instance.pk}')
+
+
+@receiver(post_save, sender=Amenity)
+@receiver(post_delete, sender=Amenity)
+def amenity_changed(sender, instance, **kwargs):
+    bump_generation(
+        f'area:{instance.area_id}',
+        f'area:{getattr(instance, "_area_before", instance.area_id)}',
+    )
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    bump_generation(f'area:{instance.area_id}')
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    area_id = Question.objects.filter(pk=instance.question_id).values_list('area_id', flat=True).first()
+    bump_generation(f'area:{area_id}')
+
+
+@receiver(derivatives_ready, sender=Property)
+def listing_photo_ready(sender, instance, **kwargs):
+    # The cards can now use the small copies of the photo
+    bump_generation('listings', f'area:{instance.area_id}')
+
+
+# --- 2. MAKE THE SMALLER COPIES OF NEW PHOTOS (see images.py) ---
+
+def _image_fields(sender):
+    return [field_name for model_label, field_name in IMAGE_FIELDS if sender._meta.label == model_label]
+
+
+def keep_stored_derivatives(sender, instance, raw=False, **kwargs):
+    """
+    The background worker saves the derivatives with update(), so an
+    instance loaded before that still has the old value. Take the one
+    from the database, so save() never writes it back.
+    """
+    if raw or instance.pk is None:
+        return
+    for field_name in _image_fields(sender):
+        target = derivatives_field(field_name)
+        stored = _value_in_database(instance, target)
+        if stored is not None:
+            setattr(instance, target, stored)
+
+
+def queue_new_images(sender, instance, raw=False, **kwargs):
+    """
+    Hands a new (or removed) image to the derivative worker, once the
+    upload is committed.
+    """
+    if raw:
+        return
+    for field_name in _image_fields(sender):
+        image_name = getattr(instance, field_name).name or None
+        derivatives = getattr(instance, derivatives_field(field_name)) or {}
+        if image_name != derivatives.get('source'):
+            transaction.on_commit(
+                lambda field_name=field_name: derivative_queue.put(sender._meta.label, instance.pk, field_name)
+            )
+
+
+def delete_image_derivatives(sender, instance, **kwargs):
+    for field_name in _image_fields(sender):
+        derivatives = getattr(instance, derivatives_field(field_name))
+        storage = instance._meta.get_field(field_name).storage
+        transaction.on_commit(
+            lambda storage=storage, derivatives=derivatives: delete_derivatives(storage, derivatives)
+        )
+
+
+for model_label, _ in IMAGE_FIELDS:
+    pre_save.connect(keep_stored_derivatives, sender=model_label)
+    post_save.connect(queue_new_images, sender=model_label)
+    post_delete.connect(delete_image_derivatives, sender=model_label)
@@ -0,0 +1,73 @@
+# core/templatetags/images.py
+
+"""
+{% load images %}
+
+{% responsive_image prop.main_image 'card' alt=prop.title class='card-img' %}
+    A <picture> with the WebP and JPEG derivatives (see core/images.py)
+    in 'srcset', so the browser downloads the smallest file that is
+    sharp enough. 'card' is the size used for 'src'. Images without
+    derivatives (yet) simply show the original.
+
+{% derivative_url prop.main_image 'card' %}
+    Just the URL of one JPEG derivative (e.g. for emails).
+"""
+
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from core.images import DERIVATIVE_SIZES, derivative_url as _derivative_url, derivatives_field
+
+register = template.Library()
+
+# How wide the image is on the page, for the browser to choose from srcset
+DEFAULT_SIZES = {
+    'thumbnail': '160px',
+    'card': '(max-width: 768px) 100vw, 400px',
+    'full': '(max-width: 1200px) 100vw, 1200px',
+}
+
+
+def _srcset(field_file, entries, image_format):
+    return ', '.join(
+        f"{field_file.storage.url(entry[image_format])} {entry['width']}w" for entry in entries
+    )
+
+
+@register.simple_tag
+def responsive_image(field_file, size='card', **attributes):
+    if not field_file:
+        return ''
+    attributes.setdefault('loading', 'lazy')
+    derivatives = getattr(field_file.instance, derivatives_field(field_file.field.name), None) or {}
+    sizes = derivatives.get('sizes', {})
+
+    if derivatives.get('source') != field_file.name or size not in sizes:
+        # Not made yet: the original upload
+        return format_html(
+            '<img src="{}"{}>',
+            field_file.url,
+            format_html_join('', ' {}="{}"', attributes.items()),
+        )
+
+    # Every distinct width once, smallest first
+    entries = []
+    for name in DERIVATIVE_SIZES:
+        if name in sizes and sizes[name] not in entries:
+            entries.append(sizes[name])
+    attributes.setdefault('sizes', DEFAULT_SIZES.get(size, '100vw'))
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}"{}></picture>',
+        _srcset(field_file, entries, 'webp'),
+        attributes['sizes'],
+        field_file.storage.url(sizes[size]['jpeg']),
+        _srcset(field_file, entries, 'jpeg'),
+        format_html_join('', ' {}="{}"', attributes.items()),
+    )
+
+
+@register.simple_tag
+def derivative_url(field_file, size='card', image_format='jpeg'):
+    return _derivative_url(field_file, size, image_format) or ''
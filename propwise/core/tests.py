@@ -1,3 +1,38 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+
+class PageCacheTests(TestCase):
+    """
+    The page cache (page_cache.py) must never show one visitor's
+    session (e.g. the compare bar) to another visitor.
+    """
+
+    COMPARE_BAR = 'floating-compare-bar visible'
+
+    def setUp(self):
+        cache.clear()
+        self.search = reverse('property_search')
+
+    def test_compare_list_is_not_shared_between_visitors(self):
+        visitor_a, visitor_b = Client(), Client()
+        visitor_a.post(reverse('add_to_compare', args=[1]))
+
+        self.assertContains(visitor_a.get(self.search), self.COMPARE_BAR)
+        self.assertNotContains(visitor_b.get(self.search), self.COMPARE_BAR)
+        # Visitor B's page is now cached ...
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotContains(visitor_b.get(self.search), self.COMPARE_BAR)
+        self.assertTrue(all('propwise_cache' in query['sql'] for query in queries.captured_queries))
+        # ... but visitor A still gets their own
+        self.assertContains(visitor_a.get(self.search), self.COMPARE_BAR)
+
+    def test_cached_page_is_not_served_to_a_visitor_with_a_session(self):
+        visitor_a, visitor_b = Client(), Client()
+        visitor_b.get(self.search)
+        visitor_a.post(reverse('add_to_compare', args=[1]))
+        self.assertContains(visitor_a.get(self.search), self.COMPARE_BAR)
+        self.assertNotContains(visitor_b.get(self.search), self.COMPARE_BAR)
@@ -4,21 +4,22 @@ from django.shortcuts import render
 # --- 1. IMPORT PropertyStatus ---
 from properties.models import Property, PropertyStatus 
 from properties.filters import PropertyFilter
-from django.utils import timezone
+from .page_cache import cache_page_for_visitors
 
 # core/views.py
  
+# Cached for visitors who are not logged in (see page_cache.py)
+@cache_page_for_visitors('listings', 'cities')
 def homepage(request):
     """
     View for the homepage.
     NOW UPGRADED WITH AJAX FILTERING.
     """
-    now = timezone.now()
-    
+    # (Promotions that ended were already switched off by
+    # manage.py expire_featured_listings, see properties/featuring.py)
     featured_properties = Property.objects.filter(
         is_verified=True,
         is_featured=True,
-        featured_until__gte=now,
         status=PropertyStatus.ACTIVE 
     ).order_by('-created_at')
     
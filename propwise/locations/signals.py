@@ -0,0 +1,19 @@
+# locations/signals.py
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Amenity
+from .spatial import amenity_index
+
+
+# --- Keep the "nearby amenities" spatial index up to date ---
+
+@receiver(post_save, sender=Amenity)
+@receiver(post_delete, sender=Amenity)
+def amenity_changed(sender, instance, **kwargs):
+    """
+    Any amenity that is added, moved or removed makes the
+    in-memory index stale. It rebuilds itself on the next lookup.
+    """
+    amenity_index.invalidate()
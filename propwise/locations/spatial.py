@@ -0,0 +1,225 @@
+# locations/spatial.py
+
+"""
+A small in-memory "spatial index" over Amenity coordinates.
+
+Instead of measuring the distance to EVERY amenity in the database,
+we drop each amenity into a grid "bucket" (cell) based on its
+latitude/longitude. A "k nearest" lookup then only looks at the
+buckets around the property, using a fast vectorized (NumPy)
+haversine distance, and only re-checks the few finalists with
+geopy's exact geodesic distance (the same math the page used before).
+"""
+
+import math
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from geopy.distance import geodesic
+
+from .models import Amenity
+
+# Mean radius of the Earth, used by the haversine formula
+EARTH_RADIUS_KM = 6371.0088
+
+# Kilometres per degree of latitude (and of longitude at the equator).
+# This is the *smallest* value on the ellipsoid, so search rings are never too small.
+KM_PER_DEGREE = 110.57
+
+# Haversine (sphere) and geodesic (ellipsoid) disagree by less than 0.6%.
+# We keep every candidate within this margin (covering the error in both
+# directions) so the final geodesic ranking is exactly the same as the
+# old "measure everything" code.
+DISTANCE_MARGIN = 1.02
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """
+    Vectorized haversine distance (in km) from one point to
+    many points. 'lats' and 'lngs' are NumPy arrays in degrees.
+    """
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    d_lat = lat2 - lat1
+    d_lng = np.radians(lngs) - math.radians(lng)
+
+    a = np.sin(d_lat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# One built copy of the index. It is never changed after it is built:
+# a rebuild makes a new one, so a lookup that holds it never sees the
+# arrays of one build with the buckets of another.
+AmenityGrid = namedtuple('AmenityGrid', ['ids', 'lats', 'lngs', 'buckets'])
+EMPTY_GRID = AmenityGrid(
+    np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64), {},
+)
+
+
+class AmenityIndex:
+    """
+    A grid-bucket index over all Amenities that have coordinates.
+
+    The index is built lazily on the first lookup and is marked
+    "stale" by the Amenity signals (see locations/signals.py), so
+    it is rebuilt on the next lookup after any amenity change.
+    """
+
+    # Size of one grid cell in degrees (0.05 degrees is roughly 5.5 km)
+    CELL_DEGREES = 0.05
+
+    # Safety net for multi-process servers: signals only reach the
+    # process that saved the amenity, so every process also rebuilds
+    # its copy after this many seconds.
+    MAX_AGE_SECONDS = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = None
+        self.grid = EMPTY_GRID
+
+    def invalidate(self):
+        """
+        Marks the index as stale. It will be rebuilt on the next lookup.
+        """
+        self._built_at = None
+
+    def _is_fresh(self):
+        return (
+            self._built_at is not None
+            and time.monotonic() - self._built_at < self.MAX_AGE_SECONDS
+        )
+
+    def _cell(self, lat, lng):
+        return (
+            math.floor(lat / self.CELL_DEGREES),
+            math.floor(lng / self.CELL_DEGREES),
+        )
+
+    def build(self):
+        """
+        Loads every amenity's coordinates with ONE query and
+        groups their positions into grid buckets.
+
+        Rows come back in the model's default ordering, so an
+        amenity's position in the arrays is also its tie-breaker.
+        The new grid replaces the old one in a single assignment.
+        """
+        rows = list(
+            Amenity.objects.filter(
+                latitude__isnull=False,
+                longitude__isnull=False
+            ).values_list('id', 'latitude', 'longitude')
+        )
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        lats = np.array([float(row[1]) for row in rows], dtype=np.float64)
+        lngs = np.array([float(row[2]) for row in rows], dtype=np.float64)
+
+        buckets = {}
+        for position, (lat, lng) in enumerate(zip(lats, lngs)):
+            buckets.setdefault(self._cell(lat, lng), []).append(position)
+
+        self.grid = AmenityGrid(ids, lats, lngs, {
+            cell: np.array(positions, dtype=np.int64)
+            for cell, positions in buckets.items()
+        })
+        self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        if not self._is_fresh():
+            with self._lock:
+                if not self._is_fresh():
+                    self.build()
+
+    def _positions_near(self, grid, lat, lng, lat_rings, lng_rings):
+        """
+        Returns the array positions of every amenity inside the
+        rectangle of grid cells around (lat, lng).
+        """
+        # If the rectangle has more cells than we have buckets,
+        # it is cheaper to just walk the buckets we actually have.
+        if (2 * lat_rings + 1) * (2 * lng_rings + 1) >= len(grid.buckets):
+            return np.arange(len(grid.ids))
+
+        row, col = self._cell(lat, lng)
+        found = []
+        for r in range(row - lat_rings, row + lat_rings + 1):
+            for c in range(col - lng_rings, col + lng_rings + 1):
+                positions = grid.buckets.get((r, c))
+                if positions is not None:
+                    found.append(positions)
+
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
+
+    def _rings_for_radius(self, lat, radius_km):
+        """
+        How many cells (up/down and left/right) we must look at to be
+        sure we have seen everything within 'radius_km' of 'lat'.
+        """
+        cell_km = self.CELL_DEGREES * KM_PER_DEGREE
+        lat_rings = math.ceil(radius_km / cell_km) + 1
+
+        # Longitude cells get narrower towards the poles, so we use the
+        # narrowest cell that the search circle can reach.
+        farthest_lat = min(abs(lat) + radius_km / KM_PER_DEGREE, 89.0)
+        lng_cell_km = cell_km * math.cos(math.radians(farthest_lat))
+        lng_rings = math.ceil(radius_km / lng_cell_km) + 1
+        return lat_rings, lng_rings
+
+    def _candidate_positions(self, grid, lat, lng, k):
+        """
+        Returns the array positions of the amenities that could be among
+        the 'k' nearest to (lat, lng). The list is usually just a little
+        longer than 'k'; the caller re-ranks it with the exact distance.
+        """
+        # 1. Grow a square of cells until it holds at least 'k' amenities
+        rings = 0
+        positions = self._positions_near(grid, lat, lng, rings, rings)
+        while len(positions) < k and len(positions) < len(grid.ids):
+            rings = rings * 2 + 1
+            positions = self._positions_near(grid, lat, lng, rings, rings)
+
+        # 2. The k-th closest of those tells us how far we must look
+        distances = haversine_km(lat, lng, grid.lats[positions], grid.lngs[positions])
+        kth = min(k, len(distances)) - 1
+        radius_km = np.partition(distances, kth)[kth] * DISTANCE_MARGIN
+
+        # 3. Look at every cell that can hold something within that radius
+        lat_rings, lng_rings = self._rings_for_radius(lat, radius_km)
+        positions = self._positions_near(grid, lat, lng, lat_rings, lng_rings)
+        distances = haversine_km(lat, lng, grid.lats[positions], grid.lngs[positions])
+
+        # 4. Keep only real candidates (inside the radius)
+        return positions[distances <= radius_km]
+
+    def nearest(self, lat, lng, k=5):
+        """
+        Returns the 'k' amenities nearest to (lat, lng) as a list of
+        (amenity_id, distance_km) tuples, nearest first.
+
+        Only the finalists are measured with the exact geodesic distance,
+        and ties keep the model's default ordering, exactly like the old
+        "measure everything and sort" code.
+        """
+        self.ensure_built()
+        # The whole lookup uses this one grid, even if a rebuild starts
+        grid = self.grid
+        if k <= 0 or len(grid.ids) == 0:
+            return []
+
+        point = (lat, lng)
+        ranked = sorted(
+            (geodesic(point, (grid.lats[p], grid.lngs[p])).km, p)
+            for p in self._candidate_positions(grid, lat, lng, k).tolist()
+        )
+        return [(int(grid.ids[p]), distance) for distance, p in ranked[:k]]
+
+
+# One shared index per process
+amenity_index = AmenityIndex()
+
@@ -1,3 +1,36 @@
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Amenity, Area, City
+from .spatial import AmenityIndex
+
+
+class AmenityIndexTests(TestCase):
+    """
+    A lookup must use one built grid from start to end, even when
+    another thread rebuilds the index in the middle of it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        area = Area.objects.create(name='Gulberg', city=City.objects.create(name='Lahore'))
+        cls.near = Amenity.objects.create(area=area, name='Near', latitude=31.50, longitude=74.30)
+        cls.far = Amenity.objects.create(area=area, name='Far', latitude=31.60, longitude=74.40)
+
+    def test_rebuild_during_a_lookup(self):
+        index = AmenityIndex()
+        index.ensure_built()
+        candidates = index._candidate_positions
+
+        def rebuild_in_between(*args):
+            positions = candidates(*args)
+            # A rebuild that drops the first amenity (every position shifts)
+            Amenity.objects.filter(pk=self.near.pk).update(latitude=None, longitude=None)
+            index.build()
+            return positions
+
+        with mock.patch.object(index, '_candidate_positions', side_effect=rebuild_in_between):
+            nearest = index.nearest(31.5, 74.3, k=2)
+        self.assertEqual([pk for pk, _ in nearest], [self.near.pk, self.far.pk])
+        self.assertEqual([pk for pk, _ in index.nearest(31.5, 74.3, k=2)], [self.far.pk])
@@ -18,8 +18,10 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from .forms import QuestionForm, AnswerForm
+from core.page_cache import cache_page_for_visitors
 
 
+@cache_page_for_visitors('cities')
 def all_cities_view(request):
     """
     Page 1: Displays a list of all cities.
@@ -31,6 +33,7 @@ def all_cities_view(request):
     return render(request, 'locations/all_cities.html', context)
 
 
+@cache_page_for_visitors('city:{city_pk}')
 def city_detail_view(request, city_pk):
     """
     Page 2: Displays details for one city, including all its areas.
@@ -45,6 +48,7 @@ def city_detail_view(request, city_pk):
 
 
 # --- THIS IS YOUR NEW, FULLY UPGRADED VIEW ---
+@cache_page_for_visitors('area:{area_pk}', 'cities')
 def area_detail_view(request, area_pk):
     """
     Page 3: Displays all properties for a specific area,
@@ -0,0 +1,284 @@
+# properties/clustering.py
+
+"""
+Map clusters for every zoom level, computed ahead of time.
+
+Zoomed out, the map search shows "bubbles" (24 listings here,
+PKR 5M - 40M) instead of thousands of pins. Every tile is split into
+CLUSTER_CELLS x CLUSTER_CELLS cells, and a cell at zoom z is exactly
+four cells at zoom z + 1, so the clusters form a tree:
+
+  - the leaves are the cells at the deepest cluster zoom (PIN_ZOOM - 1),
+    built from the listings with a few NumPy passes;
+  - every other level is built by adding up its four children.
+
+A tile request then only looks up its CLUSTER_CELLS x CLUSTER_CELLS
+cells. When a listing is added, moved, repriced, sold or deleted,
+only the cells on its path up the tree are updated (see signals.py).
+
+Like the amenity index in locations/spatial.py, the tree lives in
+memory and is rebuilt every MAX_AGE_SECONDS, so that changes made by
+other server processes show up too.
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+
+import numpy as np
+
+from .map_tiles import CLUSTER_CELLS, PIN_ZOOM, map_querysets, tile_bounds
+
+# The deepest zoom that still shows clusters (the leaves of the tree)
+LEAF_ZOOM = PIN_ZOOM - 1
+
+# A cell at zoom z is a tile at zoom z + CELL_ZOOM_OFFSET
+CELL_ZOOM_OFFSET = int(math.log2(CLUSTER_CELLS))
+
+# Positions of the statistics in a cell: [count, lat sum, lng sum, min price, max price]
+COUNT, LAT_SUM, LNG_SUM, MIN_PRICE, MAX_PRICE = range(5)
+
+
+def cell_positions(lats, lngs, zoom):
+    """
+    The (x, y) cluster cell of each point at 'zoom' (NumPy arrays in, out).
+    Same math as map_tiles.world_position(), CLUSTER_CELLS times finer.
+    """
+    cells_per_side = 2 ** zoom * CLUSTER_CELLS
+    lats = np.clip(lats, -85.05112878, 85.05112878)
+    sin_lat = np.sin(np.radians(lats))
+    x = (lngs + 180.0) / 360.0 * cells_per_side
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * cells_per_side
+    x = np.clip(x.astype(np.int64), 0, cells_per_side - 1)
+    y = np.clip(y.astype(np.int64), 0, cells_per_side - 1)
+    return x, y
+
+
+class ClusterIndex:
+    """
+    levels[zoom] = {(cell_x, cell_y): [count, lat_sum, lng_sum, min_price, max_price]}
+    """
+
+    # Rebuild at least this often, to pick up changes from other processes
+    MAX_AGE_SECONDS = 300
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._levels = None
+        self._built_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._levels = None
+
+    # --- 1. BUILDING THE WHOLE TREE ---
+
+    def _load_points(self):
+        lats, lngs, prices = [], [], []
+        for queryset in map_querysets():
+            for lat, lng, price in queryset.values_list('lat', 'lng', 'price').order_by().iterator(chunk_size=5000):
+                lats.append(float(lat))
+                lngs.append(float(lng))
+                prices.append(price)
+        return (
+            np.array(lats, dtype=np.float64),
+            np.array(lngs, dtype=np.float64),
+            np.array(prices, dtype=np.int64),
+        )
+
+    def _add_up(self, xs, ys, counts, lat_sums, lng_sums, min_prices, max_prices):
+        """
+        Adds up the rows that share the same (x, y) cell.
+        """
+        keys = xs * (1 << 32) + ys
+        unique_keys, groups = np.unique(keys, return_inverse=True)
+        size = len(unique_keys)
+
+        mins = np.full(size, np.iinfo(np.int64).max, dtype=np.int64)
+        maxs = np.full(size, np.iinfo(np.int64).min, dtype=np.int64)
+        np.minimum.at(mins, groups, min_prices)
+        np.maximum.at(maxs, groups, max_prices)
+
+        return (
+            unique_keys >> 32,
+            unique_keys & 0xFFFFFFFF,
+            np.bincount(groups, weights=counts, minlength=size).astype(np.int64),
+            np.bincount(groups, weights=lat_sums, minlength=size),
+            np.bincount(groups, weights=lng_sums, minlength=size),
+            mins,
+            maxs,
+        )
+
+    def build(self):
+        lats, lngs, prices = self._load_points()
+        levels = {}
+
+        if len(lats):
+            xs, ys = cell_positions(lats, lngs, LEAF_ZOOM)
+            columns = self._add_up(xs, ys, np.ones(len(lats), dtype=np.int64), lats, lngs, prices, prices)
+
+            for zoom in range(LEAF_ZOOM, -1, -1):
+                xs, ys, counts, lat_sums, lng_sums, mins, maxs = columns
+                levels[zoom] = {
+                    (int(x), int(y)): [int(count), float(lat_sum), float(lng_sum), int(low), int(high)]
+                    for x, y, count, lat_sum, lng_sum, low, high
+                    in zip(xs, ys, counts, lat_sums, lng_sums, mins, maxs)
+                }
+                # The parent of cell (x, y) is (x // 2, y // 2) one zoom level up
+                columns = self._add_up(xs >> 1, ys >> 1, counts, lat_sums, lng_sums, mins, maxs)
+        else:
+            levels = {zoom: {} for zoom in range(LEAF_ZOOM + 1)}
+
+        with self._lock:
+            self._levels = levels
+            self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        with self._lock:
+            fresh = (
+                self._levels is not None
+                and time.monotonic() - self._built_at < self.MAX_AGE_SECONDS
+            )
+        if not fresh:
+            self.build()
+
+    # --- 2. READING ONE TILE ---
+
+    def clusters_in_tile(self, zoom, x, y):
+        """
+        Returns the clusters of a z/x/y tile (zoom < PIN_ZOOM) as a list of
+        {'lat', 'lng', 'count', 'min_price', 'max_price'}; lat/lng is the
+        centroid of the listings in the cluster.
+        """
+        self.ensure_built()
+        with self._lock:
+            cells = self._levels[zoom]
+            clusters = []
+            for cell_x in range(x * CLUSTER_CELLS, (x + 1) * CLUSTER_CELLS):
+                for cell_y in range(y * CLUSTER_CELLS, (y + 1) * CLUSTER_CELLS):
+                    cell = cells.get((cell_x, cell_y))
+                    if cell:
+                        clusters.append({
+                            'lat': cell[LAT_SUM] / cell[COUNT],
+                            'lng': cell[LNG_SUM] / cell[COUNT],
+                            'count': cell[COUNT],
+                            'min_price': cell[MIN_PRICE],
+                            'max_price': cell[MAX_PRICE],
+                        })
+            return clusters
+
+    def tile_etag(self, zoom, x, y):
+        """
+        A fingerprint of the clusters this index gives for a tile.
+        Made from the clusters themselves (not from the database), so a
+        process whose index hasn't seen a change yet also sends the old
+        ETag with its old clusters, and the browser never keeps an old
+        tile under a new ETag.
+        """
+        clusters = self.clusters_in_tile(zoom, x, y)
+        text = json.dumps([zoom, x, y, clusters], sort_keys=True)
+        return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+    # --- 3. INCREMENTAL UPDATES ---
+
+    def _path(self, lat, lng):
+        """
+        The cell of a point at every level, from the leaf up to zoom 0.
+        """
+        xs, ys = cell_positions(np.array([lat]), np.array([lng]), LEAF_ZOOM)
+        x, y = int(xs[0]), int(ys[0])
+        for zoom in range(LEAF_ZOOM, -1, -1):
+            yield zoom, (x, y)
+            x, y = x >> 1, y >> 1
+
+    def _leaf_from_database(self, key):
+        """
+        Recounts one leaf cell from the database. Needed after a removal,
+        because a minimum or maximum cannot simply be "un-done".
+        """
+        bounds = tile_bounds(LEAF_ZOOM + CELL_ZOOM_OFFSET, key[0], key[1])
+        cell = None
+        for queryset in map_querysets(bounds):
+            for lat, lng, price in queryset.values_list('lat', 'lng', 'price').order_by():
+                if cell is None:
+                    cell = [0, 0.0, 0.0, price, price]
+                cell[COUNT] += 1
+                cell[LAT_SUM] += float(lat)
+                cell[LNG_SUM] += float(lng)
+                cell[MIN_PRICE] = min(cell[MIN_PRICE], price)
+                cell[MAX_PRICE] = max(cell[MAX_PRICE], price)
+        return cell
+
+    def _from_children(self, zoom, key):
+        children = [
+            self._levels[zoom + 1].get((key[0] * 2 + dx, key[1] * 2 + dy))
+            for dx in (0, 1) for dy in (0, 1)
+        ]
+        children = [child for child in children if child]
+        if not children:
+            return None
+        return [
+            sum(child[COUNT] for child in children),
+            sum(child[LAT_SUM] for child in children),
+            sum(child[LNG_SUM] for child in children),
+            min(child[MIN_PRICE] for child in children),
+            max(child[MAX_PRICE] for child in children),
+        ]
+
+    def add_point(self, lat, lng, price):
+        with self._lock:
+            if self._levels is None:
+                return  # will be built (with this listing) on the next request
+            for zoom, key in self._path(lat, lng):
+                cell = self._levels[zoom].get(key)
+                if cell is None:
+                    self._levels[zoom][key] = [1, lat, lng, price, price]
+                else:
+                    cell[COUNT] += 1
+                    cell[LAT_SUM] += lat
+                    cell[LNG_SUM] += lng
+                    cell[MIN_PRICE] = min(cell[MIN_PRICE], price)
+                    cell[MAX_PRICE] = max(cell[MAX_PRICE], price)
+
+    def remove_point(self, lat, lng):
+        """
+        Must be called AFTER the listing left the map in the database
+        (its leaf is recounted from there).
+        """
+        with self._lock:
+            if self._levels is None:
+                return
+            for zoom, key in self._path(lat, lng):
+                if zoom == LEAF_ZOOM:
+                    cell = self._leaf_from_database(key)
+                else:
+                    cell = self._from_children(zoom, key)
+
+                if cell is None:
+                    self._levels[zoom].pop(key, None)
+                else:
+                    self._levels[zoom][key] = cell
+
+    def move_point(self, before, after):
+        """
+        Updates the tree after one listing changed. 'before' and 'after'
+        are map_tiles.map_point() results (None = not on the map).
+        """
+        if before == after:
+            return
+        if before is not None:
+            self.remove_point(before[0], before[1])
+        if after is not None:
+            # remove_point() recounted from the database, which already has 'after'
+            if before is not None and self._same_leaf(before, after):
+                return
+            self.add_point(*after)
+
+    def _same_leaf(self, first, second):
+        return next(self._path(first[0], first[1])) == next(self._path(second[0], second[1]))
+
+
+# One shared index per process
+cluster_index = ClusterIndex()
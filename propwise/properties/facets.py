@@ -0,0 +1,219 @@
+# properties/facets.py
+
+"""
+Facet counts for the search sidebar ("Lahore (120)", "House (85)", ...).
+
+All counts come from ONE grouped query: the matching active listings
+grouped by (city, type, purpose, price bucket, bedrooms). The few
+hundred groups are then added up in Python, once per facet.
+
+City, type and purpose are counted "as if that choice was not made",
+so after picking Lahore the sidebar still shows how many listings the
+other cities have. Price and bedrooms are counted inside the current
+price/bedroom range (the range boxes of PropertyFilter).
+
+The counts are cached per filter set for FACET_CACHE_SECONDS.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from locations.models import City
+from .models import PropertyPurpose, PropertyStatus, PropertyType
+
+FACET_CACHE_SECONDS = getattr(settings, 'FACET_CACHE_SECONDS', 60)
+
+# (price_min, price_max, label) in PKR; None = no limit
+PRICE_BUCKETS = [
+    (None, 4_999_999, 'Under 50 Lakh'),
+    (5_000_000, 9_999_999, '50 Lakh - 1 Crore'),
+    (10_000_000, 19_999_999, '1 - 2 Crore'),
+    (20_000_000, 49_999_999, '2 - 5 Crore'),
+    (50_000_000, 99_999_999, '5 - 10 Crore'),
+    (100_000_000, None, '10 Crore+'),
+]
+
+# (bedrooms_min, bedrooms_max, label)
+BEDROOM_BUCKETS = [
+    (1, 1, '1 Bed'),
+    (2, 2, '2 Beds'),
+    (3, 3, '3 Beds'),
+    (4, 4, '4 Beds'),
+    (5, None, '5+ Beds'),
+]
+
+# The facets that are counted "as if that choice was not made"
+CHOICE_FACETS = ['city', 'property_type', 'purpose']
+
+
+def _bucket_expression(field, buckets):
+    """
+    CASE WHEN field <= ... THEN 0 WHEN ... THEN 1 ... END
+    (NULL when the value is in no bucket, e.g. bedrooms not given)
+    """
+    whens = []
+    for number, (low, high, _) in enumerate(buckets):
+        lookups = {}
+        if low is not None:
+            lookups[f'{field}__gte'] = low
+        if high is not None:
+            lookups[f'{field}__lte'] = high
+        whens.append(When(then=Value(number), **lookups))
+    return Case(*whens, default=None, output_field=IntegerField())
+
+
+def selected_choices(property_filter):
+    """
+    The city / type / purpose picked in the (already validated) filter form.
+    """
+    data = property_filter.form.cleaned_data
+    city = data.get('city')
+    return {
+        'city': city.pk if city else None,
+        'property_type': data.get('property_type') or None,
+        'purpose': data.get('purpose') or None,
+    }
+
+
+def filter_cache_key(property_filter):
+    """
+    The same filters always give the same key, however the URL was
+    written (order of the parameters, empty fields, the cursor...).
+    """
+    parts = []
+    for name, value in sorted(property_filter.form.cleaned_data.items()):
+        if isinstance(value, slice):
+            value = (value.start, value.stop)
+        elif hasattr(value, 'pk'):
+            value = value.pk
+        if value in (None, '', (None, None)):
+            continue
+        parts.append(f"{name}={value}")
+    digest = hashlib.md5('&'.join(parts).encode()).hexdigest()
+    return f"search-facets:{digest}"
+
+
+def _grouped_rows(property_filter):
+    """
+    The single grouped query. Every filter except city / type / purpose
+    is applied in SQL; those three are applied per facet in Python.
+    """
+    data = property_filter.data.copy()
+    for name in CHOICE_FACETS:
+        data.pop(name, None)
+    unfiltered = type(property_filter)(
+        data, queryset=property_filter.queryset.filter(status=PropertyStatus.ACTIVE)
+    ).qs
+
+    return list(
+        unfiltered.order_by()
+        .annotate(
+            price_bucket=_bucket_expression('price', PRICE_BUCKETS),
+            bedroom_bucket=_bucket_expression('bedrooms', BEDROOM_BUCKETS),
+        )
+        .values('area__city_id', 'property_type', 'purpose', 'price_bucket', 'bedroom_bucket')
+        .annotate(total=Count('id'))
+        .values_list('area__city_id', 'property_type', 'purpose', 'price_bucket', 'bedroom_bucket', 'total')
+    )
+
+
+def _count_facets(rows, selected):
+    counts = {name: {} for name in CHOICE_FACETS + ['price', 'bedrooms']}
+    for city_id, property_type, purpose, price_bucket, bedroom_bucket, total in rows:
+        values = {'city': city_id, 'property_type': property_type, 'purpose': purpose}
+        # Which of the picked choices this group does NOT match
+        misses = [name for name in CHOICE_FACETS if selected[name] and values[name] != selected[name]]
+
+        for name in CHOICE_FACETS:
+            # Counted if it matches every picked choice except this facet's own
+            if values[name] is not None and not [miss for miss in misses if miss != name]:
+                counts[name][values[name]] = counts[name].get(values[name], 0) + total
+        if not misses:
+            if price_bucket is not None:
+                counts['price'][price_bucket] = counts['price'].get(price_bucket, 0) + total
+            if bedroom_bucket is not None:
+                counts['bedrooms'][bedroom_bucket] = counts['bedrooms'].get(bedroom_bucket, 0) + total
+    return counts
+
+
+def facet_counts(property_filter):
+    """
+    {'city': {city_id: count}, 'property_type': {...}, 'purpose': {...},
+     'price': {bucket_number: count}, 'bedrooms': {bucket_number: count}}
+    for a PropertyFilter whose form is valid.
+    """
+    return cache.get_or_set(
+        filter_cache_key(property_filter),
+        lambda: _count_facets(_grouped_rows(property_filter), selected_choices(property_filter)),
+        FACET_CACHE_SECONDS,
+    )
+
+
+# --- FOR THE TEMPLATE ---
+
+def _link(query, **changes):
+    query = query.copy()
+    query.pop('cursor', None)  # A new filter starts at page 1
+    for name, value in changes.items():
+        if value is None:
+            query.pop(name, None)
+        else:
+            query[name] = str(value)
+    return '?' + query.urlencode()
+
+
+def build_facets(property_filter, query):
+    """
+    The sidebar facets: a list of (title, [option, ...]) where each
+    option is {'label', 'count', 'selected', 'url'}. 'query' is
+    request.GET (the links keep the other filters).
+    """
+    counts = facet_counts(property_filter)
+    selected = selected_choices(property_filter)
+    data = property_filter.form.cleaned_data
+
+    def choice_options(name, labels):
+        options = []
+        for value, label in labels:
+            is_selected = selected[name] == value
+            if value not in counts[name] and not is_selected:
+                continue
+            options.append({
+                'label': label,
+                'count': counts[name].get(value, 0),
+                'selected': is_selected,
+                # Clicking the picked option again removes it
+                'url': _link(query, **{name: None if is_selected else value}),
+            })
+        return options
+
+    def bucket_options(name, buckets):
+        current = data.get(name)
+        options = []
+        for number, (low, high, label) in enumerate(buckets):
+            is_selected = current is not None and (current.start, current.stop) == (low, high)
+            if number not in counts[name] and not is_selected:
+                continue
+            options.append({
+                'label': label,
+                'count': counts[name].get(number, 0),
+                'selected': is_selected,
+                'url': _link(query, **{
+                    f'{name}_min': None if is_selected else low,
+                    f'{name}_max': None if is_selected else high,
+                }),
+            })
+        return options
+
+    city_ids = set(counts['city']) | {selected['city']}
+    cities = City.objects.filter(pk__in=city_ids).order_by('name').values_list('pk', 'name')
+    return [
+        ('City', choice_options('city', cities)),
+        ('Property Type', choice_options('property_type', PropertyType.choices)),
+        ('Purpose', choice_options('purpose', PropertyPurpose.choices)),
+        ('Price', bucket_options('price', PRICE_BUCKETS)),
+        ('Bedrooms', bucket_options('bedrooms', BEDROOM_BUCKETS)),
+    ]
@@ -0,0 +1,58 @@
+# properties/featuring.py
+
+"""
+Ending "Featured" promotions on time.
+
+A listing is featured while is_featured is True. Instead of checking
+'featured_until >= now' in every search query (which no index can
+sort by), the expire_featured_listings command switches is_featured
+off once featured_until has passed (and updates the listing's stored
+rank_score), so the search never has to check the dates itself.
+"""
+
+from django.db.models import Q
+from django.utils import timezone
+
+from core.page_cache import bump_generation
+
+from .models import Property
+from .ranking import refresh_rank_scores
+
+
+def expired_featured(now=None):
+    """
+    Listings that are still marked featured, but whose promotion is over
+    (or never had an end date).
+    """
+    now = now or timezone.now()
+    return Property.objects.filter(is_featured=True).filter(
+        Q(featured_until__lt=now) | Q(featured_until__isnull=True)
+    )
+
+
+def expire_featured(now=None):
+    """
+    Switches off every promotion that is over (and moves those listings
+    down the search results). Returns how many.
+    """
+    property_ids = list(expired_featured(now).values_list('pk', flat=True))
+    if not property_ids:
+        return 0
+    Property.objects.filter(pk__in=property_ids).update(is_featured=False)
+    refresh_rank_scores(property_ids)
+    # update() skips the signals: mark the cached homepage / search pages as old
+    bump_generation('listings')
+    return len(property_ids)
+
+
+def next_expiry(now=None):
+    """
+    When the next promotion ends (None if nothing is featured).
+    """
+    now = now or timezone.now()
+    return (
+        Property.objects.filter(is_featured=True, featured_until__gte=now)
+        .order_by('featured_until')
+        .values_list('featured_until', flat=True)
+        .first()
+    )
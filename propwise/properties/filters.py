@@ -3,6 +3,7 @@
 import django_filters
 from django_filters import CharFilter, ModelChoiceFilter, ChoiceFilter, RangeFilter
 from .models import Property, PropertyType, PropertyPurpose
+from .search import keyword_search
 from locations.models import City
 
 class PropertyFilter(django_filters.FilterSet):
@@ -10,9 +11,9 @@ class PropertyFilter(django_filters.FilterSet):
     This class defines the filters we want to apply to the Property model.
     """
     
-    # Filter 1: Keyword search on 'title' and 'description'
-    # 'icontains' means "case-insensitive contains"
-    keyword = CharFilter(field_name='title', lookup_expr='icontains', label='Keyword')
+    # Filter 1: Keyword search on title, description, area and city
+    # Uses the full-text index (see search.py) and adds a 'relevance' score
+    keyword = CharFilter(method='filter_keyword', label='Keyword')
     
     # Filter 2: Dropdown for City
     # We filter on 'area__city' (a related field)
@@ -44,4 +45,7 @@ class PropertyFilter(django_filters.FilterSet):
         model = Property
         # These are the fields we are filtering *against*.
         # The filters we defined above will be *used* to filter these fields.
-        fields = ['keyword', 'city', 'property_type', 'purpose', 'price', 'bedrooms']
\ No newline at end of file
+        fields = ['keyword', 'city', 'property_type', 'purpose', 'price', 'bedrooms']
+
+    def filter_keyword(self, queryset, name, value):
+        return keyword_search(queryset, value)
@@ -1,5 +1,7 @@
+import uuid
+
 from django import forms
-from .models import Property, PropertyImage, ListingReport # <-- Added ListingReport
+from .models import Property, PropertyImage, ListingReport, MediaUpload # <-- Added ListingReport
 from locations.models import City, Area
 
 class PropertyForm(forms.ModelForm):
@@ -15,6 +17,12 @@ class PropertyForm(forms.ModelForm):
         })
     )
 
+    # Filled in by static/js/chunked_upload.js: the ids of the photos that
+    # were already uploaded in chunks (see uploads.py), so the form itself
+    # doesn't carry the files
+    uploaded_main_image = forms.CharField(required=False, widget=forms.HiddenInput)
+    uploaded_gallery = forms.CharField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Property
         fields = [
@@ -53,15 +61,17 @@ class PropertyForm(forms.ModelForm):
             'bathrooms': forms.NumberInput(attrs={'class': 'form-control'}),
             'area_size': forms.NumberInput(attrs={'class': 'form-control'}),
             'area_unit': forms.Select(attrs={'class': 'form-select'}),
-            'main_image': forms.ClearableFileInput(attrs={'class': 'form-control'}),
+            'main_image': forms.ClearableFileInput(attrs={'class': 'form-control', 'data-chunked': 'uploaded_main_image'}),
             'video_url': forms.URLInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'https://www.youtube.com/watch?v=...'
             }),
         }
         
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs) 
+        # The agent filling in the form (only their uploads can be used)
+        self.user = user
 
         self.fields['city'] = forms.ModelChoiceField(
             queryset=City.objects.all().order_by('name'),
@@ -105,6 +115,36 @@ class PropertyForm(forms.ModelForm):
         if self.instance and self.instance.pk and self.instance.main_image:
             self.fields['main_image'].required = False
 
+    def _finished_uploads(self, value):
+        """The completed MediaUploads of this user, from a comma-separated list of ids."""
+        try:
+            ids = list(dict.fromkeys(uuid.UUID(v.strip()) for v in value.split(',') if v.strip()))
+        except ValueError:
+            raise forms.ValidationError("Please upload the photos again.")
+        if not ids:
+            return []
+        uploads = MediaUpload.objects.filter(
+            pk__in=ids, owner_id=getattr(self.user, 'pk', None), blob__isnull=False,
+        ).select_related('blob')
+        by_id = {upload.pk: upload for upload in uploads}
+        if len(by_id) != len(ids):
+            raise forms.ValidationError("Some photos did not finish uploading. Please upload them again.")
+        return [by_id[pk] for pk in ids]
+
+    def clean_uploaded_main_image(self):
+        uploads = self._finished_uploads(self.cleaned_data['uploaded_main_image'])
+        return uploads[0] if uploads else None
+
+    def clean_uploaded_gallery(self):
+        return self._finished_uploads(self.cleaned_data['uploaded_gallery'])
+
+    def save(self, commit=True):
+        # A main image uploaded in chunks is already stored: just point to it
+        upload = self.cleaned_data.get('uploaded_main_image')
+        if upload is not None:
+            self.instance.main_image = upload.blob.file.name
+        return super().save(commit)
+
 
 # --- ADD THIS NEW FORM FOR REPORTING LISTINGS ---
 class ListingReportForm(forms.ModelForm):
@@ -0,0 +1,126 @@
+# properties/gallery.py
+
+"""
+Adding the gallery photos of a listing (property_create / property_update).
+
+The views used to call PropertyImage.objects.create() once per photo,
+one after the other: open it, write it to the media folder, insert the
+row, run the signals, next photo. With 20 phone photos that's a long
+wait after clicking "Save".
+
+ingest_gallery() instead:
+  1. checks and writes all photos at the same time in a small thread
+     pool (the uploads are already on disk, see FILE_UPLOAD_HANDLERS
+     in settings.py, so this is mostly file I/O and Pillow decoding);
+  2. inserts all the PropertyImage rows with ONE bulk_create, inside a
+     transaction;
+  3. leaves the thumbnail / card / full copies to the background
+     derivative worker (see core/images.py).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+
+from core.images import derivative_queue
+from core.page_cache import bump_generation
+
+from .models import PropertyImage
+from .ranking import refresh_rank_scores
+from .snapshot import listing_snapshot
+
+GALLERY_UPLOAD_WORKERS = getattr(settings, 'GALLERY_UPLOAD_WORKERS', 4)
+
+# The formats a gallery photo may have (like forms.ImageField, minus the exotic ones)
+GALLERY_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF', 'MPO'}
+
+
+def check_image(upload):
+    """
+    Decodes the whole upload once. Returns an error message, or None if
+    it is a photo we accept.
+    """
+    try:
+        upload.seek(0)
+        with Image.open(upload) as image:
+            if image.format not in GALLERY_FORMATS:
+                return f"{image.format} images are not supported."
+            # load() decodes every pixel: catches cut-off uploads and
+            # "decompression bombs" (see Image.MAX_IMAGE_PIXELS)
+            image.load()
+    except Exception:
+        return "This file is not an image (or it is damaged)."
+    finally:
+        upload.seek(0)
+    return None
+
+
+def _store(upload):
+    """
+    Runs in the thread pool: checks one upload and writes it to the
+    gallery folder. Returns (stored name or None, error or None).
+    """
+    error = check_image(upload)
+    if error:
+        return None, error
+    field = PropertyImage._meta.get_field('image')
+    name = field.generate_filename(None, upload.name)
+    return field.storage.save(name, upload, max_length=field.max_length), None
+
+
+def ingest_gallery(property, uploads):
+    """
+    Adds the uploaded files to the listing's gallery.
+    Returns (the new PropertyImages, [(file name, error), ...] of the
+    files that were skipped).
+    """
+    if not uploads:
+        return [], []
+
+    with ThreadPoolExecutor(min(GALLERY_UPLOAD_WORKERS, len(uploads))) as pool:
+        results = list(pool.map(_store, uploads))
+
+    names = [name for name, _ in results if name]
+    rejected = [(upload.name, error) for upload, (_, error) in zip(uploads, results) if error]
+    if not names:
+        return [], rejected
+
+    try:
+        images = add_stored_images(property, names)
+    except Exception:
+        # Don't leave the written files behind
+        storage = PropertyImage._meta.get_field('image').storage
+        for name in names:
+            storage.delete(name)
+        raise
+    return images, rejected
+
+
+def add_stored_images(property, names):
+    """
+    Adds files that are already in the media folder (written by
+    ingest_gallery, or uploaded in chunks, see uploads.py) to the
+    listing's gallery. Returns the new PropertyImages.
+    """
+    if not names:
+        return []
+
+    with transaction.atomic():
+        images = PropertyImage.objects.bulk_create(
+            [PropertyImage(property=property, image=name) for name in names]
+        )
+        # bulk_create skips the signals, so we do their job here:
+        # the gallery counts for the search ranking ...
+        refresh_rank_scores([property.pk])
+
+    def after_commit():
+        # ... and the search snapshot, cached pages and derivatives
+        listing_snapshot.update_listing(property.pk)
+        bump_generation('listings')
+        for image in images:
+            derivative_queue.put('properties.PropertyImage', image.pk, 'image')
+
+    transaction.on_commit(after_commit)
+    return images
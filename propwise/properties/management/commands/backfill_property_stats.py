@@ -0,0 +1,34 @@
+# properties/management/commands/backfill_property_stats.py
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from properties.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the hourly/daily dashboard stats from the PropertyView and Lead history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild this day and later (YYYY-MM-DD). Default: rebuild everything.'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("--since must be a date like 2025-01-31.")
+
+        self.stdout.write(f"[{timezone.now()}] Backfilling property stats...")
+
+        hourly_rows, daily_rows = backfill(since=since)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Done. {hourly_rows} hourly rows, {daily_rows} daily rows."
+        ))
@@ -0,0 +1,213 @@
+# properties/management/commands/benchmark_property_indexes.py
+
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from locations.models import City, Area
+from properties.models import Property, PropertyStatus, PropertyType, PropertyPurpose
+from properties.ranking import rank_score
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway SQLite database with fake listings and shows the "
+        "query plans and timings of the search/homepage/area queries, "
+        "without and with Property's Meta.indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='How many listings to seed (default: 1,000,000).')
+        parser.add_argument('--repeat', type=int, default=5, help='How many times to run each query (default: 5).')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the fake data.')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark database file afterwards.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark builds its own SQLite file and needs the SQLite backend.")
+
+        random.seed(options['seed'])
+        path = os.path.join(tempfile.mkdtemp(prefix='propwise-bench-'), 'bench.sqlite3')
+        db = sqlite3.connect(path)
+
+        try:
+            self.stdout.write(f"Benchmark database: {path}")
+            self.create_tables(db)
+            self.seed(db, options['rows'])
+
+            # --- 1. WITHOUT the new indexes ---
+            self.drop_meta_indexes(db)
+            db.execute("ANALYZE")
+            before = self.run_queries(db, options['repeat'], "WITHOUT Meta.indexes")
+
+            # --- 2. WITH the new indexes ---
+            self.create_meta_indexes(db)
+            db.execute("ANALYZE")
+            after = self.run_queries(db, options['repeat'], "WITH Meta.indexes")
+
+            self.print_summary(before, after)
+        finally:
+            db.close()
+            if not options['keep']:
+                os.remove(path)
+
+    # --- SCHEMA ---
+
+    def model_sql(self, *models):
+        """
+        The exact CREATE TABLE / CREATE INDEX statements Django would run.
+        """
+        with connection.schema_editor(collect_sql=True) as editor:
+            for model in models:
+                editor.create_model(model)
+        return editor.collected_sql
+
+    def create_tables(self, db):
+        for sql in self.model_sql(City, Area, Property):
+            db.execute(sql)
+
+    def drop_meta_indexes(self, db):
+        for index in Property._meta.indexes:
+            db.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+
+    def create_meta_indexes(self, db):
+        with connection.schema_editor(collect_sql=True) as editor:
+            for index in Property._meta.indexes:
+                editor.add_index(Property, index)
+        for sql in editor.collected_sql:
+            db.execute(sql)
+
+    # --- FAKE DATA ---
+
+    def seed(self, db, rows):
+        self.stdout.write(f"Seeding {rows:,} listings...")
+        started = time.perf_counter()
+
+        cities = 50
+        areas_per_city = 40
+        db.executemany(
+            "INSERT INTO locations_city (id, name) VALUES (?, ?)",
+            [(c, f"City {c}") for c in range(1, cities + 1)]
+        )
+        db.executemany(
+            "INSERT INTO locations_area (id, name, city_id) VALUES (?, ?, ?)",
+            [
+                ((c - 1) * areas_per_city + a, f"Area {a}", c)
+                for c in range(1, cities + 1)
+                for a in range(1, areas_per_city + 1)
+            ]
+        )
+
+        now = timezone.now().replace(tzinfo=None)
+        columns = (
+            'title', 'description', 'price', 'area_id', 'purpose', 'property_type',
+            'bedrooms', 'bathrooms', 'area_size', 'area_unit', 'agent_id',
+            'created_at', 'updated_at', 'is_verified', 'is_featured',
+            'featured_until', 'status', 'sold_date', 'rank_score', 'main_image_derivatives',
+        )
+        insert = f"INSERT INTO properties_property ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        types = [choice for choice, _ in PropertyType.choices]
+        purposes = [choice for choice, _ in PropertyPurpose.choices]
+
+        batch = []
+        for i in range(rows):
+            created = now - datetime.timedelta(minutes=random.randint(0, 3 * 365 * 24 * 60))
+            status = random.choices(
+                [PropertyStatus.ACTIVE, PropertyStatus.SOLD, PropertyStatus.EXPIRED], [85, 10, 5]
+            )[0]
+            is_featured = random.random() < 0.03
+            is_verified = random.random() < 0.6
+            property_type = random.choice(types)
+            batch.append((
+                f"Listing {i}", "Fake listing for the index benchmark.",
+                int(random.lognormvariate(16, 1)),
+                random.randint(1, cities * areas_per_city),
+                random.choice(purposes), property_type,
+                None if property_type == PropertyType.PLOT else random.randint(1, 8),
+                None, random.randint(3, 40), 'marla', random.randint(1, 5000),
+                str(created), str(created),
+                is_verified, is_featured,
+                # (expire_featured_listings keeps only running promotions featured)
+                str(now + datetime.timedelta(days=random.randint(1, 30))) if is_featured else None,
+                status,
+                str(created + datetime.timedelta(days=random.randint(1, 90))) if status == PropertyStatus.SOLD else None,
+                rank_score(
+                    created.replace(tzinfo=datetime.timezone.utc), is_featured, is_verified,
+                    False, 0, False, 0,
+                ),
+                '{}',
+            ))
+            if len(batch) == 50_000:
+                db.executemany(insert, batch)
+                batch = []
+        if batch:
+            db.executemany(insert, batch)
+        db.commit()
+
+        self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    # --- THE QUERIES (built with the ORM, exactly like the views) ---
+
+    def queries(self):
+        now = timezone.now()
+        active = Property.objects.filter(status=PropertyStatus.ACTIVE)
+        search = active.order_by('-rank_score', '-id')
+
+        return [
+            ("search: first page", search[:12]),
+            ("search: city + type + price", search.filter(
+                area__city_id=7, property_type=PropertyType.HOUSE,
+                price__gte=5_000_000, price__lte=20_000_000)[:12]),
+            ("search: type + purpose + price", search.filter(
+                property_type=PropertyType.APARTMENT, purpose=PropertyPurpose.FOR_RENT,
+                price__gte=1_000_000, price__lte=3_000_000)[:12]),
+            ("homepage: featured", Property.objects.filter(
+                is_verified=True, is_featured=True,
+                status=PropertyStatus.ACTIVE).order_by('-created_at')),
+            ("homepage: latest", Property.objects.filter(
+                is_verified=True, is_featured=False,
+                status=PropertyStatus.ACTIVE).order_by('-created_at')[:12]),
+            ("homepage: latest by category", Property.objects.filter(
+                is_verified=True, is_featured=False, status=PropertyStatus.ACTIVE,
+                property_type=PropertyType.PLOT).order_by('-created_at')[:12]),
+            ("area: active listings", active.filter(area_id=123).order_by('-created_at')),
+            ("area: sold last year", Property.objects.filter(
+                area_id=123, status=PropertyStatus.SOLD,
+                sold_date__gte=now - datetime.timedelta(days=365))),
+            ("dashboard: agent listings", Property.objects.filter(agent_id=42).order_by('-created_at')[:10]),
+        ]
+
+    def run_queries(self, db, repeat, label):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== {label} ==="))
+        timings = {}
+        for name, queryset in self.queries():
+            sql, params = queryset.query.sql_with_params()
+            sql = sql.replace('%s', '?')
+
+            plan = db.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            runs = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                db.execute(sql, params).fetchall()
+                runs.append((time.perf_counter() - started) * 1000)
+            timings[name] = statistics.median(runs)
+
+            self.stdout.write(self.style.SUCCESS(f"\n{name}: {timings[name]:.2f} ms (median of {repeat})"))
+            for row in plan:
+                self.stdout.write(f"    {row[-1]}")
+        return timings
+
+    def print_summary(self, before, after):
+        self.stdout.write(self.style.MIGRATE_HEADING("\n=== Summary (median ms) ==="))
+        self.stdout.write(f"{'query':<34}{'before':>10}{'after':>10}{'speedup':>10}")
+        for name in before:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            self.stdout.write(f"{name:<34}{before[name]:>10.2f}{after[name]:>10.2f}{speedup:>9.1f}x")
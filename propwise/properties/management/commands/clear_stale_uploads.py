@@ -0,0 +1,20 @@
+# properties/management/commands/clear_stale_uploads.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from properties.uploads import UPLOAD_EXPIRE_HOURS, clear_stale_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        f"Deletes the chunked photo uploads older than {UPLOAD_EXPIRE_HOURS} hours "
+        "(never finished, or finished but the listing form was never saved) "
+        "and the stored photos that nothing uses anymore. Run it from cron once a day."
+    )
+
+    def handle(self, *args, **options):
+        uploads, blobs = clear_stale_uploads()
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Deleted {uploads} stale uploads and {blobs} unused photos."
+        ))
@@ -0,0 +1,51 @@
+# properties/management/commands/expire_featured_listings.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from properties.featuring import expire_featured, next_expiry
+
+
+class Command(BaseCommand):
+    help = (
+        "Switches 'Featured' off for listings whose featured_until has passed. "
+        "Run it from cron, or keep it running with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and expire every promotion right when it ends.',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=int,
+            default=60,
+            help='With --loop: check at least this often, in seconds (default: 60), '
+                 'so newly boosted listings are picked up.',
+        )
+
+    def handle(self, *args, **options):
+        self.expire()
+        if not options['loop']:
+            return
+
+        while True:
+            # Sleep until the next promotion ends (but never too long)
+            now = timezone.now()
+            wait = options['max_sleep']
+            upcoming = next_expiry(now)
+            if upcoming is not None:
+                wait = min(wait, max((upcoming - now).total_seconds(), 0))
+            time.sleep(wait + 0.5)  # (half a second so 'featured_until' has really passed)
+            self.expire()
+
+    def expire(self):
+        expired = expire_featured()
+        if expired:
+            self.stdout.write(self.style.SUCCESS(
+                f"[{timezone.now()}] {expired} featured listings expired."
+            ))
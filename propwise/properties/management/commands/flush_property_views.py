@@ -0,0 +1,22 @@
+# properties/management/commands/flush_property_views.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from properties.view_tracking import view_buffer
+
+
+class Command(BaseCommand):
+    help = 'Saves any property views still waiting in the crash spool file.'
+
+    def handle(self, *args, **options):
+        if not view_buffer.claim_spool():
+            # The running server saves these views itself
+            raise CommandError(
+                f"{view_buffer.spool_file} belongs to a running server process. "
+                "It saves those views itself; run this only when the server is stopped."
+            )
+        written = view_buffer.flush()
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Saved {written} buffered property views."
+        ))
@@ -0,0 +1,35 @@
+# properties/management/commands/index_media_blobs.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from properties.models import Property, PropertyImage
+from properties.uploads import index_media_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Hashes the listing photos that are already in the media folder, so "
+        "uploading one of them again reuses the stored file (see uploads.py)."
+    )
+
+    def handle(self, *args, **options):
+        sources = [
+            (PropertyImage._meta.get_field('image').storage,
+             PropertyImage.objects.values_list('image', flat=True)),
+            (Property._meta.get_field('main_image').storage,
+             Property.objects.exclude(main_image='').exclude(main_image__isnull=True)
+             .values_list('main_image', flat=True)),
+        ]
+        added = 0
+        for storage, names in sources:
+            for name in names.iterator():
+                try:
+                    if index_media_file(name, storage):
+                        added += 1
+                except OSError as e:
+                    self.stderr.write(self.style.ERROR(f"{name}: {e}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Added {added} photos to the upload index."
+        ))
@@ -0,0 +1,27 @@
+# properties/management/commands/rebuild_nearby_amenities.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from properties.proximity import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the precomputed 'What's Nearby' amenities for every property."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='How many properties to insert per bulk query (default: 500).'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"[{timezone.now()}] Rebuilding nearby amenities...")
+
+        property_count, row_count = rebuild_all(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Done. {property_count} properties, {row_count} nearby-amenity rows."
+        ))
@@ -0,0 +1,19 @@
+# properties/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from properties.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text keyword search index for every property.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"[{timezone.now()}] Rebuilding the search index...")
+
+        indexed = rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Done. {indexed} properties indexed."
+        ))
@@ -0,0 +1,20 @@
+# properties/management/commands/refresh_rank_scores.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.page_cache import bump_generation
+from properties.ranking import refresh_rank_scores
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored search ranking (rank_score) of every listing.'
+
+    def handle(self, *args, **options):
+        updated = refresh_rank_scores()
+        if updated:
+            # The search order changed (see core/page_cache.py)
+            bump_generation('listings')
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Updated the rank_score of {updated} listings."
+        ))
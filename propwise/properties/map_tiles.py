@@ -0,0 +1,165 @@
+# properties/map_tiles.py
+
+"""
+Data for the map search, one map tile at a time.
+
+The map used to download EVERY listing on every page load. Now the
+browser asks only for the tiles it can see (the same z/x/y tiles that
+OpenStreetMap uses), and:
+  - when zoomed out (zoom < PIN_ZOOM), each tile returns a few clusters
+    ("24 listings here, PKR 5M - 40M") instead of thousands of pins
+    (see clustering.py);
+  - when zoomed in, each tile returns the individual pins.
+
+Listings without their own coordinates are shown at their area's
+coordinates (like the old map did).
+"""
+
+import hashlib
+import itertools
+import math
+
+from django.db.models import Count, F, Max
+from django.urls import reverse
+
+from core.images import derivative_path
+
+from .models import Property, PropertyStatus
+
+MAX_ZOOM = 20
+
+# From this zoom level on, we send individual pins instead of clusters
+PIN_ZOOM = 14
+
+# Each tile is split into CLUSTER_CELLS x CLUSTER_CELLS cluster cells
+# (a 256px tile -> 64px cells, about the size of one cluster bubble).
+# Must be a power of 2: a cell at zoom z is then exactly a tile at
+# zoom z + log2(CLUSTER_CELLS).
+CLUSTER_CELLS = 4
+
+
+# --- 1. TILE MATH (Web Mercator, like Leaflet/OpenStreetMap) ---
+
+def tile_bounds(zoom, x, y):
+    """
+    Returns (south, west, north, east) of a z/x/y tile in degrees.
+    Raises ValueError for a tile that does not exist.
+    """
+    tiles = 2 ** zoom
+    if not (0 <= zoom <= MAX_ZOOM and 0 <= x < tiles and 0 <= y < tiles):
+        raise ValueError(f"Invalid tile {zoom}/{x}/{y}")
+
+    def longitude(tile_x):
+        return tile_x / tiles * 360.0 - 180.0
+
+    def latitude(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / tiles))))
+
+    return latitude(y + 1), longitude(x), latitude(y), longitude(x + 1)
+
+
+def world_position(latitude, longitude, zoom):
+    """
+    Where a point falls on the whole-world map at 'zoom', measured in
+    tiles (so int() of it is the tile number).
+    """
+    tiles = 2 ** zoom
+    latitude = max(min(latitude, 85.05112878), -85.05112878)
+    sin_lat = math.sin(math.radians(latitude))
+    x = (longitude + 180.0) / 360.0 * tiles
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * tiles
+    return x, y
+
+
+# --- 2. THE LISTINGS INSIDE A TILE ---
+
+def map_querysets(bounds=None):
+    """
+    Two indexed queries: listings with their own coordinates inside
+    'bounds', and listings without them whose area is inside 'bounds'
+    (or all of them, if bounds is None). Both have 'lat' and 'lng'.
+    A tile includes its north and west edge only, so a listing on a
+    border belongs to exactly one tile.
+    """
+    active = Property.objects.filter(status=PropertyStatus.ACTIVE)
+    own = active.filter(latitude__isnull=False, longitude__isnull=False)
+    by_area = active.filter(
+        latitude__isnull=True,
+        area__latitude__isnull=False, area__longitude__isnull=False,
+    )
+
+    if bounds is not None:
+        south, west, north, east = bounds
+        own = own.filter(
+            latitude__gt=south, latitude__lte=north,
+            longitude__gte=west, longitude__lt=east,
+        )
+        by_area = by_area.filter(
+            area__latitude__gt=south, area__latitude__lte=north,
+            area__longitude__gte=west, area__longitude__lt=east,
+        )
+
+    return (
+        own.annotate(lat=F('latitude'), lng=F('longitude')),
+        by_area.annotate(lat=F('area__latitude'), lng=F('area__longitude')),
+    )
+
+
+def map_point(property_id):
+    """
+    Where (and for how much) a listing shows up on the map:
+    (lat, lng, price), or None if it is not on the map.
+    """
+    for queryset in map_querysets():
+        point = queryset.filter(pk=property_id).values_list('lat', 'lng', 'price').first()
+        if point is not None:
+            return float(point[0]), float(point[1]), point[2]
+    return None
+
+
+def tile_etag(zoom, x, y):
+    """
+    A fingerprint of everything a pin tile shows: the number of listings
+    in it and the newest change. Much cheaper than building the tile
+    itself. (Cluster tiles use ClusterIndex.tile_etag, see clustering.py.)
+    """
+    parts = [f"{zoom}/{x}/{y}"]
+    for queryset in map_querysets(tile_bounds(zoom, x, y)):
+        totals = queryset.order_by().aggregate(
+            count=Count('id'), max_id=Max('id'), changed=Max('updated_at')
+        )
+        parts.append(f"{totals['count']}:{totals['max_id']}:{totals['changed']}")
+    return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def tile_pins(zoom, x, y):
+    """
+    Yields one small dict per listing in the tile (for zoom >= PIN_ZOOM).
+    """
+    # reverse() once, not once per listing
+    detail_url = reverse('property_detail', args=[0])[:-2] + '{}/'
+    image_storage = Property._meta.get_field('main_image').storage
+
+    fields = (
+        'id', 'title', 'price', 'lat', 'lng', 'main_image', 'main_image_derivatives',
+        'area__name', 'area__city__name',
+    )
+    querysets = [
+        queryset.values_list(*fields).order_by('-created_at')
+        for queryset in map_querysets(tile_bounds(zoom, x, y))
+    ]
+    rows = itertools.chain.from_iterable(queryset.iterator(chunk_size=500) for queryset in querysets)
+
+    for pk, title, price, lat, lng, main_image, derivatives, area_name, city_name in rows:
+        yield {
+            'id': pk,
+            'title': title,
+            'lat': float(lat),
+            'lng': float(lng),
+            'price': price,
+            'price_display': f"{price:,}",
+            'area_name': f"{area_name}, {city_name}" if area_name else '',
+            # The small WebP copy for the popup (see core/images.py)
+            'image_url': image_storage.url(derivative_path(main_image, derivatives, 'card', 'webp')) if main_image else None,
+            'detail_url': detail_url.format(pk),
+        }
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_question_answer'),
+        ('properties', '0008_listingreport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyNearbyAmenity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField(help_text='Distance in kilometres.')),
+                ('rank', models.PositiveSmallIntegerField(help_text='1 = the closest amenity.')),
+                ('amenity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nearby_properties', to='locations.amenity')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nearby_amenities', to='properties.property')),
+            ],
+            options={
+                'verbose_name_plural': 'Property nearby amenities',
+                'ordering': ['property', 'rank'],
+                'unique_together': {('property', 'rank')},
+            },
+        ),
+    ]
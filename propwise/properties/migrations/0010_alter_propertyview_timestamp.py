@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0009_propertynearbyamenity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='propertyview',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0010_alter_propertyview_timestamp'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('unique_ips', models.PositiveIntegerField(default=0)),
+                ('logged_in_viewers', models.PositiveIntegerField(default=0, help_text='Number of different logged-in users who viewed the listing.')),
+                ('leads', models.PositiveIntegerField(default=0)),
+                ('date', models.DateField()),
+            ],
+            options={
+                'verbose_name_plural': 'Property daily stats',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PropertyHourlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('unique_ips', models.PositiveIntegerField(default=0)),
+                ('logged_in_viewers', models.PositiveIntegerField(default=0, help_text='Number of different logged-in users who viewed the listing.')),
+                ('leads', models.PositiveIntegerField(default=0)),
+                ('hour', models.DateTimeField(help_text='The start of the hour.')),
+            ],
+            options={
+                'verbose_name_plural': 'Property hourly stats',
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='propertyview',
+            index=models.Index(fields=['property', 'timestamp'], name='properties__propert_441365_idx'),
+        ),
+        migrations.AddField(
+            model_name='propertydailystats',
+            name='property',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='properties.property'),
+        ),
+        migrations.AddField(
+            model_name='propertyhourlystats',
+            name='property',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='properties.property'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='propertydailystats',
+            unique_together={('property', 'date')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='propertyhourlystats',
+            unique_together={('property', 'hour')},
+        ),
+    ]
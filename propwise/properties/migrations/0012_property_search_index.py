@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:46
+
+import django.db.models.deletion
+import properties.models
+from django.db import migrations, models
+
+
+# The search table is not a normal table, so we create it by hand.
+# SQLite: an FTS5 virtual table (title is weighted most, then area/city names).
+# PostgreSQL: a weighted tsvector column with a GIN index.
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE properties_property_fts USING fts5(
+        title, description, area_name, city_name,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    "INSERT INTO properties_property_fts(properties_property_fts, rank) "
+    "VALUES ('rank', 'bm25(10.0, 1.0, 4.0, 2.0)')",
+    """
+    INSERT INTO properties_property_fts(rowid, title, description, area_name, city_name)
+    SELECT p.id, p.title, p.description, COALESCE(a.name, ''), COALESCE(c.name, '')
+    FROM properties_property p
+    LEFT JOIN locations_area a ON a.id = p.area_id
+    LEFT JOIN locations_city c ON c.id = a.city_id
+    """,
+]
+
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE properties_property_fts (
+        rowid bigint PRIMARY KEY REFERENCES properties_property(id) ON DELETE CASCADE,
+        properties_property_fts tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX properties_property_fts_gin ON properties_property_fts "
+    "USING GIN (properties_property_fts)",
+    """
+    INSERT INTO properties_property_fts(rowid, properties_property_fts)
+    SELECT p.id,
+        setweight(to_tsvector('simple', p.title), 'A') ||
+        setweight(to_tsvector('simple', COALESCE(a.name, '') || ' ' || COALESCE(c.name, '')), 'B') ||
+        setweight(to_tsvector('simple', p.description), 'C')
+    FROM properties_property p
+    LEFT JOIN locations_area a ON a.id = p.area_id
+    LEFT JOIN locations_city c ON c.id = a.city_id
+    """,
+]
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS properties_property_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0011_property_stats_rollups'),
+        ('locations', '0004_question_answer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertySearchDocument',
+            fields=[
+                ('property', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='properties.property')),
+                ('document', properties.models.FullTextDocumentField(db_column='properties_property_fts')),
+                ('rank', models.FloatField(db_column='rank')),
+            ],
+            options={
+                'db_table': 'properties_property_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_question_answer'),
+        ('properties', '0012_property_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-created_at'], name='prop_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['property_type', 'purpose', 'price'], name='prop_active_type_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['area', '-created_at'], name='prop_active_area_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('status', 'sold')), fields=['area', 'sold_date'], name='prop_sold_area_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('is_featured', False), ('is_verified', True), ('status', 'active')), fields=['property_type', '-created_at'], name='prop_home_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('is_featured', True), ('status', 'active')), fields=['featured_until'], name='prop_active_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['agent', '-created_at'], name='prop_agent_created_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_question_answer'),
+        ('properties', '0013_property_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['latitude', 'longitude'], name='prop_active_coords_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def expire_ended_promotions(apps, schema_editor):
+    # From now on 'is_featured' alone decides (see properties/featuring.py)
+    Property = apps.get_model('properties', 'Property')
+    Property.objects.filter(is_featured=True).filter(
+        Q(featured_until__lt=timezone.now()) | Q(featured_until__isnull=True)
+    ).update(is_featured=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_question_answer'),
+        ('properties', '0014_property_coords_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='property',
+            name='prop_active_featured_idx',
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('is_featured', True)), fields=['featured_until'], name='prop_featured_until_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-is_featured', '-is_verified', '-created_at', '-id'], name='prop_active_search_order_idx'),
+        ),
+        migrations.RunPython(expire_ended_promotions, migrations.RunPython.noop),
+    ]
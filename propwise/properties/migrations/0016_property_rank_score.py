@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:14
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def compute_rank_scores(apps, schema_editor):
+    from properties.ranking import rank_score
+
+    Property = apps.get_model('properties', 'Property')
+    rows = Property.objects.annotate(
+        gallery_images=Count('images', distinct=True),
+        open_reports=Count('reports', filter=Q(reports__is_resolved=False), distinct=True),
+    )
+    scored = []
+    for row in rows.iterator():
+        row.rank_score = rank_score(
+            row.created_at, row.is_featured, row.is_verified, bool(row.main_image),
+            row.gallery_images, bool(row.video_url), row.open_reports,
+        )
+        scored.append(row)
+    Property.objects.bulk_update(scored, ['rank_score'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_question_answer'),
+        ('properties', '0015_featured_expiry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='property',
+            name='prop_active_search_order_idx',
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='rank_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('is_featured', True), ('is_verified', True), ('status', 'active')), fields=['-created_at'], name='prop_home_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['status', '-rank_score', '-id'], name='prop_status_rank_idx'),
+        ),
+        migrations.RunPython(compute_rank_scores, migrations.RunPython.noop),
+    ]
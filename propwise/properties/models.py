@@ -1,6 +1,10 @@
+import math
+import uuid
+
 from django.db import models
 from django.conf import settings # To get the User model
-from locations.models import Area # To link to our Area model
+from django.utils import timezone
+from locations.models import Area, Amenity # To link to our Area model
 
 # These are helper functions for our choices
 class PropertyPurpose(models.TextChoices):
@@ -77,6 +81,8 @@ class Property(models.Model):
     
     # Main "Cover" Image
     main_image = models.ImageField(upload_to='properties/main_images/', null=True, blank=True)
+    # Thumbnail / card / full copies of it, made by core/images.py
+    main_image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     # --- TRUST & MONETIZATION FIELDS ---
     is_verified = models.BooleanField(
@@ -98,6 +104,11 @@ class Property(models.Model):
         default=PropertyStatus.ACTIVE,
         help_text="The current status of the listing (e.g., Active, Sold)."
     )
+    # --- SEARCH RANKING (see ranking.py) ---
+    # Featured, verified, newest, photos/video and open reports in one
+    # number, kept up to date by signals.py. Higher = shown first.
+    rank_score = models.FloatField(default=0, editable=False)
+
     sold_date = models.DateTimeField(
         null=True, 
         blank=True,
@@ -112,6 +123,71 @@ class Property(models.Model):
         help_text="A link to a YouTube or Vimeo video walkthrough (e.g., https://www.youtube.com/watch?v=...)"
     )
     
+    class Meta:
+        # Designed from the query plans of property_search, the homepage,
+        # area_detail_view and agent_dashboard.
+        # Run 'manage.py benchmark_property_indexes' to see them in action.
+        indexes = [
+            # Only active listings, newest first (homepage "Latest", search)
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(status='active'),
+                name='prop_active_created_idx',
+            ),
+            # Search by property type + purpose + price range
+            models.Index(
+                fields=['property_type', 'purpose', 'price'],
+                condition=models.Q(status='active'),
+                name='prop_active_type_price_idx',
+            ),
+            # Area page (active listings) and search by city (through its areas)
+            models.Index(
+                fields=['area', '-created_at'],
+                condition=models.Q(status='active'),
+                name='prop_active_area_created_idx',
+            ),
+            # Area page "Price Trends" (sold in the last year)
+            models.Index(
+                fields=['area', 'sold_date'],
+                condition=models.Q(status='sold'),
+                name='prop_sold_area_date_idx',
+            ),
+            # Homepage "Latest" section by category.
+            # The boolean filters live in the condition: Django writes them as
+            # plain "is_verified" / "NOT is_featured", which SQLite cannot use
+            # as index columns, but does match against a partial index.
+            models.Index(
+                fields=['property_type', '-created_at'],
+                condition=models.Q(status='active', is_verified=True, is_featured=False),
+                name='prop_home_latest_idx',
+            ),
+            # expire_featured_listings: only a few listings are featured
+            models.Index(
+                fields=['featured_until'],
+                condition=models.Q(is_featured=True),
+                name='prop_featured_until_idx',
+            ),
+            # Homepage "Featured" section, newest first
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(status='active', is_verified=True, is_featured=True),
+                name='prop_home_featured_idx',
+            ),
+            # Search results order: the stored ranking (see ranking.py)
+            models.Index(
+                fields=['status', '-rank_score', '-id'],
+                name='prop_status_rank_idx',
+            ),
+            # Agent dashboard, newest first
+            models.Index(fields=['agent', '-created_at'], name='prop_agent_created_idx'),
+            # Map search: listings inside a map tile (map_tiles.py)
+            models.Index(
+                fields=['latitude', 'longitude'],
+                condition=models.Q(status='active'),
+                name='prop_active_coords_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.title} in {self.area}"
 
@@ -162,6 +238,7 @@ class PropertyImage(models.Model):
     """
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to='properties/gallery/')
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     
     def __str__(self):
         return f"Image for {self.property.title}"
@@ -178,7 +255,8 @@ class PropertyView(models.Model):
         on_delete=models.CASCADE, 
         related_name="views"
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # 'default' (not auto_now_add) so batched views keep the time they happened
+    timestamp = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
     # Optional: If the viewer was logged in, track who they were
@@ -192,6 +270,10 @@ class PropertyView(models.Model):
     class Meta:
         # Most recent views first
         ordering = ['-timestamp']
+        indexes = [
+            # Used to recompute one property's analytics for a time range
+            models.Index(fields=['property', 'timestamp']),
+        ]
 
     def __str__(self):
         return f"View on {self.property.title} at {self.timestamp}"
@@ -225,4 +307,166 @@ class ListingReport(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"Report on {self.property.title} by {self.reporter.username}"
\ No newline at end of file
+        return f"Report on {self.property.title} by {self.reporter.username}"
+
+
+# --- PRECOMPUTED "WHAT'S NEARBY" TABLE ---
+
+class PropertyNearbyAmenity(models.Model):
+    """
+    Stores the closest amenities for a property (nearest first),
+    so the detail page does not have to measure distances on every visit.
+    These rows are kept up to date by properties/signals.py.
+    """
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name="nearby_amenities"
+    )
+    amenity = models.ForeignKey(
+        Amenity,
+        on_delete=models.CASCADE,
+        related_name="nearby_properties"
+    )
+    distance = models.FloatField(help_text="Distance in kilometres.")
+    rank = models.PositiveSmallIntegerField(help_text="1 = the closest amenity.")
+
+    class Meta:
+        ordering = ['property', 'rank']
+        # One row per rank, and this is also the index the detail page reads
+        unique_together = ('property', 'rank')
+        verbose_name_plural = "Property nearby amenities"
+
+    def __str__(self):
+        return f"#{self.rank} near property {self.property_id}: amenity {self.amenity_id} ({self.distance:.2f} km)"
+
+
+
+# --- ANALYTICS ROLLUPS (pre-summed PropertyView and Lead counts) ---
+
+class PropertyStatsBase(models.Model):
+    """
+    The numbers we keep for one property in one time bucket.
+    Kept up to date by properties/rollups.py.
+    """
+    views = models.PositiveIntegerField(default=0)
+    unique_ips = models.PositiveIntegerField(default=0)
+    logged_in_viewers = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of different logged-in users who viewed the listing."
+    )
+    leads = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class PropertyHourlyStats(PropertyStatsBase):
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="hourly_stats")
+    hour = models.DateTimeField(help_text="The start of the hour.")
+
+    class Meta:
+        ordering = ['-hour']
+        unique_together = ('property', 'hour')
+        verbose_name_plural = "Property hourly stats"
+
+    def __str__(self):
+        return f"Stats for property {self.property_id} at {self.hour}"
+
+
+class PropertyDailyStats(PropertyStatsBase):
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="daily_stats")
+    date = models.DateField()
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ('property', 'date')
+        verbose_name_plural = "Property daily stats"
+
+    def __str__(self):
+        return f"Stats for property {self.property_id} on {self.date}"
+
+
+
+# --- FULL-TEXT SEARCH INDEX (see properties/search.py) ---
+
+# The search table is created by migration 0012 (it is not a normal table).
+PROPERTY_SEARCH_TABLE = 'properties_property_fts'
+
+
+class FullTextDocumentField(models.TextField):
+    """
+    The searchable "document" of a listing, searched with '__match'.
+    On SQLite this is the FTS5 table's hidden column (which always has
+    the same name as the table); on PostgreSQL it is a tsvector column
+    that we give the same name, so the model works on both.
+    """
+
+
+class PropertySearchDocument(models.Model):
+    """
+    One row per Property in the full-text search index
+    (title, description, area name and city name).
+    Kept in sync by properties/signals.py.
+    """
+    property = models.OneToOneField(
+        Property,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_document'
+    )
+    document = FullTextDocumentField(db_column=PROPERTY_SEARCH_TABLE)
+    # SQLite FTS5's built-in relevance score (bm25, lower is better)
+    rank = models.FloatField(db_column='rank')
+
+    class Meta:
+        managed = False
+        db_table = PROPERTY_SEARCH_TABLE
+
+    def __str__(self):
+        return f"Search document for property {self.property_id}"
+
+
+# --- CHUNKED UPLOADS OF LISTING PHOTOS (see uploads.py) ---
+
+class MediaBlob(models.Model):
+    """
+    One uploaded file in the media folder, found by the SHA-256 of its
+    content. The same photo uploaded twice is stored once.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.file.name
+
+
+class MediaUpload(models.Model):
+    """
+    A file that the browser sends in chunks (so a big photo can be
+    resumed after a dropped connection). The chunks wait on disk until
+    the upload is completed; then 'blob' is the finished file.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='media_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # The SHA-256 of the whole file, if the browser sent it (checked at the end)
+    sha256 = models.CharField(max_length=64, blank=True)
+    blob = models.ForeignKey(MediaBlob, null=True, blank=True, on_delete=models.SET_NULL, related_name='uploads')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def total_chunks(self):
+        return max(1, math.ceil(self.size / self.chunk_size))
+
+    @property
+    def is_complete(self):
+        return self.blob_id is not None
+
+    def __str__(self):
+        return f"Upload of {self.filename} by {self.owner}"
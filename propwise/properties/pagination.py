@@ -0,0 +1,220 @@
+# properties/pagination.py
+
+"""
+Keyset ("cursor") pagination for long listing pages.
+
+Django's Paginator runs a COUNT(*) over the whole filtered queryset and
+then fetches page N with OFFSET, which has to read (and throw away)
+every row of the earlier pages. Deep pages get slower and slower.
+
+Instead, each page remembers the sort values of its first and last
+listing in an opaque token (?cursor=...). The next page is simply
+"the rows that sort after this one", which the database can answer
+straight from an index, no matter how deep we are.
+
+The total ("N Listings Found") is counted only up to 'count_limit'
+rows and cached for a short while, so the header never forces a full
+count of a big city either.
+"""
+
+import hashlib
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+CURSOR_SALT = 'properties.pagination'
+
+
+class CursorPage:
+    """
+    One page of results. Works in templates like a Paginator page:
+    iterate over it, check has_next / has_previous, and build the links
+    with next_cursor / previous_cursor.
+    """
+
+    def __init__(self, object_list, paginator, number, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        return self.paginator.make_cursor(self.object_list[-1], self.number + 1, backwards=False)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous:
+            return None
+        return self.paginator.make_cursor(self.object_list[0], self.number - 1, backwards=True)
+
+
+class CursorPaginator:
+    """
+    Paginates 'queryset' by the values of 'ordering', e.g.
+    ['-rank_score', '-id'].
+
+    The ordering must end with a unique field (like 'id') so that every
+    row has exactly one place, and its fields must not be NULL.
+    Annotations (like 'relevance') work too.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_limit=1000, count_cache_seconds=60):
+        self.per_page = per_page
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        self.queryset = queryset.order_by(*ordering)
+        self.count_limit = count_limit
+        self.count_cache_seconds = count_cache_seconds
+        self._count = None
+
+    # --- 1. THE TOKENS ---
+
+    def _value_of(self, obj, name):
+        if isinstance(obj, dict):
+            return obj[name]
+        return getattr(obj, name)
+
+    def make_cursor(self, obj, number, backwards):
+        """
+        Packs the sort values of 'obj' into a signed, URL-safe token.
+        """
+        values = [self._value_of(obj, name) for name, _ in self.ordering]
+        payload = {
+            'v': [value.isoformat() if hasattr(value, 'isoformat') else value for value in values],
+            'n': number,
+            'b': backwards,
+        }
+        return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+    def _output_field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def read_cursor(self, cursor):
+        """
+        Unpacks a token made by make_cursor(). Returns None if it is
+        missing, was tampered with, or does not fit this ordering.
+        """
+        if not cursor:
+            return None
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+            values = payload['v']
+            if len(values) != len(self.ordering):
+                return None
+            values = [
+                self._output_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, values)
+            ]
+            return values, int(payload['n']), bool(payload['b'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError, ValidationError):
+            return None
+
+    # --- 2. FETCHING A PAGE ---
+
+    def _after(self, values, backwards):
+        """
+        "Rows that sort after these values" as one Q object:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        with '>' and '<' flipped for descending fields (and for going back).
+        """
+        condition = Q()
+        equal_so_far = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= equal_so_far & Q(**{f'{name}__{lookup}': value})
+            equal_so_far &= Q(**{name: value})
+        return condition
+
+    def get_page(self, cursor=None):
+        """
+        Returns the page the token points to, or the first page if the
+        token is missing or invalid (like Paginator.get_page()).
+        """
+        position = self.read_cursor(cursor)
+        if position is None:
+            rows = list(self.queryset[:self.per_page + 1])
+            return CursorPage(
+                rows[:self.per_page], self, number=1,
+                has_next=len(rows) > self.per_page, has_previous=False
+            )
+
+        values, number, backwards = position
+        queryset = self.queryset.filter(self._after(values, backwards))
+
+        if not backwards:
+            rows = list(queryset[:self.per_page + 1])
+            return CursorPage(
+                rows[:self.per_page], self, number=number,
+                has_next=len(rows) > self.per_page, has_previous=True
+            )
+
+        # Going back: read the rows before the cursor in reverse, then flip them
+        rows = list(queryset.reverse()[:self.per_page + 1])
+        more_before = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return CursorPage(
+            rows, self, number=max(number, 1),
+            has_next=True, has_previous=more_before
+        )
+
+    # --- 3. THE (CHEAP) TOTAL ---
+
+    def _count_cache_key(self):
+        sql, params = self.queryset.query.sql_with_params()
+        digest = hashlib.md5(f"{sql}|{params}".encode('utf-8')).hexdigest()
+        return f"cursor-count:{self.count_limit}:{digest}"
+
+    def _count_rows(self):
+        queryset = self.queryset.order_by()
+        if self.count_limit is None:
+            return queryset.count()
+        # Counting stops after count_limit + 1 rows
+        return queryset[:self.count_limit + 1].count()
+
+    @property
+    def count(self):
+        """
+        The number of results, but never more than count_limit + 1
+        (see count_is_approximate). Cached for count_cache_seconds.
+        """
+        if self._count is None:
+            if self.count_cache_seconds:
+                self._count = cache.get_or_set(
+                    self._count_cache_key(), self._count_rows, self.count_cache_seconds
+                )
+            else:
+                self._count = self._count_rows()
+        return self._count
+
+    @property
+    def count_is_approximate(self):
+        """
+        True when there are more than count_limit results
+        (the template shows "1000+ Listings Found").
+        """
+        return self.count_limit is not None and self.count > self.count_limit
+
+    @property
+    def display_count(self):
+        if self.count_is_approximate:
+            return self.count_limit
+        return self.count
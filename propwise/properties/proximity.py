@@ -0,0 +1,206 @@
+# properties/proximity.py
+
+"""
+Keeps the PropertyNearbyAmenity table ("What's Nearby") up to date.
+
+The nearest amenities for a listing only change when:
+  1. The listing's own coordinates change, or
+  2. An amenity is added, moved or removed close to it.
+So instead of recomputing them on every page view, we store them
+and only refresh the rows that are actually affected.
+"""
+
+import math
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+
+from locations.models import Amenity
+from locations.spatial import amenity_index, haversine_km, DISTANCE_MARGIN, KM_PER_DEGREE
+from .models import Property, PropertyNearbyAmenity
+
+# How many amenities we keep per property (the detail page shows 5)
+NEARBY_AMENITY_COUNT = 5
+
+
+def _build_rows(property_id, latitude, longitude):
+    """
+    Returns the (unsaved) PropertyNearbyAmenity rows for one property.
+    """
+    if latitude is None or longitude is None:
+        return []
+
+    nearest = amenity_index.nearest(float(latitude), float(longitude), NEARBY_AMENITY_COUNT)
+    return [
+        PropertyNearbyAmenity(
+            property_id=property_id,
+            amenity_id=amenity_id,
+            distance=distance,
+            rank=rank
+        )
+        for rank, (amenity_id, distance) in enumerate(nearest, start=1)
+    ]
+
+
+def refresh_properties(property_ids):
+    """
+    Recomputes the nearby amenities for the given properties.
+    All old rows are replaced in one transaction with ONE bulk insert.
+    """
+    property_ids = list(property_ids)
+    if not property_ids:
+        return 0
+
+    coordinates = Property.objects.filter(pk__in=property_ids).values_list(
+        'id', 'latitude', 'longitude'
+    )
+    new_rows = []
+    for property_id, latitude, longitude in coordinates:
+        new_rows.extend(_build_rows(property_id, latitude, longitude))
+
+    with transaction.atomic():
+        PropertyNearbyAmenity.objects.filter(property_id__in=property_ids).delete()
+        PropertyNearbyAmenity.objects.bulk_create(new_rows)
+
+    return len(new_rows)
+
+
+def refresh_property(property_obj):
+    """
+    Recomputes the nearby amenities for a single property.
+    """
+    return refresh_properties([property_obj.pk])
+
+
+def nearby_amenities(property_obj):
+    """
+    The stored rows of one property for the detail page, nearest first.
+
+    A listing without rows (created before this table existed, and not
+    rebuilt yet) gets them from the amenity index instead. They are
+    NOT saved: a page view never writes.
+    """
+    rows = list(property_obj.nearby_amenities.select_related('amenity'))
+    if rows:
+        return rows
+
+    rows = _build_rows(property_obj.pk, property_obj.latitude, property_obj.longitude)
+    amenities = Amenity.objects.in_bulk([row.amenity_id for row in rows])
+    for row in rows:
+        row.amenity = amenities.get(row.amenity_id)
+    return [row for row in rows if row.amenity is not None]
+
+
+def _bounding_box(latitude, longitude, radius_km):
+    """
+    (south, north, west, east) of a box that holds every point within
+    'radius_km'. west/east are None when the box would wrap around the
+    world (then only the latitude is filtered).
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    south, north = latitude - lat_delta, latitude + lat_delta
+    # Longitude degrees are shortest on the box's side nearest a pole
+    farthest_lat = min(max(abs(south), abs(north)), 89.0)
+    lng_delta = radius_km / (KM_PER_DEGREE * math.cos(math.radians(farthest_lat)))
+    west, east = longitude - lng_delta, longitude + lng_delta
+    if north >= 89.0 or south <= -89.0 or west < -180.0 or east > 180.0:
+        return south, north, None, None
+    return south, north, west, east
+
+
+def properties_affected_by_point(latitude, longitude):
+    """
+    Finds the properties whose "nearest amenities" list could change
+    if an amenity appears at (latitude, longitude).
+
+    That is every property that is closer to the point than to its
+    current last-ranked amenity, plus properties that do not have a
+    full list yet.
+    Only the properties inside a box around the point are loaded: no
+    list reaches further than the largest stored last-ranked distance.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    located = Property.objects.filter(latitude__isnull=False, longitude__isnull=False)
+
+    # Without a full list, any new amenity is one of the nearest
+    affected = list(
+        located.exclude(nearby_amenities__rank=NEARBY_AMENITY_COUNT).values_list('id', flat=True)
+    )
+
+    last_ranked = PropertyNearbyAmenity.objects.filter(rank=NEARBY_AMENITY_COUNT)
+    widest = last_ranked.aggregate(widest=Max('distance'))['widest']
+    if widest is None:
+        return affected
+
+    south, north, west, east = _bounding_box(latitude, longitude, widest * DISTANCE_MARGIN)
+    candidates = last_ranked.filter(
+        property__latitude__isnull=False, property__longitude__isnull=False,
+        property__latitude__gte=south, property__latitude__lte=north,
+    )
+    if west is not None:
+        candidates = candidates.filter(property__longitude__gte=west, property__longitude__lte=east)
+    rows = list(candidates.values_list('property_id', 'property__latitude', 'property__longitude', 'distance'))
+    if not rows:
+        return affected
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    lats = np.array([float(row[1]) for row in rows], dtype=np.float64)
+    lngs = np.array([float(row[2]) for row in rows], dtype=np.float64)
+    radius = np.array([row[3] for row in rows], dtype=np.float64)
+
+    distances = haversine_km(latitude, longitude, lats, lngs)
+    return affected + ids[distances <= radius * DISTANCE_MARGIN].tolist()
+
+
+def refresh_for_amenity(amenity, previous_property_ids=()):
+    """
+    Refreshes only the properties affected by an amenity change.
+
+    'previous_property_ids' are the properties that listed this amenity
+    before the change (it may have moved away from them or been deleted).
+    """
+    # The spatial index must see the change before we recompute anything
+    amenity_index.invalidate()
+
+    affected = set(previous_property_ids)
+    if amenity is not None and amenity.latitude is not None and amenity.longitude is not None:
+        affected.update(properties_affected_by_point(amenity.latitude, amenity.longitude))
+
+    return refresh_properties(affected)
+
+
+def rebuild_all(batch_size=500):
+    """
+    Rebuilds the whole table from scratch (used by the
+    'rebuild_nearby_amenities' management command).
+    Returns (number of properties, number of rows).
+    """
+    amenity_index.invalidate()
+
+    property_count = 0
+    row_count = 0
+    batch = []
+
+    properties = Property.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False
+    ).values_list('id', 'latitude', 'longitude').order_by('id')
+
+    with transaction.atomic():
+        PropertyNearbyAmenity.objects.all().delete()
+
+        for property_id, latitude, longitude in properties.iterator(chunk_size=batch_size):
+            batch.extend(_build_rows(property_id, latitude, longitude))
+            property_count += 1
+
+            if len(batch) >= batch_size * NEARBY_AMENITY_COUNT:
+                PropertyNearbyAmenity.objects.bulk_create(batch)
+                row_count += len(batch)
+                batch = []
+
+        if batch:
+            PropertyNearbyAmenity.objects.bulk_create(batch)
+            row_count += len(batch)
+
+    return property_count, row_count
@@ -0,0 +1,95 @@
+# properties/ranking.py
+
+"""
+The stored search ranking (Property.rank_score).
+
+The search results used to be sorted by featured / verified / newest,
+worked out in every query. Now every listing keeps one number, and
+the search is a plain index scan on (status, rank_score).
+
+The score is counted in "days": a listing gets one point for every
+day it was created after 1970, plus bonuses (and minus penalties)
+that make it look that many days newer (or older). Because the
+recency part is the creation date itself, old scores never go out of
+date: a listing only needs a new score when one of its own signals
+changes (see signals.py). The refresh_rank_scores command recomputes
+everything, e.g. after changing the weights below.
+"""
+
+import datetime
+
+from django.db.models import Count, Q
+
+from .models import Property
+
+# Paid promotion: always above every listing that isn't featured
+FEATURED_BONUS_DAYS = 100_000
+VERIFIED_BONUS_DAYS = 30
+MAIN_IMAGE_BONUS_DAYS = 7
+# A gallery of at least GALLERY_MIN_IMAGES photos
+GALLERY_BONUS_DAYS = 3
+GALLERY_MIN_IMAGES = 3
+VIDEO_BONUS_DAYS = 3
+# For every report an admin hasn't resolved yet
+OPEN_REPORT_PENALTY_DAYS = 14
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def rank_score(created_at, is_featured, is_verified, has_main_image, gallery_images, has_video, open_reports):
+    """
+    The score of one listing from its signals (higher = shown first).
+    """
+    score = (created_at - EPOCH).total_seconds() / 86400
+    if is_featured:
+        score += FEATURED_BONUS_DAYS
+    if is_verified:
+        score += VERIFIED_BONUS_DAYS
+    if has_main_image:
+        score += MAIN_IMAGE_BONUS_DAYS
+    if gallery_images >= GALLERY_MIN_IMAGES:
+        score += GALLERY_BONUS_DAYS
+    if has_video:
+        score += VIDEO_BONUS_DAYS
+    score -= open_reports * OPEN_REPORT_PENALTY_DAYS
+    return score
+
+
+def refresh_rank_scores(property_ids=None, batch_size=1000):
+    """
+    Recomputes and saves rank_score for the given listings
+    (or for all of them). Returns how many were updated.
+    """
+    queryset = Property.objects.order_by('pk')
+    if property_ids is not None:
+        queryset = queryset.filter(pk__in=property_ids)
+
+    updated = 0
+    last_pk = 0
+    while True:
+        # One query per batch: the signals plus the counts of photos and open reports
+        rows = list(
+            queryset.filter(pk__gt=last_pk)
+            .annotate(
+                gallery_images=Count('images', distinct=True),
+                open_reports=Count('reports', filter=Q(reports__is_resolved=False), distinct=True),
+            )
+            .values_list(
+                'pk', 'created_at', 'is_featured', 'is_verified', 'main_image',
+                'gallery_images', 'video_url', 'open_reports', 'rank_score',
+            )[:batch_size]
+        )
+        if not rows:
+            return updated
+        last_pk = rows[-1][0]
+
+        changed = []
+        for pk, created_at, is_featured, is_verified, main_image, gallery_images, video_url, open_reports, old_score in rows:
+            score = rank_score(
+                created_at, is_featured, is_verified, bool(main_image),
+                gallery_images, bool(video_url), open_reports,
+            )
+            if score != old_score:
+                changed.append(Property(pk=pk, rank_score=score))
+        Property.objects.bulk_update(changed, ['rank_score'])
+        updated += len(changed)
@@ -0,0 +1,168 @@
+# properties/rollups.py
+
+"""
+Keeps the PropertyHourlyStats / PropertyDailyStats tables up to date.
+
+The agent dashboard used to count the raw PropertyView table on every
+page load. Instead, we keep one row per property per hour (and per day)
+with the totals already added up.
+
+Unique IPs and logged-in viewers cannot simply be "+1"-ed, so whenever
+new views or leads arrive we recompute just the buckets they touched
+from the raw rows (an indexed range scan on (property, timestamp)).
+"""
+
+import datetime
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour, TruncDate
+from django.utils import timezone
+
+from accounts.models import Lead
+from .models import PropertyView, PropertyHourlyStats, PropertyDailyStats
+
+STAT_FIELDS = ['views', 'unique_ips', 'logged_in_viewers', 'leads']
+
+
+def _hour_of(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def _date_of(moment):
+    return timezone.localtime(moment).date()
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _view_totals(trunc, filters):
+    """
+    One grouped query: views, unique IPs and logged-in viewers
+    per (property, bucket).
+    """
+    rows = (
+        PropertyView.objects.filter(**filters)
+        .annotate(bucket=trunc('timestamp'))
+        .values('property_id', 'bucket')
+        .annotate(
+            views=Count('id'),
+            unique_ips=Count('ip_address', distinct=True),
+            logged_in_viewers=Count('user', distinct=True),
+        )
+        .order_by()
+    )
+    return {(row['property_id'], row['bucket']): row for row in rows}
+
+
+def _lead_totals(trunc, filters):
+    """
+    One grouped query: leads per (property, bucket).
+    """
+    rows = (
+        Lead.objects.filter(property_of_interest__isnull=False, **filters)
+        .annotate(bucket=trunc('created_at'))
+        .values('property_of_interest_id', 'bucket')
+        .annotate(leads=Count('id'))
+        .order_by()
+    )
+    return {(row['property_of_interest_id'], row['bucket']): row['leads'] for row in rows}
+
+
+def _build_stats(model, bucket_field, keys, view_totals, lead_totals):
+    stats = []
+    for property_id, bucket in keys | view_totals.keys() | lead_totals.keys():
+        totals = view_totals.get((property_id, bucket), {})
+        stats.append(model(
+            property_id=property_id,
+            **{bucket_field: bucket},
+            views=totals.get('views', 0),
+            unique_ips=totals.get('unique_ips', 0),
+            logged_in_viewers=totals.get('logged_in_viewers', 0),
+            leads=lead_totals.get((property_id, bucket), 0),
+        ))
+    return stats
+
+
+def refresh_buckets(events):
+    """
+    Recomputes the hourly and daily rows touched by 'events', a list of
+    (property_id, timestamp) pairs (new views, or leads that changed).
+    Buckets that no longer have anything in them are set to zero.
+    """
+    events = [(property_id, moment) for property_id, moment in events if property_id]
+    if not events:
+        return
+
+    hour_keys = {(property_id, _hour_of(moment)) for property_id, moment in events}
+    day_keys = {(property_id, _date_of(moment)) for property_id, moment in events}
+
+    # Everything we need is inside these properties, from the first touched day on
+    property_ids = {property_id for property_id, _ in events}
+    since = _start_of_day(min(day for _, day in day_keys))
+    view_filters = {'property_id__in': property_ids, 'timestamp__gte': since}
+    lead_filters = {'property_of_interest_id__in': property_ids, 'created_at__gte': since}
+
+    hourly = _build_stats(
+        PropertyHourlyStats, 'hour', hour_keys,
+        _view_totals(TruncHour, view_filters), _lead_totals(TruncHour, lead_filters)
+    )
+    daily = _build_stats(
+        PropertyDailyStats, 'date', day_keys,
+        _view_totals(TruncDate, view_filters), _lead_totals(TruncDate, lead_filters)
+    )
+
+    # "Insert or update" in one query per table
+    with transaction.atomic():
+        PropertyHourlyStats.objects.bulk_create(
+            hourly, update_conflicts=True,
+            unique_fields=['property', 'hour'], update_fields=STAT_FIELDS
+        )
+        PropertyDailyStats.objects.bulk_create(
+            daily, update_conflicts=True,
+            unique_fields=['property', 'date'], update_fields=STAT_FIELDS
+        )
+
+
+def refresh_for_views(views):
+    """
+    Called right after a batch of PropertyView rows was saved.
+    """
+    refresh_buckets([(view.property_id, view.timestamp) for view in views])
+
+
+def backfill(since=None, batch_size=1000):
+    """
+    Rebuilds the rollup tables from the raw PropertyView and Lead history.
+    If 'since' (a date) is given, only that day and later are rebuilt.
+    Returns (hourly rows, daily rows).
+    """
+    view_filters = {}
+    lead_filters = {}
+    if since is not None:
+        start = _start_of_day(since)
+        view_filters = {'timestamp__gte': start}
+        lead_filters = {'created_at__gte': start}
+
+    hourly = _build_stats(
+        PropertyHourlyStats, 'hour', set(),
+        _view_totals(TruncHour, view_filters), _lead_totals(TruncHour, lead_filters)
+    )
+    daily = _build_stats(
+        PropertyDailyStats, 'date', set(),
+        _view_totals(TruncDate, view_filters), _lead_totals(TruncDate, lead_filters)
+    )
+
+    with transaction.atomic():
+        if since is None:
+            PropertyHourlyStats.objects.all().delete()
+            PropertyDailyStats.objects.all().delete()
+        else:
+            PropertyHourlyStats.objects.filter(hour__gte=start).delete()
+            PropertyDailyStats.objects.filter(date__gte=since).delete()
+
+        PropertyHourlyStats.objects.bulk_create(hourly, batch_size=batch_size)
+        PropertyDailyStats.objects.bulk_create(daily, batch_size=batch_size)
+
+    return len(hourly), len(daily)
@@ -0,0 +1,188 @@
+# properties/search.py
+
+"""
+Full-text keyword search for listings.
+
+'title__icontains' has to read every row (LIKE '%x%') and cannot tell
+which listing matches best. Instead, we keep a real search index
+(SQLite FTS5, or a PostgreSQL tsvector + GIN index) over the title,
+description, area name and city name of every property, and search it
+with prefix matching ("lah" finds "Lahore") and relevance ranking.
+
+On any other database we fall back to the old 'title__icontains'.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, Func, Lookup, Value
+from django.db.utils import NotSupportedError
+
+from .models import Property, FullTextDocumentField, PROPERTY_SEARCH_TABLE
+
+
+# --- 1. THE "__match" LOOKUP ---
+
+@FullTextDocumentField.register_lookup
+class Match(Lookup):
+    """
+    document__match='...' -> "MATCH" (SQLite) or "@@ to_tsquery" (PostgreSQL).
+    The right-hand side must come from build_search_query().
+    """
+    lookup_name = 'match'
+
+    def _sides(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return lhs, rhs, list(lhs_params) + list(rhs_params)
+
+    def as_sqlite(self, compiler, connection):
+        lhs, rhs, params = self._sides(compiler, connection)
+        return f"{lhs} MATCH {rhs}", params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, rhs, params = self._sides(compiler, connection)
+        return f"{lhs} @@ to_tsquery('simple', {rhs})", params
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError("Full-text search needs SQLite or PostgreSQL.")
+
+
+class TsRank(Func):
+    """
+    PostgreSQL relevance. Negated, so that (like SQLite's bm25)
+    a *lower* number means a *better* match.
+    """
+    template = "-ts_rank(%(expressions)s, to_tsquery('simple', %(query)s))"
+    output_field = FloatField()
+
+    def __init__(self, document, query):
+        super().__init__(document)
+        self.query = query
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, query='%s', **extra_context)
+        return sql, list(params) + [self.query]
+
+
+def full_text_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+# --- 2. TURNING WHAT THE USER TYPED INTO A SEARCH QUERY ---
+
+def search_tokens(keyword):
+    """
+    Splits a keyword into simple lowercase words.
+    Anything else (quotes, operators, etc.) is dropped, so user input
+    can never break the search syntax.
+    """
+    return re.findall(r'\w+', (keyword or '').lower())
+
+
+def build_search_query(keyword):
+    """
+    Every word must match, and every word also matches as a prefix:
+    'dha lah' -> '"dha"* AND "lah"*' (SQLite) / 'dha:* & lah:*' (PostgreSQL)
+    Returns None if there is nothing to search for.
+    """
+    tokens = search_tokens(keyword)
+    if not tokens:
+        return None
+    if connection.vendor == 'postgresql':
+        return ' & '.join(f"{token}:*" for token in tokens)
+    return ' AND '.join(f'"{token}"*' for token in tokens)
+
+
+def keyword_search(queryset, keyword):
+    """
+    Filters a Property queryset by keyword and annotates 'relevance'
+    (lower is better, so order_by('relevance') puts the best match first).
+    """
+    query = build_search_query(keyword)
+    if query is None:
+        return queryset
+
+    if not full_text_supported():
+        # Old behaviour: no index, no ranking
+        return queryset.filter(title__icontains=keyword).annotate(relevance=Value(0.0))
+
+    queryset = queryset.filter(search_document__document__match=query)
+    if connection.vendor == 'postgresql':
+        return queryset.annotate(relevance=TsRank(F('search_document__document'), query))
+    return queryset.annotate(relevance=F('search_document__rank'))
+
+
+# --- 3. KEEPING THE INDEX IN SYNC ---
+
+def _documents(property_ids):
+    return Property.objects.filter(pk__in=property_ids).values_list(
+        'id', 'title', 'description', 'area__name', 'area__city__name'
+    )
+
+
+def index_properties(property_ids):
+    """
+    (Re)writes the search rows for the given properties.
+    """
+    property_ids = list(property_ids)
+    if not property_ids or not full_text_supported():
+        return
+
+    rows = [
+        (pk, title or '', description or '', area_name or '', city_name or '')
+        for pk, title, description, area_name, city_name in _documents(property_ids)
+    ]
+    placeholders = ', '.join(['%s'] * len(property_ids))
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.executemany(
+                f"""
+                INSERT INTO {PROPERTY_SEARCH_TABLE} (rowid, {PROPERTY_SEARCH_TABLE})
+                VALUES (%s,
+                    setweight(to_tsvector('simple', %s), 'A') ||
+                    setweight(to_tsvector('simple', %s || ' ' || %s), 'B') ||
+                    setweight(to_tsvector('simple', %s), 'C'))
+                ON CONFLICT (rowid) DO UPDATE
+                SET {PROPERTY_SEARCH_TABLE} = EXCLUDED.{PROPERTY_SEARCH_TABLE}
+                """,
+                [(pk, title, area_name, city_name, description)
+                 for pk, title, description, area_name, city_name in rows]
+            )
+        else:
+            # FTS5 rows are replaced by deleting and inserting them again
+            cursor.execute(
+                f"DELETE FROM {PROPERTY_SEARCH_TABLE} WHERE rowid IN ({placeholders})",
+                property_ids
+            )
+            cursor.executemany(
+                f"INSERT INTO {PROPERTY_SEARCH_TABLE} "
+                f"(rowid, title, description, area_name, city_name) VALUES (%s, %s, %s, %s, %s)",
+                rows
+            )
+
+
+def unindex_property(property_id):
+    """
+    Removes a deleted property from the search index.
+    """
+    if full_text_supported():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {PROPERTY_SEARCH_TABLE} WHERE rowid = %s", [property_id])
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Rebuilds the whole search index. Returns the number of properties indexed.
+    """
+    if not full_text_supported():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {PROPERTY_SEARCH_TABLE}")
+
+    all_ids = list(Property.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(all_ids), batch_size):
+        index_properties(all_ids[start:start + batch_size])
+    return len(all_ids)
@@ -0,0 +1,237 @@
+# properties/signals.py
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from accounts.models import Lead
+from locations.models import Amenity, Area, City
+from .clustering import cluster_index
+from .map_tiles import map_point
+from .models import Property, PropertyImage, ListingReport
+from .proximity import refresh_property, refresh_for_amenity
+from .ranking import refresh_rank_scores
+from .rollups import refresh_buckets
+from .search import index_properties, unindex_property
+from .snapshot import listing_snapshot
+
+
+# --- 1. KEEP "WHAT'S NEARBY" UP TO DATE WHEN A PROPERTY MOVES ---
+
+@receiver(pre_save, sender=Property)
+def remember_property_coordinates(sender, instance, **kwargs):
+    """
+    Remembers whether the coordinates are about to change,
+    so the post_save handler knows if it has any work to do.
+    """
+    instance._coordinates_changed = True
+    if instance.pk:
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'latitude', 'longitude'} & set(update_fields):
+            instance._coordinates_changed = False
+            return
+
+        old = Property.objects.filter(pk=instance.pk).values_list('latitude', 'longitude').first()
+        if old is not None:
+            instance._coordinates_changed = old != (instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=Property)
+def refresh_property_nearby_amenities(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if created or getattr(instance, '_coordinates_changed', True):
+        refresh_property(instance)
+
+
+# --- 2. REFRESH ONLY THE AFFECTED PROPERTIES WHEN AN AMENITY CHANGES ---
+
+@receiver(pre_save, sender=Amenity)
+@receiver(pre_delete, sender=Amenity)
+def remember_amenity_properties(sender, instance, **kwargs):
+    """
+    Remembers which properties listed this amenity *before* the change.
+    (If it moves away or is deleted, those lists must be recomputed.)
+    """
+    if instance.pk:
+        instance._nearby_property_ids = list(
+            instance.nearby_properties.values_list('property_id', flat=True)
+        )
+    else:
+        instance._nearby_property_ids = []
+
+
+@receiver(post_save, sender=Amenity)
+def amenity_saved(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    refresh_for_amenity(instance, getattr(instance, '_nearby_property_ids', []))
+
+
+@receiver(post_delete, sender=Amenity)
+def amenity_deleted(sender, instance, **kwargs):
+    refresh_for_amenity(None, getattr(instance, '_nearby_property_ids', []))
+
+
+# --- 3. KEEP THE DASHBOARD "LEADS" ROLLUPS UP TO DATE ---
+
+@receiver(pre_save, sender=Lead)
+def remember_lead_property(sender, instance, **kwargs):
+    """
+    A lead can be edited to point at another property,
+    so we remember which property it counted for before.
+    """
+    instance._previous_property_id = None
+    if instance.pk:
+        instance._previous_property_id = (
+            Lead.objects.filter(pk=instance.pk)
+            .values_list('property_of_interest_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Lead)
+def refresh_lead_stats(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    property_ids = {instance.property_of_interest_id, getattr(instance, '_previous_property_id', None)}
+    refresh_buckets([(property_id, instance.created_at) for property_id in property_ids])
+
+
+@receiver(post_delete, sender=Lead)
+def refresh_lead_stats_after_delete(sender, instance, **kwargs):
+    """
+    A lead is often deleted by a cascade (its agent or its property is
+    deleted), and the property's stats rows are deleted in the same
+    cascade. Writing them again right now would point at a property
+    that is about to disappear, so we wait for the commit and only
+    refresh the properties that are still there.
+    """
+    property_id = instance.property_of_interest_id
+    created_at = instance.created_at
+
+    def refresh():
+        if Property.objects.filter(pk=property_id).exists():
+            refresh_buckets([(property_id, created_at)])
+
+    if property_id:
+        transaction.on_commit(refresh)
+
+
+# --- 4. KEEP THE FULL-TEXT SEARCH INDEX IN SYNC ---
+
+@receiver(post_save, sender=Property)
+def index_saved_property(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    index_properties([instance.pk])
+
+
+@receiver(post_delete, sender=Property)
+def unindex_deleted_property(sender, instance, **kwargs):
+    unindex_property(instance.pk)
+
+
+@receiver(post_save, sender=Area)
+def reindex_area_properties(sender, instance, created, **kwargs):
+    # The area name is part of every listing's search text
+    if not created and not kwargs.get('raw'):
+        index_properties(instance.properties.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=City)
+def reindex_city_properties(sender, instance, created, **kwargs):
+    if not created and not kwargs.get('raw'):
+        index_properties(Property.objects.filter(area__city=instance).values_list('id', flat=True))
+
+
+# --- 5. KEEP THE MAP CLUSTERS UP TO DATE ---
+
+@receiver(pre_save, sender=Property)
+@receiver(pre_delete, sender=Property)
+def remember_map_point(sender, instance, **kwargs):
+    """
+    Remembers where the listing was on the map (if it was on it at all).
+    """
+    instance._map_point_before = map_point(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Property)
+def update_map_clusters(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    cluster_index.move_point(getattr(instance, '_map_point_before', None), map_point(instance.pk))
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_map_clusters(sender, instance, **kwargs):
+    cluster_index.move_point(getattr(instance, '_map_point_before', None), None)
+
+
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+def area_moved_on_map(sender, instance, **kwargs):
+    # Listings without their own coordinates are shown at their area's,
+    # so simply rebuild the clusters on the next map request
+    if not kwargs.get('raw'):
+        cluster_index.invalidate()
+
+
+# --- 6. KEEP THE SEARCH RANKING (rank_score) UP TO DATE ---
+
+# The Property fields that rank_score depends on (see ranking.py)
+RANKING_FIELDS = {'created_at', 'is_featured', 'is_verified', 'main_image', 'video_url'}
+
+
+@receiver(post_save, sender=Property)
+def rerank_saved_property(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not RANKING_FIELDS & set(update_fields):
+        return
+    refresh_rank_scores([instance.pk])
+
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+@receiver(post_save, sender=ListingReport)
+@receiver(post_delete, sender=ListingReport)
+def rerank_property_of(sender, instance, **kwargs):
+    # A photo was added/removed, or a report was filed/resolved
+    if not kwargs.get('raw'):
+        refresh_rank_scores([instance.property_id])
+
+
+# --- 7. KEEP THE SEARCH SNAPSHOT UP TO DATE ---
+# (After section 6, so the new rank_score is already saved.
+#  Run after the commit, so a rolled-back save never reaches it.)
+
+@receiver(post_save, sender=Property)
+def update_search_snapshot(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        transaction.on_commit(lambda: listing_snapshot.update_listing(instance.pk))
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_search_snapshot(sender, instance, **kwargs):
+    property_id = instance.pk
+    transaction.on_commit(lambda: listing_snapshot.remove_listing(property_id))
+
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+@receiver(post_save, sender=ListingReport)
+@receiver(post_delete, sender=ListingReport)
+def update_snapshot_rank_of(sender, instance, **kwargs):
+    # The photos / reports changed the listing's rank_score
+    if not kwargs.get('raw'):
+        property_id = instance.property_id
+        transaction.on_commit(lambda: listing_snapshot.update_listing(property_id))
+
+
+@receiver(post_save, sender=Area)
+def area_city_changed(sender, instance, created, **kwargs):
+    # The listings of the area may now be in another city
+    if not created and not kwargs.get('raw'):
+        transaction.on_commit(listing_snapshot.invalidate)
@@ -0,0 +1,367 @@
+# properties/snapshot.py
+
+"""
+An in-memory "column store" of the active listings, for the search page.
+
+Almost every search uses the same few PropertyFilter fields (city, type,
+purpose, price and bedrooms). Instead of asking the database each time,
+we keep one NumPy array per column:
+
+    ids, price, bedrooms, type code, purpose code, city id, area id,
+    created_at and rank_score
+
+A search is then a few vectorized comparisons (one boolean mask), and a
+page is the per_page best rows of that mask, found with argpartition
+(no full sort). Only the listings of the current page are loaded from
+the database.
+
+Keyword searches still go to the database (they need the full-text
+index, see search.py), so SnapshotPaginator is only used without one.
+
+Like the map clusters (clustering.py), the snapshot is updated from the
+Property signals (see signals.py) and rebuilt every MAX_AGE_SECONDS,
+so changes made by other server processes show up too. The page itself
+is always re-checked against the real filters when it is loaded, so a
+slightly old snapshot can't show a listing that no longer matches.
+"""
+
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .models import Property, PropertyPurpose, PropertyStatus, PropertyType
+from .pagination import CursorPage, CursorPaginator
+
+SEARCH_SNAPSHOT_ENABLED = getattr(settings, 'SEARCH_SNAPSHOT_ENABLED', False)
+
+# Small numbers instead of strings ('house' -> 0, 'flat' -> 1, ...)
+TYPE_CODES = {value: code for code, value in enumerate(PropertyType.values)}
+PURPOSE_CODES = {value: code for code, value in enumerate(PropertyPurpose.values)}
+
+# Stands for "empty" (no area / no bedrooms / an unknown choice)
+MISSING = -1
+
+# The columns: name -> NumPy type
+COLUMNS = {
+    'ids': np.int64,
+    'price': np.int64,
+    'bedrooms': np.int32,
+    'type_code': np.int8,
+    'purpose_code': np.int8,
+    'city_id': np.int64,
+    'area_id': np.int64,
+    'created_at': np.float64,  # a Unix timestamp
+    'rank_score': np.float64,
+    'alive': np.bool_,         # False once the listing was removed
+}
+
+# What one row is read from
+ROW_FIELDS = (
+    'id', 'price', 'bedrooms', 'property_type', 'purpose',
+    'area__city_id', 'area_id', 'created_at', 'rank_score',
+)
+
+
+def _row_values(row):
+    """
+    One database row (ROW_FIELDS) as the values of the columns.
+    """
+    pk, price, bedrooms, property_type, purpose, city_id, area_id, created_at, rank_score = row
+    return {
+        'ids': pk,
+        'price': price,
+        'bedrooms': MISSING if bedrooms is None else bedrooms,
+        'type_code': TYPE_CODES.get(property_type, MISSING),
+        'purpose_code': PURPOSE_CODES.get(purpose, MISSING),
+        'city_id': city_id or MISSING,
+        'area_id': area_id or MISSING,
+        'created_at': created_at.timestamp(),
+        'rank_score': rank_score,
+        'alive': True,
+    }
+
+
+def _columns_from_rows(rows):
+    """
+    The column arrays of many database rows (ROW_FIELDS), filled one
+    whole column at a time with np.fromiter.
+    """
+    count = len(rows)
+    fields = list(zip(*rows)) if rows else [()] * len(ROW_FIELDS)
+    pk, price, bedrooms, property_type, purpose, city_id, area_id, created_at, rank_score = fields
+    return {
+        'ids': np.fromiter(pk, np.int64, count),
+        'price': np.fromiter(price, np.int64, count),
+        'bedrooms': np.fromiter((MISSING if value is None else value for value in bedrooms), np.int32, count),
+        'type_code': np.fromiter((TYPE_CODES.get(value, MISSING) for value in property_type), np.int8, count),
+        'purpose_code': np.fromiter((PURPOSE_CODES.get(value, MISSING) for value in purpose), np.int8, count),
+        'city_id': np.fromiter((value or MISSING for value in city_id), np.int64, count),
+        'area_id': np.fromiter((value or MISSING for value in area_id), np.int64, count),
+        'created_at': np.fromiter((value.timestamp() for value in created_at), np.float64, count),
+        'rank_score': np.fromiter(rank_score, np.float64, count),
+        'alive': np.ones(count, dtype=np.bool_),
+    }
+
+
+class ListingSnapshot:
+    """
+    The column arrays of the active listings. Rows are only appended or
+    marked as not 'alive'; a rebuild packs them again.
+    """
+
+    # Rebuild at least this often, to pick up changes from other processes
+    MAX_AGE_SECONDS = 60
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Held while a rebuild runs, so only one request does it
+        self._build_lock = threading.Lock()
+        self._columns = None
+        self._size = 0
+        self._positions = {}
+        self._built_at = None
+        # Counts the invalidate() calls, so a rebuild that was already
+        # reading the old data doesn't count as fresh
+        self._generation = 0
+
+    # --- 1. BUILDING ---
+
+    def build(self):
+        generation = self._generation
+        rows = list(
+            Property.objects.filter(status=PropertyStatus.ACTIVE)
+            .order_by('id').values_list(*ROW_FIELDS)
+        )
+        columns = _columns_from_rows(rows)
+
+        with self._lock:
+            self._columns = columns
+            self._size = len(rows)
+            self._positions = dict(zip(columns['ids'].tolist(), range(len(rows))))
+            self._built_at = time.monotonic() if generation == self._generation else None
+
+    def _is_fresh(self):
+        return (
+            self._built_at is not None
+            and time.monotonic() - self._built_at < self.MAX_AGE_SECONDS
+        )
+
+    def ensure_built(self):
+        """
+        Builds the snapshot if it is missing or too old. While one request
+        rebuilds an old snapshot, the others keep searching the old arrays
+        instead of waiting (or rebuilding it too).
+        """
+        if self._is_fresh():
+            return
+        if self._columns is None:
+            self._build_lock.acquire()
+        elif not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            if not self._is_fresh():
+                self.build()
+        finally:
+            self._build_lock.release()
+
+    def invalidate(self):
+        """
+        Marks the snapshot as too old: the next search rebuilds it.
+        """
+        with self._lock:
+            self._generation += 1
+            self._built_at = None
+
+    # --- 2. INCREMENTAL UPDATES (from signals.py) ---
+
+    def _grow(self):
+        capacity = max(16, len(self._columns['ids']) * 2)
+        for name, column in self._columns.items():
+            bigger = np.zeros(capacity, dtype=column.dtype)
+            bigger[:self._size] = column[:self._size]
+            self._columns[name] = bigger
+
+    def update_listing(self, property_id):
+        """
+        Re-reads one listing from the database: adds it, changes it,
+        or removes it if it is not Active (any more).
+        """
+        row = (
+            Property.objects.filter(pk=property_id, status=PropertyStatus.ACTIVE)
+            .values_list(*ROW_FIELDS).first()
+        )
+        with self._lock:
+            if self._columns is None:
+                return  # will be built (with this listing) on the next search
+            position = self._positions.get(property_id)
+            if row is None:
+                if position is not None:
+                    self._columns['alive'][position] = False
+                return
+            if position is None:
+                if self._size == len(self._columns['ids']):
+                    self._grow()
+                position = self._size
+                self._size += 1
+                self._positions[property_id] = position
+            for name, value in _row_values(row).items():
+                self._columns[name][position] = value
+
+    def remove_listing(self, property_id):
+        with self._lock:
+            if self._columns is None:
+                return
+            position = self._positions.get(property_id)
+            if position is not None:
+                self._columns['alive'][position] = False
+
+    # --- 3. SEARCHING ---
+
+    def _mask(self, columns, data):
+        """
+        The rows that match the (cleaned) PropertyFilter data, as a
+        boolean array. Same rules as the filters: an empty field matches
+        everything, and a bedroom range never matches "not given".
+        """
+        mask = columns['alive'].copy()
+
+        city = data.get('city')
+        if city:
+            mask &= columns['city_id'] == city.pk
+        if data.get('property_type'):
+            mask &= columns['type_code'] == TYPE_CODES.get(data['property_type'], MISSING - 1)
+        if data.get('purpose'):
+            mask &= columns['purpose_code'] == PURPOSE_CODES.get(data['purpose'], MISSING - 1)
+
+        # (Integer fields cut the decimals off the form values, so do we)
+        price = data.get('price')
+        if price:
+            if price.start is not None:
+                mask &= columns['price'] >= int(price.start)
+            if price.stop is not None:
+                mask &= columns['price'] <= int(price.stop)
+        bedrooms = data.get('bedrooms')
+        if bedrooms and (bedrooms.start is not None or bedrooms.stop is not None):
+            mask &= columns['bedrooms'] != MISSING
+            if bedrooms.start is not None:
+                mask &= columns['bedrooms'] >= int(bedrooms.start)
+            if bedrooms.stop is not None:
+                mask &= columns['bedrooms'] <= int(bedrooms.stop)
+        return mask
+
+    def count(self, data):
+        self.ensure_built()
+        with self._lock:
+            columns = {name: column[:self._size] for name, column in self._columns.items()}
+            return int(np.count_nonzero(self._mask(columns, data)))
+
+    def best_ids(self, data, limit, after=None, backwards=False):
+        """
+        The ids of the first 'limit' matching listings in search order
+        (rank_score, then id, both descending), starting after the
+        (rank_score, id) pair 'after'. With 'backwards', the 'limit'
+        listings just BEFORE 'after', closest first.
+        """
+        self.ensure_built()
+        with self._lock:
+            columns = {name: column[:self._size] for name, column in self._columns.items()}
+            mask = self._mask(columns, data)
+            ranks = columns['rank_score']
+            ids = columns['ids']
+
+            if after is not None:
+                rank, pk = after
+                if backwards:
+                    mask &= (ranks > rank) | ((ranks == rank) & (ids > pk))
+                else:
+                    mask &= (ranks < rank) | ((ranks == rank) & (ids < pk))
+
+            ranks = ranks[mask]
+            ids = ids[mask]
+
+        if len(ranks) > limit:
+            # The limit-th best score, without sorting everything. Every row
+            # at least that good is kept, so ties are broken by id below.
+            # (Going forward we want the highest scores, going back the lowest.)
+            if backwards:
+                kth = ranks[np.argpartition(ranks, limit - 1)[limit - 1]]
+                keep = ranks <= kth
+            else:
+                kth = ranks[np.argpartition(ranks, len(ranks) - limit)[len(ranks) - limit]]
+                keep = ranks >= kth
+            ranks = ranks[keep]
+            ids = ids[keep]
+        if backwards:
+            order = np.lexsort((ids, ranks))[:limit]
+        else:
+            order = np.lexsort((-ids, -ranks))[:limit]
+        return [int(pk) for pk in ids[order]]
+
+
+# One shared snapshot per process
+listing_snapshot = ListingSnapshot()
+
+
+def snapshot_can_answer(property_filter):
+    """
+    True if this search can be answered from the snapshot
+    (it is switched on, the form is valid and there's no keyword).
+    """
+    return (
+        SEARCH_SNAPSHOT_ENABLED
+        and property_filter.form.is_valid()
+        and not property_filter.form.cleaned_data.get('keyword')
+    )
+
+
+# --- 4. PAGINATION ---
+
+class SnapshotPaginator(CursorPaginator):
+    """
+    A CursorPaginator that finds the page (and the total) in the
+    snapshot. 'queryset' is the normal filtered queryset: the page's
+    listings are loaded through it, and the cursors stay the same as
+    CursorPaginator's, so both can read each other's links.
+    Only for the ordering ['-rank_score', '-id'].
+    """
+
+    ORDERING = ['-rank_score', '-id']
+
+    def __init__(self, snapshot, data, queryset, per_page, count_limit=1000, count_cache_seconds=60):
+        super().__init__(queryset, per_page, self.ORDERING, count_limit, count_cache_seconds)
+        self.snapshot = snapshot
+        self.data = data
+
+    def _load(self, ids):
+        # Re-checked against the real filters (the snapshot may be a little old)
+        found = self.queryset.in_bulk(ids)
+        return [found[pk] for pk in ids if pk in found]
+
+    def get_page(self, cursor=None):
+        position = self.read_cursor(cursor)
+        if position is None:
+            ids = self.snapshot.best_ids(self.data, self.per_page + 1)
+            return CursorPage(
+                self._load(ids[:self.per_page]), self, number=1,
+                has_next=len(ids) > self.per_page, has_previous=False
+            )
+
+        values, number, backwards = position
+        ids = self.snapshot.best_ids(self.data, self.per_page + 1, after=values, backwards=backwards)
+        if not backwards:
+            return CursorPage(
+                self._load(ids[:self.per_page]), self, number=number,
+                has_next=len(ids) > self.per_page, has_previous=True
+            )
+        return CursorPage(
+            self._load(ids[:self.per_page][::-1]), self, number=max(number, 1),
+            has_next=True, has_previous=len(ids) > self.per_page
+        )
+
+    def _count_rows(self):
+        count = self.snapshot.count(self.data)
+        if self.count_limit is None:
+            return count
+        return min(count, self.count_limit + 1)
@@ -1,3 +1,339 @@
+import json
+import random
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import QueryDict
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Lead, User
+from accounts.percolator import alert_queue
+from locations.models import Amenity, Area, City
+from locations.spatial import DISTANCE_MARGIN, amenity_index, haversine_km
+from . import map_tiles, view_tracking, views
+from .clustering import ClusterIndex
+from .filters import PropertyFilter
+from .models import Property, PropertyDailyStats, PropertyNearbyAmenity, PropertyStatus, PropertyView
+from .pagination import CursorPaginator
+from .proximity import NEARBY_AMENITY_COUNT, properties_affected_by_point, rebuild_all
+from .snapshot import ListingSnapshot, SnapshotPaginator
+
+
+class SnapshotParityTests(TestCase):
+    """
+    The snapshot (snapshot.py) must give exactly the same pages as the
+    normal database search.
+    """
+
+    QUERIES = [
+        '',
+        'city={lahore}',
+        'city={karachi}&property_type=house',
+        'purpose=rent&price_min=5000000&price_max=20000000',
+        'bedrooms_min=3',
+        'bedrooms_max=2&property_type=apartment',
+        'city={lahore}&purpose=sale&price_max=9999999.5&bedrooms_min=2&bedrooms_max=4',
+        'price_min=999999999999',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(7)
+        agent = User.objects.create(username='agent')
+        cls.cities = {
+            name: City.objects.create(name=name.title()) for name in ('lahore', 'karachi')
+        }
+        areas = [
+            Area.objects.create(name=f'Area {number}', city=city)
+            for city in cls.cities.values() for number in range(3)
+        ]
+        for number in range(150):
+            Property.objects.create(
+                title=f'Listing {number}', description='-', area_size=5, agent=agent,
+                area=rnd.choice(areas + [None]),
+                price=rnd.choice([2_000_000, 5_000_000, 9_999_999, 15_000_000, 20_000_000, 60_000_000]),
+                purpose=rnd.choice(['sale', 'rent']),
+                property_type=rnd.choice(['house', 'apartment', 'plot']),
+                bedrooms=rnd.choice([None, 1, 2, 3, 4, 6]),
+                status=rnd.choice([PropertyStatus.ACTIVE] * 3 + [PropertyStatus.SOLD]),
+            )
+        # Many equal scores, so the tie-break on id is tested too
+        for listing in Property.objects.all():
+            Property.objects.filter(pk=listing.pk).update(rank_score=rnd.choice([10.0, 20.0, 20.5, 30.0]))
+
+    def setUp(self):
+        self.snapshot = ListingSnapshot()
+
+    def _paginators(self, query):
+        query = QueryDict(query.format(**{name: city.pk for name, city in self.cities.items()}))
+        queryset = Property.objects.filter(status=PropertyStatus.ACTIVE).order_by('-rank_score', '-id')
+        property_filter = PropertyFilter(query, queryset=queryset)
+        self.assertTrue(property_filter.form.is_valid())
+        results = property_filter.qs
+        return (
+            CursorPaginator(results, 7, ['-rank_score', '-id'], count_cache_seconds=0),
+            SnapshotPaginator(self.snapshot, property_filter.form.cleaned_data, results, 7, count_cache_seconds=0),
+        )
+
+    def _walk(self, paginator):
+        """
+        The ids of every page, going forward and then back again.
+        """
+        pages = []
+        page = paginator.get_page()
+        pages.append([listing.pk for listing in page])
+        while page.has_next:
+            page = paginator.get_page(page.next_cursor)
+            pages.append([listing.pk for listing in page])
+        while page.has_previous:
+            page = paginator.get_page(page.previous_cursor)
+            pages.append([listing.pk for listing in page])
+        return pages
+
+    def assertSameResults(self):
+        for query in self.QUERIES:
+            database, snapshot = self._paginators(query)
+            self.assertEqual(self._walk(snapshot), self._walk(database), query)
+            self.assertEqual(snapshot.count, database.count, query)
+
+    def test_same_pages_as_the_database(self):
+        self.assertSameResults()
+
+    def test_incremental_updates(self):
+        self.snapshot.build()
+        # Make the signals update this snapshot instead of the shared one
+        from . import signals
+        shared = signals.listing_snapshot
+        signals.listing_snapshot = self.snapshot
+        try:
+            # (and send the saved-search alerts right here, not in a thread)
+            with mock.patch.object(alert_queue, 'in_background', False), \
+                    self.captureOnCommitCallbacks(execute=True):
+                listings = list(Property.objects.filter(status=PropertyStatus.ACTIVE)[:4])
+                listings[0].price = 15_000_000
+                listings[0].save()
+                listings[1].status = PropertyStatus.SOLD
+                listings[1].save()
+                listings[2].delete()
+                listings[3].bedrooms = None
+                listings[3].save()
+                new = Property.objects.get(pk=listings[0].pk)
+                new.pk = None
+                new.save()
+        finally:
+            signals.listing_snapshot = shared
+        # Still the old snapshot, but up to date
+        self.assertIsNotNone(self.snapshot._columns)
+        self.assertSameResults()
+
+    def test_old_snapshot_is_searched_while_another_request_rebuilds_it(self):
+        self.snapshot.build()
+        count = self.snapshot.count({})
+        self.snapshot.invalidate()
+        with self.snapshot._build_lock, self.assertNumQueries(0):
+            self.assertEqual(self.snapshot.count({}), count)
+        # Once that rebuild is over, the next search does it itself
+        with self.assertNumQueries(1):
+            self.assertEqual(self.snapshot.count({}), count)
+        self.assertSameResults()
+
+
+class LeadStatsTests(TestCase):
+    """
+    The "leads" numbers of the dashboard rollups (rollups.py) follow
+    the leads, also when they are deleted by a cascade.
+    """
+
+    def setUp(self):
+        self.agent = User.objects.create(username='agent', is_agent=True)
+        area = Area.objects.create(name='Gulberg', city=City.objects.create(name='Lahore'))
+        with mock.patch.object(alert_queue, 'in_background', False):
+            self.listing = Property.objects.create(
+                title='House', description='d', price=1, area=area, purpose='sale',
+                property_type='house', area_size=1, agent=self.agent,
+            )
+
+    def _add_lead(self):
+        return Lead.objects.create(agent=self.agent, contact_name='Ali', property_of_interest=self.listing)
+
+    def test_deleting_a_lead_updates_the_stats(self):
+        lead = self._add_lead()
+        self.assertEqual(PropertyDailyStats.objects.get(property=self.listing).leads, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            lead.delete()
+        self.assertEqual(PropertyDailyStats.objects.get(property=self.listing).leads, 0)
+
+    def test_deleting_an_agent_with_leads_on_their_own_listing(self):
+        self._add_lead()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agent.delete()
+        self.assertFalse(Property.objects.exists())
+        self.assertFalse(PropertyDailyStats.objects.exists())
+        # (SQLite only checks the foreign keys at the end of the transaction)
+        connection.check_constraints()
+
+
+class ClusterTileETagTests(TestCase):
+    """
+    A cluster tile's ETag must always describe the clusters sent with
+    it, also when this process's cluster index is behind the database
+    (a change saved by another server process).
+    """
+
+    ZOOM = 6
+
+    def setUp(self):
+        agent = User.objects.create(username='agent')
+        area = Area.objects.create(name='Gulberg', city=City.objects.create(name='Lahore'))
+        with mock.patch.object(alert_queue, 'in_background', False):
+            self.listing = Property.objects.create(
+                title='House', description='d', price=1_000_000, area=area, purpose='sale',
+                property_type='house', area_size=1, agent=agent, latitude=31.5, longitude=74.3,
+            )
+        x, y = map_tiles.world_position(31.5, 74.3, self.ZOOM)
+        self.url = reverse('property_tiles', args=[self.ZOOM, int(x), int(y)])
+        # A cluster index of our own, like the one of one server process
+        self.index = ClusterIndex()
+        patcher = mock.patch.object(views, 'cluster_index', self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        response = self.client.get(self.url, **headers)
+        body = json.loads(b''.join(response.streaming_content)) if response.status_code == 200 else None
+        return response, body
+
+    def test_etag_follows_the_clusters_that_are_sent(self):
+        first, body = self._get()
+        self.assertEqual(body['clusters'][0]['max_price'], 1_000_000)
+
+        # Changed by "another process": no signal reaches our index
+        Property.objects.filter(pk=self.listing.pk).update(price=2_000_000, updated_at=timezone.now())
+        response, _ = self._get(first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # Once our index is rebuilt, the browser gets the new clusters
+        self.index.invalidate()
+        response, body = self._get(first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body['clusters'][0]['max_price'], 2_000_000)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+class ViewSpoolTests(TestCase):
+    """
+    Only one process at a time may use the crash spool of the property
+    view buffer (view_tracking.py), so no view is saved twice.
+    """
+
+    def setUp(self):
+        agent = User.objects.create(username='agent')
+        area = Area.objects.create(name='Gulberg', city=City.objects.create(name='Lahore'))
+        with mock.patch.object(alert_queue, 'in_background', False):
+            self.listing = Property.objects.create(
+                title='House', description='d', price=1, area=area, purpose='sale',
+                property_type='house', area_size=1, agent=agent,
+            )
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.spool = Path(folder.name) / 'views.spool'
+
+    def _buffer(self):
+        # (A long timer: the tests flush by hand)
+        return view_tracking.PropertyViewBuffer(batch_size=100, flush_seconds=3600, spool_file=self.spool)
+
+    def test_second_process_cannot_take_a_live_spool(self):
+        server = self._buffer()
+        server.record(self.listing.pk, ip_address='1.2.3.4')
+        self.assertTrue(self.spool.read_text())
+
+        # e.g. 'manage.py flush_property_views' while the server runs
+        other = self._buffer()
+        self.assertFalse(other.claim_spool())
+        self.assertEqual(other.flush(), 0)
+        with mock.patch('properties.management.commands.flush_property_views.view_buffer', other):
+            with self.assertRaises(CommandError):
+                call_command('flush_property_views')
+
+        self.assertEqual(server.flush(), 1)
+        self.assertEqual(PropertyView.objects.count(), 1)
+
+    def test_spool_of_a_stopped_process_is_recovered(self):
+        self.spool.write_text(json.dumps({
+            'property_id': self.listing.pk, 'ip_address': None, 'user_id': None,
+            'timestamp': timezone.now().isoformat(),
+        }) + '\n')
+        recovering = self._buffer()
+        self.assertTrue(recovering.claim_spool())
+        self.assertEqual(recovering.flush(), 1)
+        self.assertEqual(self.spool.read_text(), '')
+
+
+class NearbyAmenityTests(TestCase):
+    """
+    "What's Nearby" (proximity.py): an amenity change must refresh
+    exactly the listings it can affect, and a page view never writes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(3)
+        agent = User.objects.create(username='agent')
+        cities = [(31.5, 74.3), (24.9, 67.0)]
+        area = Area.objects.create(name='Gulberg', city=City.objects.create(name='Lahore'))
+        with mock.patch.object(alert_queue, 'in_background', False):
+            for number in range(40):
+                lat, lng = rnd.choice(cities)
+                Property.objects.create(
+                    title=f'Listing {number}', description='d', price=1, area=area, purpose='sale',
+                    property_type='house', area_size=1, agent=agent,
+                    latitude=round(lat + rnd.uniform(-0.2, 0.2), 6), longitude=round(lng + rnd.uniform(-0.2, 0.2), 6),
+                )
+        for number in range(15):
+            lat, lng = rnd.choice(cities)
+            Amenity.objects.create(
+                area=area, name=f'Amenity {number}',
+                latitude=round(lat + rnd.uniform(-0.2, 0.2), 6), longitude=round(lng + rnd.uniform(-0.2, 0.2), 6),
+            )
+        rebuild_all()
+        # One listing whose list isn't full
+        cls.partial = Property.objects.first()
+        PropertyNearbyAmenity.objects.filter(property=cls.partial, rank=NEARBY_AMENITY_COUNT).delete()
+
+    def _scan_everything(self, lat, lng):
+        # The old way: every located listing against its last-ranked distance
+        last = dict(PropertyNearbyAmenity.objects.filter(rank=NEARBY_AMENITY_COUNT).values_list('property_id', 'distance'))
+        affected = set()
+        for pk, p_lat, p_lng in Property.objects.values_list('id', 'latitude', 'longitude'):
+            distance = haversine_km(lat, lng, float(p_lat), float(p_lng))
+            if distance <= last.get(pk, float('inf')) * DISTANCE_MARGIN:
+                affected.add(pk)
+        return affected
+
+    def test_affected_listings_are_the_same_as_scanning_everything(self):
+        for lat, lng in [(31.5, 74.3), (31.72, 74.1), (24.9, 67.0), (28.0, 70.0), (60.0, 10.0)]:
+            with self.subTest(point=(lat, lng)):
+                affected = properties_affected_by_point(lat, lng)
+                self.assertEqual(len(affected), len(set(affected)))
+                self.assertEqual(set(affected), self._scan_everything(lat, lng))
+                self.assertIn(self.partial.pk, affected)
 
-# Create your tests here.
+    def test_detail_page_does_not_write(self):
+        PropertyNearbyAmenity.objects.filter(property=self.partial).delete()
+        with mock.patch.object(views, 'record_property_view'), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('property_detail', args=[self.partial.pk]))
+        self.assertEqual(response.status_code, 200)
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+        # A listing without rows still shows its nearest amenities
+        shown = [(item.amenity.pk, item.rank) for item in response.context['nearby_amenities']]
+        expected = amenity_index.nearest(float(self.partial.latitude), float(self.partial.longitude), NEARBY_AMENITY_COUNT)
+        self.assertEqual(shown, [(pk, rank) for rank, (pk, _) in enumerate(expected, start=1)])
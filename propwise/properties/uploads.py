@@ -0,0 +1,313 @@
+# properties/uploads.py
+
+"""
+Chunked, resumable uploads of listing photos (main image and gallery).
+
+A 15 MB photo sent inside the listing form over a phone connection is
+all-or-nothing: if the connection drops at 90%, the agent starts again
+(and loses the rest of the form). Instead, static/js/chunked_upload.js
+sends every photo BEFORE the form is submitted:
+
+    1. POST   /listings/uploads/                      -> start_upload()
+       {filename, size, sha256 of the whole file}
+       If we already have a file with that SHA-256, the upload is done
+       right away and not a single byte is sent.
+    2. PUT    /listings/uploads/<id>/chunks/<index>/  -> save_chunk()
+       The chunk's bytes, with its SHA-256 in the X-Chunk-SHA256 header.
+       A chunk that arrived damaged is refused and sent again.
+    3. GET    /listings/uploads/<id>/                 -> the chunks we have,
+       so an interrupted upload only sends the missing ones.
+    4. POST   /listings/uploads/<id>/complete/        -> complete_upload()
+       Joins the chunks into one file, 64 KB at a time (a big photo is
+       never held in memory), and checks that it is an image.
+
+The browser then puts the upload ids in the hidden 'uploaded_main_image'
+/ 'uploaded_gallery' fields of PropertyForm, so the form itself only
+says WHICH files to use.
+
+Finished files are stored by content ("properties/uploads/ab/ab12...jpg",
+see MediaBlob): the same photo uploaded again (another listing of the
+same agent, a second try...) reuses the file that is already there.
+Photos uploaded before this existed can be added with
+'manage.py index_media_blobs'.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .gallery import check_image
+from .models import MediaBlob, MediaUpload, Property, PropertyImage
+
+# The size of one chunk. Each chunk is read into memory by Django
+# (request.body), so it must stay below DATA_UPLOAD_MAX_MEMORY_SIZE.
+CHUNK_SIZE = getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 1024 * 1024)
+# The biggest file we accept
+MAX_UPLOAD_SIZE = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 50 * 1024 * 1024)
+# Where the chunks wait (on the local disk, not in the media storage)
+CHUNK_DIR = getattr(
+    settings, 'CHUNKED_UPLOAD_DIR',
+    os.path.join(getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None) or tempfile.gettempdir(), 'propwise-chunks'),
+)
+# Unfinished (or finished but never used) uploads are deleted after this
+UPLOAD_EXPIRE_HOURS = getattr(settings, 'CHUNKED_UPLOAD_EXPIRE_HOURS', 24)
+
+BLOB_FOLDER = 'properties/uploads'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+READ_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """A request the upload can't accept (the message is shown to the user)."""
+
+
+def hash_file(file):
+    """The SHA-256 of a file object, read 64 KB at a time."""
+    hasher = hashlib.sha256()
+    for block in iter(lambda: file.read(READ_SIZE), b''):
+        hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _clean_sha256(value):
+    value = (value or '').strip().lower()
+    if value and (len(value) != 64 or any(c not in '0123456789abcdef' for c in value)):
+        raise UploadError("That is not a SHA-256 hash.")
+    return value
+
+
+def find_blob(sha256):
+    """
+    The stored file with this content, or None. (A blob whose file was
+    removed from the media folder by hand is forgotten.)
+    """
+    blob = MediaBlob.objects.filter(sha256=sha256).first()
+    if blob is None:
+        return None
+    if not blob.file.storage.exists(blob.file.name):
+        blob.delete()
+        return None
+    return blob
+
+
+# --- 1. STARTING AN UPLOAD ---
+
+def start_upload(owner, filename, size, sha256=''):
+    """
+    Creates the MediaUpload for one file. If a file with the same
+    'sha256' is already stored, the upload is complete at once.
+    """
+    filename = os.path.basename(str(filename or '')).strip()[:255]
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in IMAGE_EXTENSIONS:
+        raise UploadError("Only photos (JPEG, PNG, WebP or GIF) can be uploaded.")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("The file size is missing.")
+    if size <= 0:
+        raise UploadError("This file is empty.")
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadError(f"Photos can be at most {MAX_UPLOAD_SIZE // (1024 * 1024)} MB.")
+    sha256 = _clean_sha256(sha256)
+
+    blob = find_blob(sha256) if sha256 else None
+    if blob is not None and blob.size != size:
+        blob = None
+    return MediaUpload.objects.create(
+        owner=owner,
+        filename=filename,
+        size=size,
+        chunk_size=CHUNK_SIZE,
+        sha256=sha256,
+        blob=blob,
+    )
+
+
+# --- 2. RECEIVING THE CHUNKS ---
+
+def _chunk_folder(upload):
+    return os.path.join(CHUNK_DIR, str(upload.pk))
+
+
+def _chunk_path(upload, index):
+    return os.path.join(_chunk_folder(upload), f'{index}.part')
+
+
+def chunk_length(upload, index):
+    """How many bytes chunk number 'index' must have (the last one is shorter)."""
+    return min(upload.chunk_size, upload.size - index * upload.chunk_size)
+
+
+def received_chunks(upload):
+    """The indexes of the chunks we have (all of them once it is complete)."""
+    if upload.is_complete:
+        return list(range(upload.total_chunks))
+    try:
+        names = os.listdir(_chunk_folder(upload))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-5]) for name in names if name.endswith('.part') and name[:-5].isdigit())
+
+
+def save_chunk(upload, index, data, sha256):
+    """
+    Stores one chunk after checking its length and its SHA-256.
+    Sending the same chunk again (a retry) simply replaces it.
+    """
+    if upload.is_complete:
+        return
+    if not 0 <= index < upload.total_chunks:
+        raise UploadError("There is no chunk with this number.")
+    if len(data) != chunk_length(upload, index):
+        raise UploadError("This chunk has the wrong size.")
+    if hashlib.sha256(data).hexdigest() != _clean_sha256(sha256):
+        raise UploadError("This chunk was damaged on the way. Please send it again.")
+
+    folder = _chunk_folder(upload)
+    os.makedirs(folder, exist_ok=True)
+    # Written under a temporary name and then renamed, so a chunk that
+    # is half written never counts as received
+    with tempfile.NamedTemporaryFile(dir=folder, suffix='.tmp', delete=False) as part:
+        part.write(data)
+    os.replace(part.name, _chunk_path(upload, index))
+
+
+# --- 3. FINISHING AN UPLOAD ---
+
+def _store_blob(assembled, sha256, size, filename):
+    """Saves the assembled file under its hash (or reuses the stored one)."""
+    blob = find_blob(sha256)
+    if blob is not None:
+        return blob
+
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.jpeg':
+        extension = '.jpg'
+    storage = MediaBlob._meta.get_field('file').storage
+    name = storage.save(f'{BLOB_FOLDER}/{sha256[:2]}/{sha256}{extension}', File(assembled))
+    try:
+        with transaction.atomic():
+            return MediaBlob.objects.create(sha256=sha256, file=name, size=size)
+    except IntegrityError:
+        # The same photo was finished by another request at the same time
+        storage.delete(name)
+        return MediaBlob.objects.get(sha256=sha256)
+
+
+def complete_upload(upload):
+    """
+    Joins the chunks into the finished file and returns its MediaBlob.
+    Memory use doesn't depend on the file size: the chunks are copied
+    (and hashed) READ_SIZE bytes at a time.
+    """
+    if upload.is_complete:
+        return upload.blob
+
+    missing = sorted(set(range(upload.total_chunks)) - set(received_chunks(upload)))
+    if missing:
+        raise UploadError(f"{len(missing)} chunks are still missing.")
+
+    folder = _chunk_folder(upload)
+    with tempfile.TemporaryFile(dir=folder) as assembled:
+        hasher = hashlib.sha256()
+        for index in range(upload.total_chunks):
+            with open(_chunk_path(upload, index), 'rb') as part:
+                for block in iter(lambda: part.read(READ_SIZE), b''):
+                    hasher.update(block)
+                    assembled.write(block)
+        sha256 = hasher.hexdigest()
+
+        if assembled.tell() != upload.size:
+            raise UploadError("The file is not complete.")
+        if upload.sha256 and sha256 != upload.sha256:
+            # Every chunk was fine, but they don't make the file we expected
+            shutil.rmtree(folder, ignore_errors=True)
+            raise UploadError("The uploaded file is damaged. Please upload it again.")
+        error = check_image(assembled)
+        if error:
+            shutil.rmtree(folder, ignore_errors=True)
+            raise UploadError(error)
+
+        assembled.seek(0)
+        blob = _store_blob(assembled, sha256, upload.size, upload.filename)
+
+    upload.blob = blob
+    upload.sha256 = sha256
+    upload.save(update_fields=['blob', 'sha256'])
+    shutil.rmtree(folder, ignore_errors=True)
+    return blob
+
+
+def discard_uploads(uploads):
+    """The form used these uploads: forget them (their files stay, in MediaBlob)."""
+    for upload in uploads:
+        shutil.rmtree(_chunk_folder(upload), ignore_errors=True)
+    MediaUpload.objects.filter(pk__in=[upload.pk for upload in uploads]).delete()
+
+
+# --- 4. HOUSEKEEPING (see manage.py clear_stale_uploads) ---
+
+def _referenced_names():
+    names = set(PropertyImage.objects.values_list('image', flat=True))
+    names.update(Property.objects.exclude(main_image='').values_list('main_image', flat=True))
+    return names
+
+
+def clear_stale_uploads(now=None):
+    """
+    Deletes the uploads older than UPLOAD_EXPIRE_HOURS (with their
+    chunks) and the blobs that no listing and no upload uses anymore.
+    Returns (uploads deleted, blob files deleted).
+    """
+    cutoff = (now or timezone.now()) - timedelta(hours=UPLOAD_EXPIRE_HOURS)
+    stale = list(MediaUpload.objects.filter(created_at__lt=cutoff))
+    discard_uploads(stale)
+
+    # Old chunk folders whose upload row is gone
+    if os.path.isdir(CHUNK_DIR):
+        live = {str(pk) for pk in MediaUpload.objects.values_list('pk', flat=True)}
+        for name in os.listdir(CHUNK_DIR):
+            path = os.path.join(CHUNK_DIR, name)
+            if name not in live and os.path.getmtime(path) < cutoff.timestamp():
+                shutil.rmtree(path, ignore_errors=True)
+
+    # (Only our own files: the photos added by index_media_blobs stay)
+    referenced = _referenced_names()
+    deleted = 0
+    unused = MediaBlob.objects.filter(
+        created_at__lt=cutoff, uploads__isnull=True, file__startswith=f'{BLOB_FOLDER}/',
+    )
+    for blob in unused:
+        if blob.file.name in referenced:
+            continue
+        blob.file.storage.delete(blob.file.name)
+        blob.delete()
+        deleted += 1
+    return len(stale), deleted
+
+
+def index_media_file(name, storage):
+    """
+    Adds a file that is already in the media folder to MediaBlob, so an
+    identical upload reuses it. Returns True if it was new.
+    """
+    if not storage.exists(name):
+        return False
+    with storage.open(name, 'rb') as file:
+        sha256 = hash_file(file)
+    if MediaBlob.objects.filter(sha256=sha256).exists():
+        return False
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(sha256=sha256, file=name, size=storage.size(name))
+    except IntegrityError:
+        return False
+    return True
@@ -27,7 +27,7 @@ urlpatterns = [
     path('map/', views.map_search_view, name='map_search'),
     
     # 2. The data source for the map (THIS IS THE MISSING ONE)
-    path('api/properties/', views.property_api_view, name='property_api'),
+    path('api/properties/tiles/<int:z>/<int:x>/<int:y>/', views.property_tile_api_view, name='property_tiles'),
     # --- ADD THIS NEW LINE FOR THE AI ASSISTANT ---
     path('api/generate-description/', views.generate_ai_description, name='generate_ai_description'),
     # --- ADD THIS NEW LINE FOR THE "BOOST" PAGE ---
@@ -46,6 +46,11 @@ urlpatterns = [
     path('compare/remove/<int:pk>/', views.remove_from_compare_view, name='remove_from_compare'),
     #for report system 
     path('report/<int:pk>/', views.report_listing_view, name='report_listing'),
+    # --- CHUNKED PHOTO UPLOADS (see uploads.py) ---
+    path('uploads/', views.start_upload_view, name='start_upload'),
+    path('uploads/<uuid:upload_id>/', views.upload_status_view, name='upload_status'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', views.upload_chunk_view, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.complete_upload_view, name='complete_upload'),
 
 ]
 
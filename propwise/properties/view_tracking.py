@@ -0,0 +1,272 @@
+# properties/view_tracking.py
+
+"""
+A small buffer for PropertyView "hits" (Agent Analytics).
+
+Instead of running one INSERT inside every property_detail request,
+each view is put in an in-memory queue. The queue is written to the
+database with ONE bulk_create when it gets big enough
+(PROPERTY_VIEW_BATCH_SIZE) or old enough (PROPERTY_VIEW_FLUSH_SECONDS).
+
+If PROPERTY_VIEW_SPOOL_FILE is set, every event is also appended to
+that file first, so views that were not flushed yet survive a crash
+and are written the next time the buffer is used.
+
+The spool belongs to ONE process at a time: the first buffer that uses
+it locks '<spool>.lock' until the process ends (the operating system
+lets go of the lock if it crashes). Another process, e.g. a second
+worker or 'manage.py flush_property_views' while the server runs,
+can't take it, so no event is read and saved by two processes.
+"""
+
+import atexit
+import json
+import logging
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Property, PropertyView
+from .rollups import refresh_for_views
+
+logger = logging.getLogger(__name__)
+
+
+class PropertyViewBuffer:
+    """
+    Collects PropertyView events and saves them in batches.
+    Every recorded event is saved exactly once (unless the process
+    crashes in the tiny window between the INSERT and the spool rewrite).
+    """
+
+    def __init__(self, batch_size=100, flush_seconds=5, spool_file=None):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.spool_file = Path(spool_file) if spool_file else None
+
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spool_loaded = False
+        self._spool_lock = None
+        self._timer = None
+
+    # --- 1. RECORDING ---
+
+    def record(self, property_id, ip_address=None, user_id=None):
+        """
+        Queues one view. This is all the request has to do.
+        """
+        event = {
+            'property_id': property_id,
+            'ip_address': ip_address,
+            'user_id': user_id,
+            'timestamp': timezone.now().isoformat(),
+        }
+
+        with self._lock:
+            self._load_spool()
+            self._events.append(event)
+            if self._spool_lock:
+                with self.spool_file.open('a', encoding='utf-8') as spool:
+                    spool.write(json.dumps(event) + '\n')
+            pending = len(self._events)
+
+        if pending >= self.batch_size:
+            self.flush()
+        else:
+            self._start_timer()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._events)
+
+    # --- 2. FLUSHING ---
+
+    def flush(self):
+        """
+        Writes every queued view to the database with one bulk_create.
+        Returns the number of rows written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._load_spool()
+                events, self._events = self._events, []
+
+            if not events:
+                return 0
+
+            try:
+                written = self._write(events)
+            except Exception:
+                # Put the events back so nothing is lost; try again later
+                logger.exception("Could not save %s property views, will retry.", len(events))
+                with self._lock:
+                    self._events = events + self._events
+                self._start_timer()
+                return 0
+
+            with self._lock:
+                self._rewrite_spool()
+            return written
+
+    def _write(self, events):
+        # Skip views of properties that were deleted in the meantime
+        # (the old code could never save those either).
+        property_ids = {event['property_id'] for event in events}
+        existing_properties = set(
+            Property.objects.filter(pk__in=property_ids).values_list('pk', flat=True)
+        )
+
+        # A viewer whose account was deleted becomes anonymous (SET_NULL)
+        user_ids = {event['user_id'] for event in events if event['user_id']}
+        existing_users = set(
+            get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True)
+        )
+
+        views = [
+            PropertyView(
+                property_id=event['property_id'],
+                ip_address=event['ip_address'],
+                user_id=event['user_id'] if event['user_id'] in existing_users else None,
+                timestamp=parse_datetime(event['timestamp']),
+            )
+            for event in events
+            if event['property_id'] in existing_properties
+        ]
+        # The raw rows and the dashboard rollups are saved together
+        with transaction.atomic():
+            PropertyView.objects.bulk_create(views, batch_size=500)
+            refresh_for_views(views)
+        return len(views)
+
+    def _start_timer(self):
+        """
+        Makes sure a flush happens at most 'flush_seconds' from now,
+        even if the batch never fills up.
+        """
+        with self._lock:
+            if self._timer is not None or not self._events:
+                return
+            self._timer = threading.Timer(self.flush_seconds, self._timer_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timer_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            # This thread used its own database connection: close it
+            close_old_connections()
+
+    # --- 3. CRASH SPOOL ---
+
+    def claim_spool(self):
+        """
+        Takes the spool file for this process (if it isn't already).
+        Returns False if another running process owns it.
+        """
+        with self._lock:
+            self._load_spool()
+            return self.spool_file is None or self._spool_lock is not None
+
+    def _lock_spool(self):
+        lock_file = self.spool_file.with_name(self.spool_file.name + '.lock').open('a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return None
+        # Kept open (and locked) for as long as this process runs
+        return lock_file
+
+    def _load_spool(self):
+        """
+        Takes the spool file and loads the views that a previous
+        (crashed) process left in it. Runs once, the first time the
+        buffer is used. Must be called while holding self._lock.
+        """
+        if self._spool_loaded:
+            return
+        self._spool_loaded = True
+
+        if not self.spool_file:
+            return
+        self._spool_lock = self._lock_spool()
+        if self._spool_lock is None:
+            logger.warning(
+                "%s is used by another process; this one keeps its property views in memory only.",
+                self.spool_file,
+            )
+            return
+        if not self.spool_file.exists():
+            return
+
+        recovered = []
+        with self.spool_file.open(encoding='utf-8') as spool:
+            for line in spool:
+                try:
+                    recovered.append(json.loads(line))
+                except ValueError:
+                    # A half-written last line from the crash
+                    continue
+        self._events = recovered + self._events
+
+    def _rewrite_spool(self):
+        """
+        After a flush, the spool only needs the events that are still waiting.
+        Must be called while holding self._lock.
+        """
+        if not self._spool_lock:
+            return
+        with self.spool_file.open('w', encoding='utf-8') as spool:
+            for event in self._events:
+                spool.write(json.dumps(event) + '\n')
+
+
+# One shared buffer per process, configured from settings.py
+view_buffer = PropertyViewBuffer(
+    batch_size=getattr(settings, 'PROPERTY_VIEW_BATCH_SIZE', 100),
+    flush_seconds=getattr(settings, 'PROPERTY_VIEW_FLUSH_SECONDS', 5),
+    spool_file=getattr(settings, 'PROPERTY_VIEW_SPOOL_FILE', None),
+)
+
+# Don't lose the last few views when the server stops normally
+atexit.register(view_buffer.flush)
+
+
+def record_property_view(request, property_obj):
+    """
+    Records one 'view' on a property detail page (Agent Analytics).
+    """
+    view_buffer.record(
+        property_id=property_obj.pk,
+        ip_address=get_client_ip(request),
+        user_id=request.user.pk if request.user.is_authenticated else None,
+    )
+
+
+# --- Helper function to get the visitor's IP address ---
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get('REMOTE_ADDR')
+    return ip
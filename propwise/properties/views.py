@@ -3,7 +3,7 @@
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from .models import Property, PropertyImage,PropertyStatus,PropertyView  # Make sure PropertyImage is imported
+from .models import Property, PropertyImage,PropertyStatus, MediaUpload  # Make sure PropertyImage is imported
 from .filters import PropertyFilter
 from .forms import PropertyForm
 from django.http import HttpResponseForbidden
@@ -16,11 +16,18 @@ from accounts.forms import SavedSearchForm,VisitRequestForm
 from django.db import IntegrityError
 from decimal import Decimal
 # properties/views.py (for map view)
-from django.http import JsonResponse
-from django.urls import reverse
-from django.contrib.humanize.templatetags.humanize import intcomma
-from geopy.distance import geodesic
-from locations.models import Amenity
+from django.http import JsonResponse, StreamingHttpResponse, Http404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_http_methods
+from .view_tracking import record_property_view
+from .pagination import CursorPaginator
+from .facets import build_facets
+from .gallery import add_stored_images, ingest_gallery
+from .uploads import UploadError, complete_upload, discard_uploads, received_chunks, save_chunk, start_upload
+from core.page_cache import cache_page_for_visitors
+from .snapshot import SnapshotPaginator, listing_snapshot, snapshot_can_answer
+from . import map_tiles, proximity
+from .clustering import cluster_index
 #for Ai description extra
 import os
 import json
@@ -31,12 +38,12 @@ from django.conf import settings # To get the User model
 genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
 #these are for payment 7 day etc
 from django.utils import timezone
-from django.db.models import Case, When, BooleanField
 # for count visitores
 from django.db.models import Count, Sum # For calculating stats
+from django.db.models.functions import Coalesce
+from .models import PropertyDailyStats
 from accounts.models import Lead # To count leads
 from .forms import PropertyForm, ListingReportForm # <-- Added ListingReportForm
-from django.core.paginator import Paginator
 
 
 # properties/views.py
@@ -45,15 +52,6 @@ from django.core.paginator import Paginator
 
 # properties/views.py
 
-# --- Helper function to get the visitor's IP address ---
-def get_client_ip(request):
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
-
 #  property  detailed view
 # properties/views.py
 
@@ -65,31 +63,18 @@ def property_detail(request, pk):
     gallery_images = property.images.all()
     
     # --- START: ANALYTICS TRACKING ---
+    # Views are queued and saved in batches (see view_tracking.py),
+    # so this page no longer waits for an INSERT.
     if request.user != property.agent:
-        PropertyView.objects.create(
-            property=property,
-            ip_address=get_client_ip(request),
-            user=request.user if request.user.is_authenticated else None
-        )
+        record_property_view(request, property)
     # --- END: ANALYTICS TRACKING ---
     
-    # --- 2. CALCULATE NEARBY AMENITIES (Your existing code) ---
-    nearby_amenities = []
-    if property.latitude and property.longitude:
-        prop_point = (property.latitude, property.longitude)
-        all_amenities = Amenity.objects.filter(latitude__isnull=False, longitude__isnull=False)
-        
-        amenities_with_distance = []
-        for amenity in all_amenities:
-            amenity_point = (amenity.latitude, amenity.longitude)
-            distance_km = geodesic(prop_point, amenity_point).km
-            amenities_with_distance.append({
-                'amenity': amenity,
-                'distance': distance_km
-            })
-        
-        sorted_amenities = sorted(amenities_with_distance, key=lambda x: x['distance'])
-        nearby_amenities = sorted_amenities[:5]
+    # --- 2. NEARBY AMENITIES (precomputed, one indexed query) ---
+    # These rows are kept up to date by properties/signals.py (and filled
+    # for older listings by 'manage.py rebuild_nearby_amenities'), so a
+    # page view never writes them. Listings without rows yet are answered
+    # from the amenity index (see proximity.nearby_amenities).
+    nearby_amenities = proximity.nearby_amenities(property)
 
     # --- 3. NEW: FETCH SIMILAR PROPERTIES ---
     # Logic: Same City, Same Property Type, Active Status, NOT the current property
@@ -128,6 +113,8 @@ def property_detail(request, pk):
 
 # properties/views.py
 
+# Visitors who are not logged in get a cached page (see core/page_cache.py)
+@cache_page_for_visitors('listings', 'cities')
 def property_search(request):
     """
     View for searching and filtering properties.
@@ -135,24 +122,36 @@ def property_search(request):
     """
     
     # 1. Filter Logic (Same as before)
-    now = timezone.now()
+    # Best first: the stored ranking (featured, verified, newest, photos...),
+    # see ranking.py. This is an index scan on (status, rank_score).
     base_queryset = Property.objects.filter(status=PropertyStatus.ACTIVE)
     
-    queryset = base_queryset.annotate(
-        is_featured_live=Case(
-            When(is_featured=True, featured_until__gte=now, then=True),
-            default=False,
-            output_field=BooleanField()
-        )
-    ).order_by('-is_featured_live', '-is_verified', '-created_at')
+    queryset = base_queryset.order_by('-rank_score', '-id')
 
     property_filter = PropertyFilter(request.GET, queryset=queryset)
-    
-    # --- 2. PAGINATION LOGIC (NEW) ---
-    # We paginate the 'qs' (queryset) from the filter
-    paginator = Paginator(property_filter.qs, 12) # Show 12 properties per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    results = property_filter.qs
+
+    # Counts for the sidebar, all from one grouped query (see facets.py)
+    facets = build_facets(property_filter, request.GET) if property_filter.form.is_valid() else []
+
+    # For a keyword search, the best text matches come first
+    # (featured listings still stay on top).
+    # 'id' comes last so that every listing has exactly one place.
+    if 'relevance' in results.query.annotations:
+        ordering = ['-is_featured', 'relevance', '-rank_score', '-id']
+    else:
+        ordering = ['-rank_score', '-id']
+    
+    # --- 2. PAGINATION LOGIC ---
+    # Cursor pagination: no OFFSET, and the total is only counted
+    # up to 1000 listings (see pagination.py)
+    # Without a keyword, the page is found in the in-memory snapshot
+    # of the active listings (see snapshot.py)
+    if snapshot_can_answer(property_filter):
+        paginator = SnapshotPaginator(listing_snapshot, property_filter.form.cleaned_data, results, 12)
+    else:
+        paginator = CursorPaginator(results, 12, ordering) # Show 12 properties per page
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     # --- END PAGINATION ---
     
     # 3. Save Search Logic (Same as before - hidden for brevity)
@@ -174,10 +173,31 @@ def property_search(request):
         'filter': property_filter,
         'saved_search_form': saved_search_form,
         'page_obj': page_obj, # <-- We send 'page_obj' instead of just the filter
+        'is_paginated': page_obj.has_other_pages(),
+        'facets': facets,
     }
     
     return render(request, 'properties/property_search.html', context)
 
+def add_gallery_images(request, property, form):
+    """
+    Saves the uploaded 'gallery_images' of the listing form and tells
+    the agent about any file that was not a usable photo.
+    The photos uploaded in chunks beforehand (see uploads.py) are
+    already stored, so they are only linked to the listing.
+    """
+    images, rejected = ingest_gallery(property, request.FILES.getlist('gallery_images'))
+    for name, error in rejected:
+        messages.warning(request, f"'{name}' was not added to the gallery: {error}")
+
+    uploads = list(form.cleaned_data['uploaded_gallery'])
+    images += add_stored_images(property, [upload.blob.file.name for upload in uploads])
+    if form.cleaned_data['uploaded_main_image'] is not None:
+        uploads.append(form.cleaned_data['uploaded_main_image'])
+    discard_uploads(uploads)
+    return images
+
+
 @login_required(login_url='login') 
 def property_create(request):
     """
@@ -187,7 +207,7 @@ def property_create(request):
     form = PropertyForm()
     
     if request.method == 'POST':
-        form = PropertyForm(request.POST, request.FILES)
+        form = PropertyForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             
             # Save the main Property object
@@ -196,12 +216,8 @@ def property_create(request):
             property.save()
             
             # --- NEW LOGIC FOR GALLERY IMAGES ---
-            # Get the list of files from the 'gallery_images' field
-            images = request.FILES.getlist('gallery_images')
-            
-            # Loop through each file and create a PropertyImage object
-            for image in images:
-                PropertyImage.objects.create(property=property, image=image)
+            # All the files of the 'gallery_images' field at once (see gallery.py)
+            add_gallery_images(request, property, form)
             # --- END OF NEW LOGIC ---
             
             # Redirect to the detail page of the new property
@@ -222,34 +238,35 @@ def agent_dashboard(request):
     Displays the agent's properties AND their business analytics.
     NOW WITH PAGINATION (10 items per page).
     """
-    now = timezone.now()
-    
     # 1. Get properties and stats
+    # View counts come from the pre-summed daily rollups (see rollups.py),
+    # not from counting every raw PropertyView row.
     my_properties_qs = Property.objects.filter(agent=request.user)
     
     my_properties = my_properties_qs.annotate(
-        is_featured_live=Case(
-            When(is_featured=True, featured_until__gte=now, then=True),
-            default=False,
-            output_field=BooleanField()
-        ),
-        view_count=Count('views')
+        view_count=Coalesce(Sum('daily_stats__views'), 0)
     ).order_by('-created_at')
     
-    # --- 2. STATS CALCULATIONS (Same as before) ---
-    total_views = my_properties.aggregate(total=Sum('view_count'))['total'] or 0
+    # --- 2. STATS CALCULATIONS ---
+    total_views = PropertyDailyStats.objects.filter(
+        property__agent=request.user
+    ).aggregate(total=Sum('views'))['total'] or 0
     total_leads = Lead.objects.filter(agent=request.user).count()
     top_performer = my_properties.order_by('-view_count').first()
 
-    # --- 3. PAGINATION LOGIC (NEW) ---
-    paginator = Paginator(my_properties, 10) # Show 10 listings per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # --- 3. PAGINATION LOGIC ---
+    # An agent has few enough listings to count them exactly (no limit, no cache)
+    paginator = CursorPaginator(
+        my_properties, 10, ['-created_at', '-id'], # Show 10 listings per page
+        count_limit=None, count_cache_seconds=0
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     # --- END PAGINATION ---
     
     context = {
         # We pass 'page_obj' instead of 'properties'
         'page_obj': page_obj, 
+        'is_paginated': page_obj.has_other_pages(),
         'total_views': total_views,
         'total_leads': total_leads,
         'top_performer': top_performer,
@@ -279,16 +296,14 @@ def property_update(request, pk):
     if request.method == 'POST':
         
         # We pass in 'instance=property' so the form knows we are updating.
-        form = PropertyForm(request.POST, request.FILES, instance=property)
+        form = PropertyForm(request.POST, request.FILES, instance=property, user=request.user)
         
         if form.is_valid():
             # This save will update the existing property
             property = form.save() 
             
             # This is our logic to add new gallery images
-            images = request.FILES.getlist('gallery_images')
-            for image in images:
-                PropertyImage.objects.create(property=property, image=image)
+            add_gallery_images(request, property, form)
             
             # Add a success message
             messages.success(request, 'Your property has been updated successfully!')
@@ -415,50 +430,54 @@ def map_search_view(request):
     """
     Step 2: Serves the main interactive map search page.
     This view just renders the template. The template's JavaScript
-    will then call the 'property_api_view' to get the data.
+    will then call the 'property_tile_api_view' for every visible tile.
     """
     # We will create this template in the next step
-    return render(request, 'properties/map_search.html')
+    return render(request, 'properties/map_search.html', {'pin_zoom': map_tiles.PIN_ZOOM})
 
 
-def property_api_view(request):
+def _property_tile_etag(request, z, x, y):
+    try:
+        map_tiles.tile_bounds(z, x, y)
+    except ValueError:
+        return None
+    if z < map_tiles.PIN_ZOOM:
+        # The clusters come from this process's cluster_index, so their
+        # ETag must come from there too (not from the database)
+        return cluster_index.tile_etag(z, x, y)
+    return map_tiles.tile_etag(z, x, y)
+
+
+@condition(etag_func=_property_tile_etag)
+def property_tile_api_view(request, z, x, y):
     """
     Step 1: This is the "Data Source" or "API" view.
-    It returns a JSON list of all properties that have coordinates.
+    It returns the listings inside ONE map tile (z/x/y):
+    clusters when zoomed out, individual pins when zoomed in.
+    The browser only asks for the tiles it can see, and gets a
+    "304 Not Modified" for tiles that did not change (ETag).
     """
     try:
-        # 1. Efficiently query properties.
-        # We use select_related('area') to fetch the related Area
-        # in the same database query. This is a huge performance win.
-        properties = Property.objects.select_related('area').filter(
-            area__latitude__isnull=False,  # Only include properties with a latitude
-            area__longitude__isnull=False # Only include properties with a longitude
-        ).order_by('-created_at')
-
-        # 2. Build the list of data for the map
-        data_list = []
-        for prop in properties:
-            data_list.append({
-                'id': prop.pk,
-                'title': prop.title,
-                'lat': prop.area.latitude,
-                'lng': prop.area.longitude,
-                'price': f"PKR {intcomma(prop.price)}", # e.g., "PKR 50,000,000"
-                'area_name': str(prop.area),
-                
-                # Get image URL, but check if main_image exists first
-                'image_url': prop.main_image.url if prop.main_image else None,
-                
-                # Get the URL to the property's detail page
-                'detail_url': reverse('property_detail', args=[prop.pk])
-            })
-        
-        # 3. Return the list as a JSON response
-        return JsonResponse(data_list, safe=False)
-    
-    except Exception as e:
-        # Handle any potential errors
-        return JsonResponse({'error': str(e)}, status=500)
+        map_tiles.tile_bounds(z, x, y)
+    except ValueError:
+        raise Http404("No such map tile.")
+
+    if z >= map_tiles.PIN_ZOOM:
+        kind, items = 'pins', map_tiles.tile_pins(z, x, y)
+    else:
+        kind, items = 'clusters', cluster_index.clusters_in_tile(z, x, y)
+
+    def stream():
+        # Written piece by piece, so a big tile never sits in memory as one string
+        yield f'{{"zoom": {z}, "x": {x}, "y": {y}, "{kind}": ['
+        for number, item in enumerate(items):
+            yield (',' if number else '') + json.dumps(item)
+        yield ']}'
+
+    response = StreamingHttpResponse(stream(), content_type='application/json')
+    # Always check back with the ETag (cheap), never show an old tile
+    patch_cache_control(response, no_cache=True)
+    return response
 
 
 # --- ADD THIS NEW VIEW FOR THE AI ASSISTANT ---
@@ -658,4 +677,67 @@ def report_listing_view(request, pk):
         'form': form,
         'property': property_obj
     }
-    return render(request, 'properties/report_listing.html', context)    
\ No newline at end of file
+    return render(request, 'properties/report_listing.html', context)    
+
+
+# --- CHUNKED PHOTO UPLOADS (see uploads.py and static/js/chunked_upload.js) ---
+
+def _upload_json(upload):
+    return {
+        'id': str(upload.pk),
+        'chunk_size': upload.chunk_size,
+        'total_chunks': upload.total_chunks,
+        'received': received_chunks(upload),
+        'complete': upload.is_complete,
+    }
+
+
+@login_required
+@require_POST
+def start_upload_view(request):
+    """
+    Starts a chunked upload. Expects JSON: {filename, size, sha256}.
+    """
+    try:
+        data = json.loads(request.body)
+        upload = start_upload(request.user, data.get('filename'), data.get('size'), data.get('sha256', ''))
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid request.'}, status=400)
+    return JsonResponse(_upload_json(upload), status=201)
+
+
+@login_required
+@require_http_methods(['GET'])
+def upload_status_view(request, upload_id):
+    """Which chunks of an upload we already have (to resume it)."""
+    upload = get_object_or_404(MediaUpload, pk=upload_id, owner=request.user)
+    return JsonResponse(_upload_json(upload))
+
+
+@login_required
+@require_http_methods(['PUT', 'POST'])
+def upload_chunk_view(request, upload_id, index):
+    """
+    Receives one chunk: the raw bytes in the body, and their SHA-256 in
+    the X-Chunk-SHA256 header.
+    """
+    upload = get_object_or_404(MediaUpload, pk=upload_id, owner=request.user)
+    try:
+        save_chunk(upload, index, request.body, request.headers.get('X-Chunk-SHA256', ''))
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'index': index})
+
+
+@login_required
+@require_POST
+def complete_upload_view(request, upload_id):
+    """Joins the chunks into the finished photo."""
+    upload = get_object_or_404(MediaUpload, pk=upload_id, owner=request.user)
+    try:
+        complete_upload(upload)
+    except UploadError as e:
+        return JsonResponse({'error': str(e), **_upload_json(upload)}, status=400)
+    return JsonResponse(_upload_json(upload))
@@ -2,6 +2,8 @@
 ASGI config for propwise project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Normal pages go through Django as usual; WebSockets (the live chat) go to
+the Channels consumers in chat/routing.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'propwise.settings')
 
-application = get_asgi_application()
+# Django must be set up before the consumers (and their models) are imported
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import AllowedHostsOriginValidator
+
+from chat.routing import websocket_urlpatterns
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': AllowedHostsOriginValidator(
+        AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+    ),
+})
@@ -104,6 +104,51 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'propwise.wsgi.application'
 
+# --- LIVE CHAT (Django Channels, see chat/consumers.py) ---
+# Serve with an ASGI server to get WebSockets, e.g.:
+#   daphne propwise.asgi:application
+ASGI_APPLICATION = 'propwise.asgi.application'
+
+# The in-memory layer only works inside ONE server process.
+# With several processes, set REDIS_URL (needs 'pip install channels-redis').
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['REDIS_URL']]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+
+# --- SHARED CACHE ---
+# The page cache (core/page_cache.py), the bell summaries and the saved
+# listings are made old by deleting / changing cache keys. That only
+# reaches EVERY server process (and the management commands, e.g.
+# expire_featured_listings) if they all use the same cache, so it can't
+# be Django's default per-process memory cache.
+# With REDIS_URL set: Redis (needs 'pip install redis'). Otherwise a
+# table in the database (created by core's migration 0001).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'propwise_cache',
+        },
+    }
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -191,4 +236,69 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get('EMAIL_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_PASS')
-DEFAULT_FROM_EMAIL = os.environ.get('EMAIL_USER')
\ No newline at end of file
+DEFAULT_FROM_EMAIL = os.environ.get('EMAIL_USER')
+
+
+# --- PROPERTY VIEW ANALYTICS (batched inserts, see properties/view_tracking.py) ---
+# Views are saved in one bulk insert when this many are waiting...
+PROPERTY_VIEW_BATCH_SIZE = 100
+# ...or when the oldest one has waited this many seconds.
+PROPERTY_VIEW_FLUSH_SECONDS = 5
+# Optional: a file where waiting views are kept so they survive a crash.
+# Use one file per server process, e.g. BASE_DIR / 'property_views.spool'
+PROPERTY_VIEW_SPOOL_FILE = None
+
+
+# --- NOTIFICATION BELL (see accounts/notifications.py) ---
+# How long the bell summary is cached. It is also cleared right away
+# whenever one of the user's notifications changes.
+NOTIFICATION_CACHE_SECONDS = 60
+
+
+# --- INSTANT SAVED-SEARCH ALERTS (see accounts/percolator.py) ---
+# Send the alerts for a newly published listing in a background thread
+# (False = right away, inside the request that published it).
+SEARCH_ALERTS_IN_BACKGROUND = True
+
+
+# --- SEARCH FACETS (see properties/facets.py) ---
+# How long the sidebar counts of one filter set are cached.
+FACET_CACHE_SECONDS = 60
+
+
+# --- SEARCH SNAPSHOT (see properties/snapshot.py) ---
+# Answer the search page (without a keyword) from NumPy arrays of the
+# active listings instead of the database.
+SEARCH_SNAPSHOT_ENABLED = True
+
+
+# --- PAGE CACHE FOR VISITORS (see core/page_cache.py) ---
+# How long a cached page lives at most (saves make it old sooner)
+PAGE_CACHE_SECONDS = 300
+
+
+# --- IMAGE DERIVATIVES (see core/images.py) ---
+# Make the smaller copies of uploaded photos in a background thread
+IMAGE_DERIVATIVES_IN_BACKGROUND = True
+
+
+# --- GALLERY UPLOADS (see properties/gallery.py) ---
+# Uploads are streamed to temporary files on disk instead of being held
+# in memory, so a form with 20 photos doesn't need 20 photos of RAM
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+# How many photos are checked and saved at the same time
+GALLERY_UPLOAD_WORKERS = 4
+
+
+# --- CHUNKED PHOTO UPLOADS (see properties/uploads.py) ---
+# Each chunk is read into memory, so keep it below DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB)
+CHUNKED_UPLOAD_CHUNK_SIZE = 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+# Unfinished uploads are deleted by 'manage.py clear_stale_uploads' after this
+CHUNKED_UPLOAD_EXPIRE_HOURS = 24
+
+
+# --- SAVED LISTINGS ON THE CARDS (see accounts/favorites.py) ---
+# How long a user's favorite ids are cached. They are also cleared right
+# away whenever the user adds or removes a favorite.
+FAVORITES_CACHE_SECONDS = 300
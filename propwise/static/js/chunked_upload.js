@@ -0,0 +1,176 @@
+// static/js/chunked_upload.js
+//
+// Uploads the photos of the listing form in chunks, as soon as they are
+// chosen (see properties/uploads.py). The form then only sends the ids
+// of the finished uploads in its hidden 'uploaded_main_image' /
+// 'uploaded_gallery' fields.
+//
+// An upload that was interrupted (closed tab, lost connection) is
+// resumed when the same file is chosen again: only the missing chunks
+// are sent. Browsers without crypto.subtle (pages not served over
+// HTTPS) keep the normal file inputs.
+
+document.addEventListener('DOMContentLoaded', function() {
+
+    const form = document.querySelector('form[data-chunked-upload-url]');
+    if (!form || !window.crypto || !window.crypto.subtle) {
+        return;
+    }
+
+    const startUrl = form.dataset.chunkedUploadUrl;
+    const submitButton = form.querySelector('[type="submit"]:not([formaction])');
+    const MAX_TRIES = 4;
+    let running = 0;
+
+    // --- 1. SMALL HELPERS ---
+
+    function getCookie(name) {
+        const match = document.cookie.match('(^|;)\\s*' + name + '=([^;]*)');
+        return match ? decodeURIComponent(match[2]) : null;
+    }
+    const csrftoken = getCookie('csrftoken');
+
+    async function sha256(buffer) {
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function request(method, url, body, headers) {
+        // Retries network errors and server errors, with a growing pause
+        for (let attempt = 1; ; attempt++) {
+            let response = null;
+            try {
+                response = await fetch(url, {
+                    method: method,
+                    headers: Object.assign({'X-CSRFToken': csrftoken}, headers || {}),
+                    body: body,
+                });
+            } catch (err) {
+                if (attempt >= MAX_TRIES) {
+                    throw new Error('The connection was lost.');
+                }
+            }
+            if (response && response.status < 500) {
+                const data = await response.json().catch(() => ({}));
+                if (!response.ok) {
+                    // Our mistake (or an expired upload): trying again won't help
+                    throw new Error(data.error || 'Upload failed.');
+                }
+                return data;
+            }
+            if (response && attempt >= MAX_TRIES) {
+                throw new Error('Upload failed.');
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+        }
+    }
+
+    function resumeKey(file) {
+        return `chunked-upload:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    // --- 2. ONE FILE ---
+
+    async function startOrResume(file) {
+        const known = localStorage.getItem(resumeKey(file));
+        if (known) {
+            try {
+                return await request('GET', `${startUrl}${known}/`);
+            } catch (err) {
+                localStorage.removeItem(resumeKey(file));  // Expired: start again
+            }
+        }
+        const upload = await request('POST', startUrl, JSON.stringify({
+            filename: file.name,
+            size: file.size,
+            sha256: await sha256(await file.arrayBuffer()),
+        }), {'Content-Type': 'application/json'});
+        localStorage.setItem(resumeKey(file), upload.id);
+        return upload;
+    }
+
+    async function uploadFile(file, showProgress) {
+        let upload = await startOrResume(file);
+        const received = new Set(upload.received);
+
+        for (let index = 0; index < upload.total_chunks && !upload.complete; index++) {
+            if (received.has(index)) {
+                continue;
+            }
+            const start = index * upload.chunk_size;
+            const chunk = await file.slice(start, start + upload.chunk_size).arrayBuffer();
+            await request('PUT', `${startUrl}${upload.id}/chunks/${index}/`, chunk, {
+                'Content-Type': 'application/octet-stream',
+                'X-Chunk-SHA256': await sha256(chunk),
+            });
+            received.add(index);
+            showProgress(Math.round(100 * received.size / upload.total_chunks));
+        }
+
+        if (!upload.complete) {
+            upload = await request('POST', `${startUrl}${upload.id}/complete/`);
+        }
+        localStorage.removeItem(resumeKey(file));
+        return upload.id;
+    }
+
+    // --- 3. THE FILE INPUTS ---
+
+    function setBusy(change) {
+        running += change;
+        if (submitButton) {
+            submitButton.disabled = running > 0;
+        }
+    }
+
+    form.querySelectorAll('input[type="file"][data-chunked]').forEach(function(input) {
+        const hidden = form.querySelector(`input[name="${input.dataset.chunked}"]`);
+        if (!hidden) {
+            return;
+        }
+        const multiple = input.multiple;
+        const status = document.createElement('div');
+        status.className = 'help-text';
+        input.insertAdjacentElement('afterend', status);
+        if (hidden.value) {
+            status.textContent = 'Photos already uploaded: ' + hidden.value.split(',').length;
+        }
+
+        input.addEventListener('change', async function() {
+            const files = Array.from(input.files);
+            // The bytes go through the chunked upload, not the form
+            input.value = '';
+            if (!files.length) {
+                return;
+            }
+            if (!multiple) {
+                hidden.value = '';
+            }
+
+            setBusy(+1);
+            const lines = files.map(function(file) {
+                const line = document.createElement('div');
+                line.textContent = `${file.name}: waiting...`;
+                status.appendChild(line);
+                return line;
+            });
+            try {
+                for (let i = 0; i < files.length; i++) {
+                    const file = files[i];
+                    try {
+                        const id = await uploadFile(file, function(percent) {
+                            lines[i].textContent = `${file.name}: ${percent}%`;
+                        });
+                        hidden.value = multiple && hidden.value ? `${hidden.value},${id}` : id;
+                        lines[i].textContent = `${file.name}: uploaded`;
+                    } catch (err) {
+                        lines[i].textContent = `${file.name}: ${err.message} Choose the file again to resume.`;
+                        lines[i].className = 'error-text';
+                    }
+                }
+            } finally {
+                setBusy(-1);
+            }
+        });
+    });
+});